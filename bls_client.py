@@ -0,0 +1,161 @@
+# bls_client.py
+# Client for the BLS public timeseries API (api.bls.gov) used by the
+# release-comparison builders.
+#
+#   - splits large pulls into API-sized batches (series × year spans)
+#   - fetches batches concurrently
+#   - caches each response on disk (TTL + content hash)
+#   - retries transient failures (HTTP 429 / 5xx, connection errors) with
+#     exponential backoff; API errors are raised straight away
+#
+# The API URL is a constructor argument, so the client can be pointed at a
+# local stub HTTP server.
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BLS_URL = "https://api.bls.gov/publicAPI/v2/timeseries/data/"
+
+# API v2 limits (series, years) per request, with and without a registration key
+REGISTERED_LIMITS = (50, 20)
+UNREGISTERED_LIMITS = (25, 10)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "bls")
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+class BLSError(RuntimeError):
+    """Raised when the API rejects a batch, or it still fails after all retries."""
+
+
+def _sha256(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BLSClient:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        url: str = BLS_URL,
+        cache_dir: str | None = DEFAULT_CACHE_DIR,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_workers: int = 4,
+        max_retries: int = 4,
+        backoff_seconds: float = 1.0,
+        timeout: float = 30,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+
+    @property
+    def limits(self) -> tuple[int, int]:
+        """(series, years) per request for this client's key (or lack of one)."""
+        return REGISTERED_LIMITS if self.api_key else UNREGISTERED_LIMITS
+
+    # ── public API ─────────────────────────────────────────────────────────
+    def fetch(
+        self, series_ids: list[str], start_year: int, end_year: int, annualaverage: bool = False,
+    ) -> dict[str, list[dict]]:
+        """Return {series_id: [data points]} for every series over start_year..end_year."""
+        max_series, max_years = self.limits
+        payloads = []
+        for i in range(0, len(series_ids), max_series):
+            batch = list(series_ids[i:i + max_series])
+            for y0 in range(start_year, end_year + 1, max_years):
+                y1 = min(y0 + max_years - 1, end_year)
+                payloads.append({
+                    "seriesid": batch,
+                    "startyear": str(y0),
+                    "endyear": str(y1),
+                    "annualaverage": annualaverage,
+                })
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            responses = list(pool.map(self._fetch_batch, payloads))
+
+        out: dict[str, list[dict]] = {sid: [] for sid in series_ids}
+        for body in responses:
+            for series in body["Results"]["series"]:
+                out.setdefault(series["seriesID"], []).extend(series["data"])
+        return out
+
+    # ── batches ───────────────────────────────────────────────────────────
+    def _fetch_batch(self, payload: dict) -> dict:
+        key = _sha256(payload)  # registration key is not part of the cache key
+        body = self._cache_get(key)
+        if body is None:
+            body = self._post_with_retry(payload)
+            self._cache_put(key, body)
+        return body
+
+    def _post_with_retry(self, payload: dict) -> dict:
+        request = dict(payload)
+        if self.api_key:
+            request["registrationkey"] = self.api_key
+        batch = f"{len(payload['seriesid'])} series, {payload['startyear']}-{payload['endyear']}"
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+            try:
+                resp = requests.post(
+                    self.url,
+                    data=json.dumps(request),
+                    headers={"Content-type": "application/json"},
+                    timeout=self.timeout,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+            if resp.status_code == 429 or resp.status_code >= 500:
+                last_error = f"HTTP {resp.status_code}"
+                continue
+            try:
+                resp.raise_for_status()
+                body = resp.json()
+            except (requests.HTTPError, ValueError) as e:
+                raise BLSError(f"BLS request failed ({batch}): {e}") from e
+            if body.get("status") != "REQUEST_SUCCEEDED":
+                raise BLSError(f"BLS request failed ({batch}): {body.get('status')}: {body.get('message')}")
+            return body
+        raise BLSError(f"BLS request failed after {self.max_retries + 1} attempts ({batch}): {last_error}")
+
+    # ── on-disk cache ─────────────────────────────────────────────────────
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _cache_get(self, key: str) -> dict | None:
+        if not self.cache_dir:
+            return None
+        path = self._cache_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("fetched_at", 0) > self.ttl_seconds:
+            return None
+        if entry.get("sha256") != _sha256(entry.get("body")):
+            return None  # truncated or edited file
+        return entry["body"]
+
+    def _cache_put(self, key: str, body: dict) -> None:
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"fetched_at": time.time(), "sha256": _sha256(body), "body": body}
+        path = self._cache_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
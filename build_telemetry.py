@@ -0,0 +1,250 @@
+# build_telemetry.py
+# Per-statement query stats for the release-comparison builders.
+#
+# Every statement a build issues carries a JSON QUERY_TAG (app, build id, phase,
+# step, topic/field, ...). After the run, this session's QUERY_HISTORY rows for
+# the build are appended to the builder's telemetry table in its live schema
+# (kept across builds, published or not) and the slowest statements are printed.
+#
+#   telemetry = BuildTelemetry(database, schema, "BGI_REL_BUILD_TELEMETRY", "release_comparisons.postings")
+#   telemetry.set_query_tag(conn, build_id, phase="step", step=name)
+#   ...
+#   telemetry.record(build_id, conn)
+#   telemetry.print_summary(build_id, conn)
+#
+# The build plan (--plan) EXPLAINs every selected statement (bytes / partitions
+# to scan; uses no warehouse time) and projects its runtime from the telemetry
+# table: the target's median over recent builds scaled by bytes to scan, else
+# the history's overall seconds per byte. Credits are priced at the size of the
+# warehouse each statement is routed to. check_budget refuses statements whose
+# EXPLAIN exceeds a per-statement byte budget (--max-bytes-per-statement).
+
+import argparse
+import json
+import re
+from datetime import datetime, timedelta
+
+from connection import execute_ddl, fetch_rows
+
+SLOWEST_N = 10
+PLAN_HISTORY_BUILDS = 5
+
+# Compute credits per hour by warehouse size, for the per-statement estimate
+# (execution time × size rate + cloud services; ignores concurrency and the
+# 60 s minimum on resume).
+WAREHOUSE_CREDITS_PER_HOUR = {
+    "X-Small": 1, "Small": 2, "Medium": 4, "Large": 8, "X-Large": 16,
+    "2X-Large": 32, "3X-Large": 64, "4X-Large": 128, "5X-Large": 256, "6X-Large": 512,
+}
+
+# Created table of a CREATE statement (group 7; POSIX ERE, no (?:...) groups)
+_CREATE_TARGET_RE = ("CREATE( +OR +REPLACE)?( +(LOCAL|GLOBAL))?( +(TEMPORARY|TEMP|TRANSIENT|VOLATILE))?"
+                     " +TABLE( +IF +NOT +EXISTS)? +([A-Za-z0-9_.$]+)")
+
+# QUERY_TAG field -> telemetry column, for the fields every builder tags
+TAG_COLUMNS = {"phase": "PHASE", "step": "STEP", "group": "STEP_GROUP", "topic": "TOPIC", "field": "FIELD"}
+
+
+def _esc(val):
+    return str(val).replace("'", "''")
+
+
+def _size_key(size):
+    """'X-Small', 'XSMALL', 'x-small' -> 'XSMALL' (SHOW WAREHOUSES and QUERY_HISTORY spell sizes differently)."""
+    return re.sub(r"[^A-Z0-9]", "", str(size).upper())
+
+
+def parse_bytes(text):
+    """'750GB', '1.5T', '2000000' -> bytes (decimal units)."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)B?\s*", text, re.IGNORECASE)
+    if not m:
+        raise argparse.ArgumentTypeError(f"not a byte size: {text!r} (e.g. 500GB, 1.5T)")
+    return int(float(m.group(1)) * 1000 ** " KMGTP".index(m.group(2).upper() or " "))
+
+
+def explain_scan(sql, conn):
+    """(bytes, partitions assigned, partitions total) the compiled plan for `sql` will scan."""
+    plan = json.loads(fetch_rows(f"EXPLAIN USING JSON\n{sql}", conn)[0][0])
+    stats = plan.get("GlobalStats", {})
+    return stats.get("bytesAssigned", 0), stats.get("partitionsAssigned", 0), stats.get("partitionsTotal", 0)
+
+
+def check_budget(sql, max_bytes, conn):
+    """Raise if `sql` would scan more than max_bytes (no-op without a budget)."""
+    if not max_bytes:
+        return
+    scan, _, _ = explain_scan(sql, conn)
+    if scan > max_bytes:
+        raise RuntimeError(f"would scan {scan / 1e9:,.1f} GB, over the "
+                           f"{max_bytes / 1e9:,.1f} GB per-statement budget; not run")
+
+
+def warehouse_credits_per_hour(conn, warehouse):
+    """Credit rate of a warehouse's current size (None if unknown)."""
+    try:
+        fetch_rows(f"SHOW WAREHOUSES LIKE '{_esc(warehouse)}'", conn)
+        size = fetch_rows('SELECT "size" FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))', conn)[0][0]
+    except Exception:
+        return None
+    rates = {_size_key(k): v for k, v in WAREHOUSE_CREDITS_PER_HOUR.items()}
+    return rates.get(_size_key(size))
+
+
+def estimate_seconds(target, scan, history, secs_per_byte):
+    past = history.get(target)
+    if past:
+        secs, past_scan = past
+        return secs * scan / past_scan if scan is not None and past_scan else secs
+    if scan is not None and secs_per_byte:
+        return scan * secs_per_byte
+    return None
+
+
+def print_plan(statements, history, secs_per_byte, max_bytes, conn):
+    """Print per-statement scan / runtime estimates and the projected total.
+
+    statements: [(target, sql or None for an upload, warehouse it runs on)];
+    history / secs_per_byte as returned by BuildTelemetry.history.
+    """
+    print(f"\n  {'statement':<55} {'GB to scan':>10} {'partitions':>17} {'est. secs':>10}  note")
+    total_secs = total_scan = unknown = over = 0
+    wh_secs = {}
+    for name, sql, wh in statements:
+        scan = parts = None
+        note = ""
+        if sql is None:
+            note = "upload"
+        else:
+            try:
+                scan, assigned, total = explain_scan(sql, conn)
+                parts = f"{assigned:,}/{total:,}"
+                if max_bytes and scan > max_bytes:
+                    note, over = "over budget, would be skipped", over + 1
+            except Exception as e:
+                note = f"EXPLAIN failed: {str(e).splitlines()[0][:60]}"
+        secs = estimate_seconds(name, scan, history, secs_per_byte)
+        if secs is None:
+            unknown += 1
+        elif not (max_bytes and scan and scan > max_bytes):
+            total_secs += secs
+            wh_secs[wh] = wh_secs.get(wh, 0) + secs
+        total_scan += scan or 0
+        gb = f"{scan / 1e9:,.2f}" if scan is not None else "-"
+        est = f"{secs:,.0f}" if secs is not None else "?"
+        print(f"  {name[:55]:<55} {gb:>10} {parts or '-':>17} {est:>10}  {note}")
+
+    eta = datetime.now() + timedelta(seconds=float(total_secs))
+    rates = {wh: warehouse_credits_per_hour(conn, wh) for wh in wh_secs}
+    priced = [f"~{secs / 3600 * rates[wh]:,.2f} on {wh}" for wh, secs in wh_secs.items() if rates[wh]]
+    credits = f", credits {', '.join(priced)}" if priced else ""
+    print(f"\n  Projected: {timedelta(seconds=round(total_secs))} serial, {total_scan / 1e9:,.1f} GB to scan{credits}")
+    print(f"  ETA if started now: {eta:%Y-%m-%d %H:%M}")
+    if unknown:
+        print(f"  {unknown} of {len(statements)} statements have no estimate (no history and no EXPLAIN)")
+    if over:
+        print(f"  {over} statements exceed the {max_bytes / 1e9:,.1f} GB per-statement budget")
+
+
+class BuildTelemetry:
+    def __init__(self, database: str, schema: str, table: str, app: str, extra_tags=()):
+        """extra_tags: further QUERY_TAG fields recorded as their own (upper-cased) column."""
+        self.database = database
+        self.schema = schema
+        self.table = table
+        self.app = app
+        self.tag_columns = {**TAG_COLUMNS, **{tag: tag.upper() for tag in extra_tags}}
+
+    @property
+    def target(self):
+        return f"{self.database}.{self.schema}.{self.table}"
+
+    def set_query_tag(self, conn, build_id, **fields):
+        """Tag the session's following statements with this build and the given fields."""
+        tag = {"app": self.app, "build_id": build_id}
+        tag.update({k: v for k, v in fields.items() if v is not None})
+        execute_ddl(f"ALTER SESSION SET QUERY_TAG = '{_esc(json.dumps(tag))}'", conn)
+
+    def sql(self, build_id):
+        tags = "\n".join(f"           TRY_PARSE_JSON(QUERY_TAG):{tag}::STRING AS {col},"
+                         for tag, col in self.tag_columns.items())
+        # priced at the size of the warehouse each statement ran on (steps may be routed)
+        rate = "\n".join(f"            WHEN '{_size_key(size)}' THEN {credits}"
+                         for size, credits in WAREHOUSE_CREDITS_PER_HOUR.items())
+        return f"""
+    SELECT '{build_id}' AS BUILD_ID,
+{tags}
+           QUERY_ID, QUERY_TYPE, EXECUTION_STATUS,
+           IFF(QUERY_TYPE LIKE 'CREATE%',
+               UPPER(REGEXP_SUBSTR(QUERY_TEXT, '{_CREATE_TARGET_RE}', 1, 1, 'i', 7)), NULL) AS TARGET,
+           START_TIME, END_TIME,
+           TOTAL_ELAPSED_TIME / 1000 AS ELAPSED_S,
+           EXECUTION_TIME / 1000 AS EXECUTION_S,
+           (QUEUED_PROVISIONING_TIME + QUEUED_OVERLOAD_TIME) / 1000 AS QUEUED_S,
+           BYTES_SCANNED, PARTITIONS_SCANNED, PARTITIONS_TOTAL,
+           BYTES_SPILLED_TO_LOCAL_STORAGE AS SPILL_LOCAL_BYTES,
+           BYTES_SPILLED_TO_REMOTE_STORAGE AS SPILL_REMOTE_BYTES,
+           ROWS_PRODUCED, WAREHOUSE_NAME, WAREHOUSE_SIZE,
+           EXECUTION_TIME / 3600000 * CASE REGEXP_REPLACE(UPPER(WAREHOUSE_SIZE), '[^A-Z0-9]', '')
+{rate}
+            ELSE 0 END
+             + COALESCE(CREDITS_USED_CLOUD_SERVICES, 0) AS EST_CREDITS
+    FROM TABLE({self.database}.INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 10000))
+    WHERE TRY_PARSE_JSON(QUERY_TAG):build_id::STRING = '{build_id}'
+      AND QUERY_TYPE != 'ALTER_SESSION'
+    """
+
+    def record(self, build_id, conn):
+        """Append this build's statements to the telemetry table; return how many were recorded."""
+        execute_ddl("ALTER SESSION UNSET QUERY_TAG", conn)
+        execute_ddl(f"CREATE TABLE IF NOT EXISTS {self.target} AS\n"
+                    f"SELECT * FROM ({self.sql(build_id)}) WHERE FALSE", conn)
+        execute_ddl(f"DELETE FROM {self.target} WHERE BUILD_ID = '{build_id}'", conn)
+        execute_ddl(f"INSERT INTO {self.target}\n{self.sql(build_id)}", conn)
+        return fetch_rows(f"SELECT COUNT(*) FROM {self.target} WHERE BUILD_ID = '{build_id}'", conn)[0][0]
+
+    def history(self, conn, builds=PLAN_HISTORY_BUILDS):
+        """({target: (median seconds, median bytes scanned)}, overall seconds per byte)
+        over the last `builds` builds in the telemetry table."""
+        try:
+            rows = fetch_rows(f"""
+                WITH recent AS (
+                    SELECT * FROM {self.target}
+                    WHERE EXECUTION_STATUS = 'SUCCESS' AND TARGET IS NOT NULL
+                    QUALIFY DENSE_RANK() OVER (ORDER BY BUILD_ID DESC) <= {builds}
+                )
+                SELECT TARGET, MEDIAN(ELAPSED_S), MEDIAN(BYTES_SCANNED)
+                FROM recent
+                GROUP BY 1
+            """, conn)
+        except Exception as e:
+            print(f"  ! No build telemetry to project from ({e})")
+            return {}, None
+        history = {target: (secs or 0, scanned or 0) for target, secs, scanned in rows}
+        secs = sum(s for s, b in history.values() if b)
+        scanned = sum(b for _, b in history.values())
+        return history, (secs / scanned if scanned else None)
+
+    def print_summary(self, build_id, conn, n=SLOWEST_N):
+        (statements, elapsed, scanned, spilled, credits), = fetch_rows(f"""
+            SELECT COUNT(*), SUM(ELAPSED_S), SUM(BYTES_SCANNED),
+                   SUM(SPILL_LOCAL_BYTES + SPILL_REMOTE_BYTES), SUM(EST_CREDITS)
+            FROM {self.target} WHERE BUILD_ID = '{build_id}'
+        """, conn)
+        print(f"  {statements} statements, {elapsed or 0:,.0f} s, {(scanned or 0) / 1e9:,.1f} GB scanned, "
+              f"{(spilled or 0) / 1e9:,.1f} GB spilled, ~{credits or 0:,.2f} credits")
+        rows = fetch_rows(f"""
+            SELECT COALESCE(TARGET, QUERY_TYPE), COALESCE(STEP, PHASE), ELAPSED_S, BYTES_SCANNED,
+                   PARTITIONS_SCANNED, PARTITIONS_TOTAL,
+                   SPILL_LOCAL_BYTES + SPILL_REMOTE_BYTES, EST_CREDITS
+            FROM {self.target} WHERE BUILD_ID = '{build_id}'
+            ORDER BY ELAPSED_S DESC NULLS LAST
+            LIMIT {n}
+        """, conn)
+        if not rows:
+            return
+        print(f"  Slowest {len(rows)} statements:")
+        print(f"    {'target':<50} {'secs':>8} {'GB scanned':>10} {'partitions':>17} {'GB spilled':>10} {'credits':>8}")
+        for target_name, step, secs, scanned, p_scanned, p_total, spilled, credits in rows:
+            label = target_name if target_name == step or not step else f"{target_name} ({step})"
+            print(f"    {label[:50]:<50} {secs or 0:>8,.1f} {(scanned or 0) / 1e9:>10,.2f} "
+                  f"{f'{p_scanned or 0:,}/{p_total or 0:,}':>17} {(spilled or 0) / 1e9:>10,.2f} {credits or 0:>8,.3f}")
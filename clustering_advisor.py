@@ -0,0 +1,360 @@
+# clustering_advisor.py
+# Clustering / search-optimization advisor for the source tables read by the
+# release-comparison builders.
+#
+#   - mines filter predicates and group keys from every statement the postings
+#     and PDL builders generate (their build_steps())
+#   - measures how well each source table prunes for candidate keys today with
+#     SYSTEM$CLUSTERING_INFORMATION
+#   - recommends a clustering key per table (and search optimization for
+#     selective equality filters), optionally applying them to zero-copy clones
+#     in a schema we own (the source tables themselves are not ours to alter)
+#
+#   python clustering_advisor.py
+#   python clustering_advisor.py --builders postings --apply-to PROJECT_DATA.RELEASE_SOURCE_CLONES
+
+import argparse
+import json
+import re
+from collections import Counter
+from datetime import datetime
+
+import postings_release_temp_tables as postings
+import profiles_create_temp_tables as profiles
+
+BUILDERS = {"postings": postings, "profiles": profiles}
+
+MAX_KEY_COLUMNS = 3          # candidate keys use the top-N filtered columns...
+MIN_USE_SHARE = 0.1          # ...that have at least this share of the top column's uses
+MIN_SCANNED_FRACTION = 0.05  # below this the table already prunes well for a key
+MIN_PARTITIONS = 100         # smaller tables are scanned whole either way
+SO_MIN_DISTINCT = 10_000     # equality columns at least this selective get a search-optimization estimate
+
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*\.[A-Za-z_]\w*\.[A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SELECT_RE = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_WHERE_RE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+_GROUP_RE = re.compile(r"\bGROUP\s+BY\b", re.IGNORECASE)
+_FROM_RE = re.compile(r"\bFROM\b", re.IGNORECASE)
+_CLAUSE_END_RE = re.compile(r"\b(?:GROUP\s+BY|ORDER\s+BY|QUALIFY|HAVING|UNION|LIMIT)\b|\)\s*(?:,|$)", re.IGNORECASE)
+# [alias.]column, not a function call and not part of a db.schema.table name
+_REF_RE = re.compile(r'(?<![\w."])(?:([A-Za-z_]\w*)\.)?([A-Za-z_]\w*)(?![\w.])(?!\s*\()')
+_OP_RE = re.compile(r"\s*\)*\s*(NOT\s+IN\b|IN\b|BETWEEN\b|>=|<=|<>|!=|=|>|<)", re.IGNORECASE)
+_JOIN_WORDS = {
+    "ON", "WHERE", "GROUP", "ORDER", "LEFT", "RIGHT", "INNER", "FULL", "OUTER", "CROSS",
+    "JOIN", "UNION", "QUALIFY", "HAVING", "LIMIT", "USING", "LATERAL", "AT", "BEFORE",
+}
+_DATE_TYPES = {"DATE", "TIMESTAMP_NTZ", "TIMESTAMP_LTZ", "TIMESTAMP_TZ"}
+
+
+# ─────────────────────────── WORKLOAD MINING ───────────────────────────
+def _split_top_level(text):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _clause(segment, start_re):
+    m = start_re.search(segment)
+    if not m:
+        return ""
+    end = _CLAUSE_END_RE.search(segment, m.end())
+    return segment[m.end():end.start() if end else len(segment)]
+
+
+def _refs(text):
+    for m in _REF_RE.finditer(text):
+        yield (m.group(1) or "").upper(), m.group(2).upper(), text[m.end():]
+
+
+def _kind(rest):
+    op = _OP_RE.match(rest)
+    if not op:
+        return None
+    op = op.group(1).upper()
+    if op in ("=", "IN"):
+        return "eq"
+    if op in (">=", "<=", ">", "<", "BETWEEN"):
+        return "range"
+    return None
+
+
+def mine_statement(sql, uses):
+    """Add (table, column, kind) counts for one statement to `uses`.
+
+    kind is 'eq' / 'range' for WHERE predicates and 'group' for GROUP BY keys
+    (positional GROUP BY 1, 2 is resolved through the select list). Columns are
+    attributed through their alias, or to the only source table of the SELECT;
+    non-columns (keywords, CTE names) are dropped later against INFORMATION_SCHEMA.
+    """
+    sql = _STRING_RE.sub("''", sql)
+    starts = [m.start() for m in _SELECT_RE.finditer(sql)] + [len(sql)]
+    for a, b in zip(starts, starts[1:]):
+        segment = sql[a:b]
+        aliases, tables = {}, []
+        for m in _TABLE_REF_RE.finditer(segment):
+            table = tuple(p.upper() for p in m.group(1).split("."))
+            tables.append(table)
+            if m.group(2) and m.group(2).upper() not in _JOIN_WORDS:
+                aliases[m.group(2).upper()] = table
+        if not tables:
+            continue
+
+        def owner(alias):
+            if alias:
+                return aliases.get(alias)
+            return tables[0] if len(set(tables)) == 1 else None
+
+        for alias, col, rest in _refs(_clause(segment, _WHERE_RE)):
+            kind, table = _kind(rest), owner(alias)
+            if kind and table:
+                uses[(table, col, kind)] += 1
+
+        group_by = _clause(segment, _GROUP_RE)
+        if group_by:
+            from_at = _FROM_RE.search(segment)
+            select_items = _split_top_level(segment[len("SELECT"):from_at.start() if from_at else len(segment)])
+            for item in _split_top_level(group_by):
+                item = item.strip()
+                if item.isdigit() and 0 < int(item) <= len(select_items):
+                    item = re.sub(r"\s+AS\s+\w+\s*$", "", select_items[int(item) - 1], flags=re.IGNORECASE)
+                for alias, col, _ in _refs(item):
+                    table = owner(alias)
+                    if table:
+                        uses[(table, col, "group")] += 1
+
+
+def mine_workload(builders):
+    """Counter of (table, column, kind) over every statement of the given builders."""
+    uses = Counter()
+    n = 0
+    for name in builders:
+        for step in BUILDERS[name].build_steps():
+            if step.get("sql"):
+                mine_statement(step["sql"], uses)
+                n += 1
+    return uses, n
+
+
+# ─────────────────────────── MEASUREMENT ───────────────────────────
+def _fetch(conn, query):
+    cur = conn.cursor()
+    try:
+        cur.execute(query)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+def table_metadata(tables, conn):
+    """({table: {COLUMN: DATA_TYPE}}, {table: (TABLE_TYPE, CLUSTERING_KEY, ROW_COUNT)}) in two queries."""
+    by_db = {}
+    for db, sch, tbl in tables:
+        by_db.setdefault(db, []).append(f"(TABLE_SCHEMA = '{sch}' AND TABLE_NAME = '{tbl}')")
+    cols_sql = "\nUNION ALL\n".join(
+        f"SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE "
+        f"FROM {db}.INFORMATION_SCHEMA.COLUMNS WHERE {' OR '.join(conds)}"
+        for db, conds in by_db.items()
+    )
+    tables_sql = "\nUNION ALL\n".join(
+        f"SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, CLUSTERING_KEY, ROW_COUNT "
+        f"FROM {db}.INFORMATION_SCHEMA.TABLES WHERE {' OR '.join(conds)}"
+        for db, conds in by_db.items()
+    )
+    columns, info = {}, {}
+    for cat, sch, tbl, col, dtype in _fetch(conn, cols_sql):
+        columns.setdefault((cat.upper(), sch.upper(), tbl.upper()), {})[col.upper()] = dtype.upper()
+    for cat, sch, tbl, ttype, ckey, rows in _fetch(conn, tables_sql):
+        info[(cat.upper(), sch.upper(), tbl.upper())] = (ttype, ckey, rows)
+    return columns, info
+
+
+def _key_expr(col, dtype):
+    return f"DATE_TRUNC('MONTH', {col})" if dtype in _DATE_TYPES else col
+
+
+def candidate_keys(filters, types):
+    """Candidate clustering keys from a table's filtered columns.
+
+    `filters` is [(column, kind, uses)] ordered by uses. Equality (usually
+    low-cardinality) columns go before range columns, as Snowflake recommends.
+    """
+    if not filters:
+        return []
+    top = [f for f in filters if f[2] >= MIN_USE_SHARE * filters[0][2]][:MAX_KEY_COLUMNS]
+    eq = [c for c, kind, _ in top if kind == "eq"]
+    rng = [c for c, kind, _ in top if kind == "range"]
+    keys = [[c] for c, _, _ in top]
+    ordered = list(dict.fromkeys(eq + rng))
+    for n in range(2, len(ordered) + 1):
+        keys.append(ordered[:n])
+    seen, out = set(), []
+    for key in keys:
+        expr = ", ".join(_key_expr(c, types[c]) for c in key)
+        if expr not in seen:
+            seen.add(expr)
+            out.append((key, expr))
+    return out
+
+
+def clustering_information(table, key_expr, conn):
+    """SYSTEM$CLUSTERING_INFORMATION for the table's current layout on key_expr."""
+    name = ".".join(table)
+    key = key_expr.replace("'", "''")
+    raw = _fetch(conn, f"SELECT SYSTEM$CLUSTERING_INFORMATION('{name}', '({key})')")
+    return json.loads(raw[0][0])
+
+
+def advise(builders, conn):
+    """One recommendation dict per source table read by the builders."""
+    uses, n_statements = mine_workload(builders)
+    tables = sorted({t for t, _, _ in uses})
+    columns, info = table_metadata(tables, conn)
+    print(f"[{datetime.now()}] Mined {n_statements} statements over {len(tables)} source tables")
+
+    recommendations = []
+    for table in tables:
+        name = ".".join(table)
+        types = columns.get(table)
+        if not types:
+            print(f"  ! {name}: not visible in INFORMATION_SCHEMA, skipped")
+            continue
+        ttype, current_key, rows = info.get(table, (None, None, None))
+        weights, by_kind, groups = Counter(), Counter(), Counter()
+        for (t, col, kind), n in uses.items():
+            if t != table or col not in types:
+                continue
+            if kind == "group":
+                groups[col] += n
+            else:
+                weights[col] += n
+                by_kind[(col, kind)] += n
+        # a column's kind is its dominant predicate; dates are always treated as ranges
+        kinds = {
+            c: "range" if types[c] in _DATE_TYPES or by_kind[(c, "range")] > by_kind[(c, "eq")] else "eq"
+            for c in weights
+        }
+        rec = {
+            "table": name, "table_type": ttype, "rows": rows, "current_key": current_key,
+            "filters": weights.most_common(), "group_keys": groups.most_common(5),
+            "candidates": [], "recommended": None, "search_optimization": [],
+        }
+        if ttype != "BASE TABLE":
+            rec["note"] = f"{ttype or 'unknown type'}: clustering applies to the underlying table"
+            recommendations.append(rec)
+            continue
+
+        filters = [(c, kinds[c], n) for c, n in weights.most_common()]
+        best = None
+        for key, expr in candidate_keys(filters, types):
+            try:
+                ci = clustering_information(table, expr, conn)
+            except Exception as e:
+                print(f"  ! {name} ({expr}): {e}")
+                continue
+            partitions = max(ci.get("total_partition_count", 0), 1)
+            scanned = min(1.0, ci.get("average_depth", partitions) / partitions)
+            covered = sum(weights[c] for c in key)
+            cand = {"key": expr, "columns": len(key), "average_depth": ci.get("average_depth"),
+                    "partitions": partitions, "scanned_fraction": round(scanned, 4),
+                    "filter_uses_covered": covered}
+            rec["candidates"].append(cand)
+            # the key serving most of the workload wins; fewer columns break ties
+            if best is None or (covered, -len(key)) > (best["filter_uses_covered"], -best["columns"]):
+                best = cand
+        # recommend it only if the table is big enough and prunes poorly on it today
+        if best and best["partitions"] < MIN_PARTITIONS:
+            rec["note"] = f"only {best['partitions']} partitions; clustering would not pay off"
+        elif best and best["scanned_fraction"] >= MIN_SCANNED_FRACTION:
+            rec["recommended"] = best["key"]
+        elif best:
+            rec["note"] = f"already prunes well on ({best['key']})"
+
+        # Search optimization helps selective point lookups, not low-cardinality filters
+        for col, kind, _ in filters:
+            if kind != "eq":
+                continue
+            distinct = _fetch(conn, f"SELECT APPROX_COUNT_DISTINCT({col}) FROM {name} SAMPLE SYSTEM (1)")[0][0]
+            if distinct and distinct >= SO_MIN_DISTINCT:
+                cost = _fetch(conn, f"SELECT SYSTEM$ESTIMATE_SEARCH_OPTIMIZATION_COSTS('{name}', 'EQUALITY({col})')")
+                rec["search_optimization"].append({"column": col, "approx_distinct": distinct,
+                                                   "estimate": json.loads(cost[0][0])})
+        recommendations.append(rec)
+    return recommendations
+
+
+# ─────────────────────────── REPORT / APPLY ───────────────────────────
+def print_report(recommendations):
+    for rec in recommendations:
+        print(f"\n{rec['table']}  ({rec['table_type']}, {rec['rows'] or 0:,} rows, current key: {rec['current_key'] or 'none'})")
+        print(f"  filters:    {', '.join(f'{c}×{n}' for c, n in rec['filters']) or '-'}")
+        print(f"  group keys: {', '.join(f'{c}×{n}' for c, n in rec['group_keys']) or '-'}")
+        if rec.get("note"):
+            print(f"  {rec['note']}")
+        for cand in rec["candidates"]:
+            print(f"    ({cand['key']}): depth {cand['average_depth']} over {cand['partitions']} partitions, "
+                  f"~{cand['scanned_fraction']:.1%} scanned per filter, covers {cand['filter_uses_covered']} uses")
+        if rec["recommended"]:
+            print(f"  → CLUSTER BY ({rec['recommended']})")
+        for so in rec["search_optimization"]:
+            print(f"  → SEARCH OPTIMIZATION ON EQUALITY({so['column']}) (~{so['approx_distinct']:,} distinct); "
+                  f"estimate: {json.dumps(so['estimate'].get('costPositions', so['estimate']))}")
+
+
+def apply_to_clones(recommendations, target_schema, conn, search_optimization=False):
+    """Zero-copy clone each advised table into target_schema and set the advised key there."""
+    _fetch(conn, f"CREATE SCHEMA IF NOT EXISTS {target_schema}")
+    for rec in recommendations:
+        if not rec["recommended"] and not (search_optimization and rec["search_optimization"]):
+            continue
+        clone = f"{target_schema}.{rec['table'].replace('.', '__')}"
+        try:
+            _fetch(conn, f"CREATE OR REPLACE TABLE {clone} CLONE {rec['table']}")
+            if rec["recommended"]:
+                _fetch(conn, f"ALTER TABLE {clone} CLUSTER BY ({rec['recommended']})")
+            if search_optimization:
+                for so in rec["search_optimization"]:
+                    _fetch(conn, f"ALTER TABLE {clone} ADD SEARCH OPTIMIZATION ON EQUALITY({so['column']})")
+            print(f"  ✓ {clone}")
+        except Exception as e:
+            print(f"  ✗ {clone}: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend clustering keys for the builders' source tables.")
+    parser.add_argument("--builders", nargs="+", choices=list(BUILDERS), default=list(BUILDERS))
+    parser.add_argument("--apply-to", metavar="DB.SCHEMA",
+                        help="clone advised tables into this schema and set the advised keys there "
+                             "(automatic clustering on the clones consumes credits)")
+    parser.add_argument("--search-optimization", action="store_true",
+                        help="with --apply-to, also add the advised search optimization")
+    parser.add_argument("--json", metavar="PATH", help="also write the recommendations as JSON")
+    args = parser.parse_args(argv)
+
+    conn = postings.provider.connect()
+    try:
+        recommendations = advise(args.builders, conn)
+        print_report(recommendations)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(recommendations, f, indent=2, default=str)
+        if args.apply_to:
+            print(f"\n[{datetime.now()}] Applying to clones in {args.apply_to}...")
+            apply_to_clones(recommendations, args.apply_to, conn, args.search_optimization)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
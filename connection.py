@@ -0,0 +1,93 @@
+# connection.py
+# Lazy Snowflake connection settings and statement helpers for the
+# release-comparison builders.
+#
+# Importing a builder reads no config and needs no credentials; they are looked
+# up on first use and cached. Credentials come from, in order:
+#
+#   1. SNOWFLAKE_USER / SNOWFLAKE_PASSWORD / SNOWFLAKE_WAREHOUSE
+#      (SNOWFLAKE_ACCOUNT optionally overrides the account)
+#   2. a config.py profile defining credentials = {"USERNAME", "PASSWORD",
+#      "WAREHOUSE"}: $RELEASE_COMPARISONS_CONFIG, else DEFAULT_CONFIG_PATH
+
+import importlib.util
+import os
+
+ACCOUNT = "PCA67849"
+DEFAULT_CONFIG_PATH = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Documents\Python\config.py"
+CONFIG_ENV = "RELEASE_COMPARISONS_CONFIG"
+
+_ENV_KEYS = {"USERNAME": "SNOWFLAKE_USER", "PASSWORD": "SNOWFLAKE_PASSWORD", "WAREHOUSE": "SNOWFLAKE_WAREHOUSE"}
+
+
+def _load_config(path):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"Config file not found: {path} "
+            f"(set {', '.join(_ENV_KEYS.values())} or {CONFIG_ENV} instead)"
+        )
+    spec = importlib.util.spec_from_file_location("config", path)
+    config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(config)
+    return config.credentials
+
+
+class ConnectionProvider:
+    def __init__(self, database: str, schema: str, account: str | None = None, config_path: str | None = None):
+        self.database = database
+        self.schema = schema
+        self.account = account or os.environ.get("SNOWFLAKE_ACCOUNT", ACCOUNT)
+        self.config_path = config_path or os.environ.get(CONFIG_ENV, DEFAULT_CONFIG_PATH)
+        self._credentials = None
+
+    @property
+    def credentials(self) -> dict:
+        """USERNAME / PASSWORD / WAREHOUSE, from the environment if set there, else the config file."""
+        if self._credentials is None:
+            env = {key: os.environ.get(var) for key, var in _ENV_KEYS.items()}
+            if all(env.values()):
+                self._credentials = env
+            else:
+                self._credentials = {**_load_config(self.config_path),
+                                     **{k: v for k, v in env.items() if v}}
+        return self._credentials
+
+    @property
+    def warehouse(self) -> str:
+        return self.credentials["WAREHOUSE"]
+
+    def connect(self, **overrides):
+        """New snowflake.connector connection; keyword arguments override the defaults."""
+        import snowflake.connector as snow  # deferred so importing a builder stays cheap
+
+        params = dict(
+            user=self.credentials["USERNAME"], password=self.credentials["PASSWORD"],
+            account=self.account, warehouse=self.warehouse,
+            database=self.database, schema=self.schema,
+        )
+        params.update(overrides)
+        return snow.connect(**params)
+
+
+def execute_ddl(query, conn):
+    """Run one statement and commit (roll back and re-raise on failure)."""
+    cur = conn.cursor()
+    try:
+        cur.execute(query)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cur.close()
+
+
+def fetch_rows(query, conn):
+    """All rows of `query` as a list of tuples."""
+    cur = conn.cursor()
+    try:
+        cur.execute(query)
+        return cur.fetchall()
+    finally:
+        cur.close()
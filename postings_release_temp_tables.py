@@ -8,12 +8,18 @@
 #
 # Output: PROJECT_DATA.POSTINGS_RELEASE_COMPARISONS
 
-import snowflake.connector as snow
 from datetime import datetime
 import os
-import importlib.util
-import requests
-import json
+import argparse
+import heapq
+from itertools import combinations
+import re
+import pandas as pd
+from bls_client import BLSClient
+from build_telemetry import BuildTelemetry, check_budget, explain_scan, parse_bytes, print_plan
+from connection import ConnectionProvider, execute_ddl, fetch_rows
+from publish import SchemaPublisher
+from query_ir import Join, Select, Source, Statement, plan_shared
 
 # ─────────────────────────── SOURCE TABLES ───────────────────────────
 V1_TABLE = "revelio_clean.v1.bgi_postings"
@@ -33,9 +39,17 @@ LC_ID = "id"
 FULL_MIN_YEAR = 2015
 TABLE_PREFIX = "BGI_REL"
 
+# z-score for the analytic confidence intervals on share differences (95%)
+CI_Z = 1.96
+_DIFF_PAIRS = [("v1", "v2"), ("v1", "lc"), ("v2", "lc")]
+
+# Example postings kept per displayed bar (top-N values per source / diff pair)
+EXAMPLE_TOP_N = 25
+EXAMPLES_PER_VALUE = 5
+
 # ─────────────────────────── BLS JOLTS STATE DATA ────────────────────────
-BLS_API_KEY = "3de7ff442de94a6e9b5fd3249b98b077"
-BLS_URL = "https://api.bls.gov/publicAPI/v2/timeseries/data/"
+BLS_API_KEY = os.environ.get("BLS_API_KEY")
+JOLTS_STATE_YEAR = 2024
 
 STATE_FIPS = {
     "01": "ALABAMA", "02": "ALASKA", "04": "ARIZONA", "05": "ARKANSAS",
@@ -54,34 +68,21 @@ STATE_FIPS = {
 }
 
 # ─────────────────────────── SNOWFLAKE CONNECTION ─────────────────────────
-config_file_path = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Documents\Python\config.py"
-
-if not os.path.isfile(config_file_path):
-    raise FileNotFoundError(f"Config file not found: {config_file_path}")
-
-spec = importlib.util.spec_from_file_location("config", config_file_path)
-config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(config)
-
-user = config.credentials['USERNAME']
-password = config.credentials['PASSWORD']
-account = 'PCA67849'
-warehouse = config.credentials['WAREHOUSE']
 database = 'PROJECT_DATA'
 schema = 'POSTINGS_RELEASE_COMPARISONS'
+# Credentials are looked up on first connect (env vars or config.py, see connection.py)
+provider = ConnectionProvider(database, schema)
 
 
-def execute_ddl(query, conn):
-    cur = conn.cursor()
-    try:
-        cur.execute(query)
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
+def upload_df(df, table, columns_ddl, conn):
+    """Replace `table` with df via write_pandas (staged Parquet + COPY INTO)."""
+    from snowflake.connector.pandas_tools import write_pandas  # deferred: only uploads need it
+
+    execute_ddl(f"CREATE OR REPLACE TABLE {table} ({columns_ddl})", conn)
+    success, _, nrows, _ = write_pandas(conn, df, table, quote_identifiers=False)
+    if not success:
+        raise RuntimeError(f"write_pandas into {table} did not succeed")
+    return nrows
 
 
 # ─────────────────────────── HELPERS ────────────────────────────────
@@ -118,6 +119,7 @@ TOPICS = {
                 "v1_expr": "v1.COMPANY_NAME",
                 "v2_expr": "v2.COMPANY_NAME",
                 "lc_expr": "lc.COMPANY_NAME",
+                "dictionary": True,
             }
         },
         "exclude_values_ilike": ["%Unclassified%"],
@@ -178,6 +180,7 @@ TOPICS = {
                 "v1_expr": "v1.BGI_CITY",
                 "v2_expr": "v2.BGI_CITY",
                 "lc_expr": "SUBSTR(lc.CITY_NAME, 1, LENGTH(lc.CITY_NAME) - 4)",
+                "dictionary": True,
             },
             "STATE": {
                 "v1_expr": "v1.BGI_STATE",
@@ -198,6 +201,7 @@ TOPICS = {
                 "v1_expr": "v1.BGI_TITLE_NAME",
                 "v2_expr": "v2.BGI_TITLE_NAME",
                 "lc_expr": "lc.TITLE_NAME",
+                "dictionary": True,
             }
         },
         "exclude_values_ilike": ["%Unclassified%"]
@@ -222,6 +226,23 @@ def make_comp_lc_name(topic, field):
     return f"{TABLE_PREFIX}_COMPLC_{_clean(topic)}_{_clean(field)}"
 
 
+def make_examples_name(topic, field):
+    return f"{TABLE_PREFIX}_EXAMPLES_{_clean(topic)}_{_clean(field)}"
+
+
+def make_dict_name(topic, field):
+    return f"{TABLE_PREFIX}_DICT_{_clean(topic)}_{_clean(field)}"
+
+
+def make_comp_id_name(topic, field):
+    return f"{TABLE_PREFIX}_COMPID_{_clean(topic)}_{_clean(field)}"
+
+
+def make_long_name(table_name):
+    """BGI_REL_COMP_X -> BGI_REL_LONG_COMP_X"""
+    return f"{TABLE_PREFIX}_LONG_{table_name[len(TABLE_PREFIX) + 1:]}"
+
+
 # ─────────────────────────── TOTAL COUNTS ────────────────────────────────
 
 def sql_total_counts_yearly():
@@ -282,151 +303,155 @@ def sql_total_counts_monthly():
 
 
 # ─────────────────────────── GENERIC KPI BUILDER ─────────────────────────
+# The generic builders return query_ir Statements: the per-source CTEs are
+# Select nodes, so identical ones (e.g. v1_total) can be shared across tables.
+_SOURCES = {
+    "v1": (V1_TABLE, V1_ID, V1_DATE),
+    "v2": (V2_TABLE, V2_ID, V2_DATE),
+    "lc": (LC_TABLE, LC_ID, LC_DATE),
+}
+
+
+def _and_terms(fragment):
+    """Predicates of an extra_where fragment ('\\n      AND x\\n      AND y', one term per line)."""
+    return [t.strip() for t in re.split(r"^\s*AND\s+", fragment or "", flags=re.M) if t.strip()]
+
+
+def _base_filters(src, year_cond):
+    """US + year filter for one source (LC is US-only); year_cond e.g. '>= 2015' or '= 2025'."""
+    _, _, date = _SOURCES[src]
+    country = [] if src == "lc" else [f"{src}.bgi_country = 'United States'"]
+    return country + [f"YEAR({src}.{date}) {year_cond}"]
+
+
+def _field_inputs(v1_expr, v2_expr, lc_expr, v1_from, v2_from, lc_from, exclude_ilike, extra_where):
+    """{src: (normalized value, field Source, value filters, extra_where filters)}"""
+    inputs = {}
+    for src, expr, from_sql in (("v1", v1_expr, v1_from), ("v2", v2_expr, v2_from), ("lc", lc_expr, lc_from)):
+        val = _norm(expr)
+        value_filters = [f"{val} IS NOT NULL"]
+        value_filters += [f"{val} NOT LIKE '{_esc(pat).upper()}'" for pat in exclude_ilike or []]
+        extra = _and_terms(extra_where.get(src, "") if extra_where else "")
+        inputs[src] = (val, Source.parse(from_sql), value_filters, extra)
+    return inputs
+
+
+def _q_distinct_ids(src, alias, source, filters):
+    """COUNT(DISTINCT id) over `source`"""
+    _, id_col, _ = _SOURCES[src]
+    return Select(source, (f"COUNT(DISTINCT {src}.{id_col}) AS {alias}",), tuple(filters))
+
+
+def _q_value_counts(src, val, source, filters, alias, order_by=(), limit=None, raw=None):
+    """Distinct ids per field value; with `raw` (the field's raw expression), also
+    {src}_examples: up to EXAMPLES_PER_VALUE example postings sampled in the same pass"""
+    _, id_col, _ = _SOURCES[src]
+    cols = (f"{val} AS field_value", f"COUNT(DISTINCT {src}.{id_col}) AS {alias}")
+    if raw is not None:
+        cols += (f"{_example_sample(src, raw)} AS {src}_examples",)
+    return Select(source, cols, tuple(filters), group_by=("1",), order_by=order_by, limit=limit)
+
+
+def _q_total(src, year_cond, extra):
+    table, _, _ = _SOURCES[src]
+    return _q_distinct_ids(src, f"total_{src}", Source(table, src), _base_filters(src, year_cond) + extra)
+
 
 def sql_generic_kpis(v1_expr, v2_expr, lc_expr,
                      v1_from, v2_from, lc_from,
                      exclude_ilike=None, extra_where=None):
     """KPI totals + coverage for v1, v2, lc (filtered to >= FULL_MIN_YEAR)"""
-    v1_val, v2_val, lc_val = _norm(v1_expr), _norm(v2_expr), _norm(lc_expr)
+    inputs = _field_inputs(v1_expr, v2_expr, lc_expr, v1_from, v2_from, lc_from, exclude_ilike, extra_where)
+    year = f">= {FULL_MIN_YEAR}"
+    ctes = []
+    for src, (val, source, value_filters, extra) in inputs.items():
+        ctes.append((f"{src}_total", _q_total(src, year, extra)))
+        ctes.append((f"{src}_cov", _q_distinct_ids(
+            src, f"covered_{src}", source, _base_filters(src, year) + value_filters + extra)))
+    return Statement(ctes, """SELECT total_v1, covered_v1, total_v2, covered_v2, total_lc, covered_lc
+FROM v1_total, v1_cov, v2_total, v2_cov, lc_total, lc_cov
+""")
 
-    excl_v1 = excl_v2 = excl_lc = ""
-    if exclude_ilike:
-        for pat in exclude_ilike:
-            p = _esc(pat).upper()
-            excl_v1 += f"\n      AND {v1_val} NOT LIKE '{p}'"
-            excl_v2 += f"\n      AND {v2_val} NOT LIKE '{p}'"
-            excl_lc += f"\n      AND {lc_val} NOT LIKE '{p}'"
 
-    ew_v1 = extra_where.get("v1", "") if extra_where else ""
-    ew_v2 = extra_where.get("v2", "") if extra_where else ""
-    ew_lc = extra_where.get("lc", "") if extra_where else ""
+# ─────────────────────────── GENERIC COMP BUILDER ────────────────────────
+# The per-source value counts (v1_ind / v2_ind / lc_ind) also sample example
+# postings per value in the same aggregation; COMP does not select them, the
+# EXAMPLES table reads them through the shared subquery (see EXAMPLE POSTINGS).
 
-    return f"""
-WITH
-v1_total AS (
-    SELECT COUNT(DISTINCT v1.{V1_ID}) AS total_v1
-    FROM {V1_TABLE} v1
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) >= {FULL_MIN_YEAR}{ew_v1}
-),
-v1_cov AS (
-    SELECT COUNT(DISTINCT v1.{V1_ID}) AS covered_v1
-    FROM {v1_from}
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) >= {FULL_MIN_YEAR}
-      AND {v1_val} IS NOT NULL{excl_v1}{ew_v1}
-),
-v2_total AS (
-    SELECT COUNT(DISTINCT v2.{V2_ID}) AS total_v2
-    FROM {V2_TABLE} v2
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) >= {FULL_MIN_YEAR}{ew_v2}
-),
-v2_cov AS (
-    SELECT COUNT(DISTINCT v2.{V2_ID}) AS covered_v2
-    FROM {v2_from}
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) >= {FULL_MIN_YEAR}
-      AND {v2_val} IS NOT NULL{excl_v2}{ew_v2}
-),
-lc_total AS (
-    SELECT COUNT(DISTINCT lc.{LC_ID}) AS total_lc
-    FROM {LC_TABLE} lc
-    WHERE YEAR(lc.{LC_DATE}) >= {FULL_MIN_YEAR}{ew_lc}
-),
-lc_cov AS (
-    SELECT COUNT(DISTINCT lc.{LC_ID}) AS covered_lc
-    FROM {lc_from}
-    WHERE YEAR(lc.{LC_DATE}) >= {FULL_MIN_YEAR}
-      AND {lc_val} IS NOT NULL{excl_lc}{ew_lc}
-)
-SELECT total_v1, covered_v1, total_v2, covered_v2, total_lc, covered_lc
-FROM v1_total, v1_cov, v2_total, v2_cov, lc_total, lc_cov
-"""
+def _q_comp_values(src, inputs, raw):
+    """{src}_ind: 2025 value counts (+ example samples) for one source"""
+    val, source, value_filters, extra = inputs[src]
+    return _q_value_counts(src, val, source, _base_filters(src, "= 2025") + value_filters + extra,
+                           f"{src}_count", raw=raw)
 
 
-# ─────────────────────────── GENERIC COMP BUILDER ────────────────────────
+def _diff_ci_cols():
+    """%-point difference, 95% CI and z-score for every source pair.
+
+    Shares are treated as multinomial proportions, so each share has variance
+    p(1-p)/n and the two sources are independent samples. v1 and v2 are
+    overlapping releases of largely the same postings (positively correlated),
+    so their intervals are conservative; the app's CI caption says so.
+    """
+    cols = []
+    for a, b in _DIFF_PAIRS:
+        var_a = f"IFF(total_{a} > 0, {a}_frac * (1 - {a}_frac) / total_{a}, 0)"
+        var_b = f"IFF(total_{b} > 0, {b}_frac * (1 - {b}_frac) / total_{b}, 0)"
+        se = f"SQRT({var_a} + {var_b})"
+        cols.append(f"""
+    {a}_frac - {b}_frac AS {a}_{b}_diff,
+    {a}_frac - {b}_frac - {CI_Z} * {se} AS {a}_{b}_ci_lo,
+    {a}_frac - {b}_frac + {CI_Z} * {se} AS {a}_{b}_ci_hi,
+    ({a}_frac - {b}_frac) / NULLIF({se}, 0) AS {a}_{b}_z""")
+    return ",".join(cols)
+
 
 def sql_generic_compare(v1_expr, v2_expr, lc_expr,
                         v1_from, v2_from, lc_from,
                         exclude_ilike=None, extra_where=None):
-    """Distribution comparison for a single field across v1, v2, lc"""
-    v1_val, v2_val, lc_val = _norm(v1_expr), _norm(v2_expr), _norm(lc_expr)
-
-    excl_v1 = excl_v2 = excl_lc = ""
-    if exclude_ilike:
-        for pat in exclude_ilike:
-            p = _esc(pat).upper()
-            excl_v1 += f"\n      AND {v1_val} NOT LIKE '{p}'"
-            excl_v2 += f"\n      AND {v2_val} NOT LIKE '{p}'"
-            excl_lc += f"\n      AND {lc_val} NOT LIKE '{p}'"
-
-    ew_v1 = extra_where.get("v1", "") if extra_where else ""
-    ew_v2 = extra_where.get("v2", "") if extra_where else ""
-    ew_lc = extra_where.get("lc", "") if extra_where else ""
-
-    return f"""
-WITH
-v1_ind AS (
-    SELECT {v1_val} AS field_value, COUNT(DISTINCT v1.{V1_ID}) AS v1_count
-    FROM {v1_from}
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) = 2025
-      AND {v1_val} IS NOT NULL{excl_v1}{ew_v1}
-    GROUP BY 1
-),
-v1_total AS (
-    SELECT COUNT(DISTINCT v1.{V1_ID}) AS total_v1
-    FROM {V1_TABLE} v1
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) = 2025{ew_v1}
-),
-v2_ind AS (
-    SELECT {v2_val} AS field_value, COUNT(DISTINCT v2.{V2_ID}) AS v2_count
-    FROM {v2_from}
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) = 2025
-      AND {v2_val} IS NOT NULL{excl_v2}{ew_v2}
-    GROUP BY 1
-),
-v2_total AS (
-    SELECT COUNT(DISTINCT v2.{V2_ID}) AS total_v2
-    FROM {V2_TABLE} v2
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) = 2025{ew_v2}
-),
-lc_ind AS (
-    SELECT {lc_val} AS field_value, COUNT(DISTINCT lc.{LC_ID}) AS lc_count
-    FROM {lc_from}
-    WHERE YEAR(lc.{LC_DATE}) = 2025
-      AND {lc_val} IS NOT NULL{excl_lc}{ew_lc}
-    GROUP BY 1
-),
-lc_total AS (
-    SELECT COUNT(DISTINCT lc.{LC_ID}) AS total_lc
-    FROM {LC_TABLE} lc
-    WHERE YEAR(lc.{LC_DATE}) = 2025{ew_lc}
-),
-all_values AS (
-    SELECT field_value FROM v1_ind
+    """Distribution comparison for a single field across v1, v2, lc,
+    with confidence intervals on the pairwise share differences"""
+    inputs = _field_inputs(v1_expr, v2_expr, lc_expr, v1_from, v2_from, lc_from, exclude_ilike, extra_where)
+    raws = {"v1": v1_expr, "v2": v2_expr, "lc": lc_expr}
+    ctes = []
+    for src in inputs:
+        ctes.append((f"{src}_ind", _q_comp_values(src, inputs, raws[src])))
+        ctes.append((f"{src}_total", _q_total(src, "= 2025", inputs[src][3])))
+    ctes.append(("all_values", """    SELECT field_value FROM v1_ind
     UNION SELECT field_value FROM v2_ind
-    UNION SELECT field_value FROM lc_ind
-)
-SELECT
-    av.field_value,
-    COALESCE(v1_ind.v1_count, 0) AS v1_count,
-    CASE WHEN v1_total.total_v1 > 0
-         THEN COALESCE(v1_ind.v1_count, 0) / v1_total.total_v1
-         ELSE 0 END AS v1_frac,
-    COALESCE(v2_ind.v2_count, 0) AS v2_count,
-    CASE WHEN v2_total.total_v2 > 0
-         THEN COALESCE(v2_ind.v2_count, 0) / v2_total.total_v2
-         ELSE 0 END AS v2_frac,
-    COALESCE(lc_ind.lc_count, 0) AS lc_count,
-    CASE WHEN lc_total.total_lc > 0
-         THEN COALESCE(lc_ind.lc_count, 0) / lc_total.total_lc
-         ELSE 0 END AS lc_frac
-FROM all_values av
-LEFT JOIN v1_ind ON av.field_value IS NOT DISTINCT FROM v1_ind.field_value
-LEFT JOIN v2_ind ON av.field_value IS NOT DISTINCT FROM v2_ind.field_value
-LEFT JOIN lc_ind ON av.field_value IS NOT DISTINCT FROM lc_ind.field_value
-CROSS JOIN v1_total
-CROSS JOIN v2_total
-CROSS JOIN lc_total
+    UNION SELECT field_value FROM lc_ind"""))
+    ctes.append(("comp", """    SELECT
+        av.field_value,
+        COALESCE(v1_ind.v1_count, 0) AS v1_count,
+        CASE WHEN v1_total.total_v1 > 0
+             THEN COALESCE(v1_ind.v1_count, 0) / v1_total.total_v1
+             ELSE 0 END AS v1_frac,
+        COALESCE(v2_ind.v2_count, 0) AS v2_count,
+        CASE WHEN v2_total.total_v2 > 0
+             THEN COALESCE(v2_ind.v2_count, 0) / v2_total.total_v2
+             ELSE 0 END AS v2_frac,
+        COALESCE(lc_ind.lc_count, 0) AS lc_count,
+        CASE WHEN lc_total.total_lc > 0
+             THEN COALESCE(lc_ind.lc_count, 0) / lc_total.total_lc
+             ELSE 0 END AS lc_frac,
+        v1_total.total_v1,
+        v2_total.total_v2,
+        lc_total.total_lc
+    FROM all_values av
+    LEFT JOIN v1_ind ON av.field_value IS NOT DISTINCT FROM v1_ind.field_value
+    LEFT JOIN v2_ind ON av.field_value IS NOT DISTINCT FROM v2_ind.field_value
+    LEFT JOIN lc_ind ON av.field_value IS NOT DISTINCT FROM lc_ind.field_value
+    CROSS JOIN v1_total
+    CROSS JOIN v2_total
+    CROSS JOIN lc_total"""))
+    return Statement(ctes, f"""SELECT
+    field_value,
+    v1_count, v1_frac,
+    v2_count, v2_frac,
+    lc_count, lc_frac,{_diff_ci_cols()}
+FROM comp
 ORDER BY v2_count DESC NULLS LAST, v1_count DESC NULLS LAST
-"""
+""")
 
 
 # ─────────────────────── LC-SORTED COMP BUILDER (top 25 by LC) ───────────
@@ -435,61 +460,20 @@ def sql_generic_compare_lc(v1_expr, v2_expr, lc_expr,
                            v1_from, v2_from, lc_from,
                            exclude_ilike=None, extra_where=None):
     """Same as sql_generic_compare but sorted by lc_count and limited to top 25."""
-    v1_val, v2_val, lc_val = _norm(v1_expr), _norm(v2_expr), _norm(lc_expr)
-
-    excl_v1 = excl_v2 = excl_lc = ""
-    if exclude_ilike:
-        for pat in exclude_ilike:
-            p = _esc(pat).upper()
-            excl_v1 += f"\n      AND {v1_val} NOT LIKE '{p}'"
-            excl_v2 += f"\n      AND {v2_val} NOT LIKE '{p}'"
-            excl_lc += f"\n      AND {lc_val} NOT LIKE '{p}'"
-
-    ew_v1 = extra_where.get("v1", "") if extra_where else ""
-    ew_v2 = extra_where.get("v2", "") if extra_where else ""
-    ew_lc = extra_where.get("lc", "") if extra_where else ""
-
-    return f"""
-WITH
-lc_top AS (
-    SELECT {lc_val} AS field_value, COUNT(DISTINCT lc.{LC_ID}) AS lc_count
-    FROM {lc_from}
-    WHERE YEAR(lc.{LC_DATE}) = 2025
-      AND {lc_val} IS NOT NULL{excl_lc}{ew_lc}
-    GROUP BY 1
-    ORDER BY 2 DESC
-    LIMIT 25
-),
-lc_total AS (
-    SELECT COUNT(DISTINCT lc.{LC_ID}) AS total_lc
-    FROM {LC_TABLE} lc
-    WHERE YEAR(lc.{LC_DATE}) = 2025{ew_lc}
-),
-v1_ind AS (
-    SELECT {v1_val} AS field_value, COUNT(DISTINCT v1.{V1_ID}) AS v1_count
-    FROM {v1_from}
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) = 2025
-      AND {v1_val} IS NOT NULL{excl_v1}{ew_v1}
-    GROUP BY 1
-),
-v1_total AS (
-    SELECT COUNT(DISTINCT v1.{V1_ID}) AS total_v1
-    FROM {V1_TABLE} v1
-    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) = 2025{ew_v1}
-),
-v2_ind AS (
-    SELECT {v2_val} AS field_value, COUNT(DISTINCT v2.{V2_ID}) AS v2_count
-    FROM {v2_from}
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) = 2025
-      AND {v2_val} IS NOT NULL{excl_v2}{ew_v2}
-    GROUP BY 1
-),
-v2_total AS (
-    SELECT COUNT(DISTINCT v2.{V2_ID}) AS total_v2
-    FROM {V2_TABLE} v2
-    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) = 2025{ew_v2}
-)
-SELECT
+    inputs = _field_inputs(v1_expr, v2_expr, lc_expr, v1_from, v2_from, lc_from, exclude_ilike, extra_where)
+    lc_val, lc_source, lc_value_filters, lc_extra = inputs["lc"]
+    ctes = [
+        ("lc_top", _q_value_counts("lc", lc_val, lc_source,
+                                   _base_filters("lc", "= 2025") + lc_value_filters + lc_extra,
+                                   "lc_count", order_by=("2 DESC",), limit=25)),
+        ("lc_total", _q_total("lc", "= 2025", lc_extra)),
+    ]
+    raws = {"v1": v1_expr, "v2": v2_expr}
+    for src in ("v1", "v2"):
+        # identical to COMP's {src}_ind, so the two share one materialized subquery
+        ctes.append((f"{src}_ind", _q_comp_values(src, inputs, raws[src])))
+        ctes.append((f"{src}_total", _q_total(src, "= 2025", inputs[src][3])))
+    return Statement(ctes, """SELECT
     lt.field_value,
     COALESCE(v1_ind.v1_count, 0) AS v1_count,
     CASE WHEN v1_total.total_v1 > 0
@@ -510,9 +494,142 @@ CROSS JOIN v1_total
 CROSS JOIN v2_total
 CROSS JOIN lc_total
 ORDER BY lt.lc_count DESC
+""")
+
+
+# ─────────────────────── LONG-FORMAT CHART TABLES ────────────────────────
+# One row per (value, source), ready to hand to Altair without reshaping.
+# VALUE_RANK is the wide table's display order (shared by a value's rows),
+# RANK_BY_SOURCE the value's rank by that source's own count.
+NULL_LABEL = "<NULL>"  # must match NULL_LABEL in rev_version_comparison_app.py
+
+
+def sql_long_comp(comp_name, sort_by=("v2", "v1")):
+    """Long (FIELD_VALUE, SOURCE, CNT, FRAC, RANK_BY_SOURCE, VALUE_RANK) from a COMP / COMPLC table."""
+    order = ", ".join(f"{src}_count DESC NULLS LAST" for src in sort_by)
+    selects = "\nUNION ALL\n".join(
+        f"SELECT FIELD_VALUE, '{src}' AS SOURCE, {src}_count AS CNT, {src}_frac AS FRAC,\n"
+        f"       {src}_rank AS RANK_BY_SOURCE, VALUE_RANK\nFROM ranked"
+        for src in ("v1", "v2", "lc")
+    )
+    ranks = ",\n".join(f"           RANK() OVER (ORDER BY {src}_count DESC) AS {src}_rank"
+                        for src in ("v1", "v2", "lc"))
+    return f"""
+WITH ranked AS (
+    SELECT COALESCE(field_value, '{NULL_LABEL}') AS FIELD_VALUE,
+           v1_count, v1_frac, v2_count, v2_frac, lc_count, lc_frac,
+{ranks},
+           ROW_NUMBER() OVER (ORDER BY {order}, field_value) AS VALUE_RANK
+    FROM {comp_name}
+)
+{selects}
+ORDER BY VALUE_RANK, SOURCE
+"""
+
+
+# ─────────────────────── DICTIONARY-ENCODED COMP FACTS ───────────────────
+# Fields flagged "dictionary" in TOPICS (titles, employers, cities) also get a
+# value dictionary BGI_REL_DICT_* (ID -> FIELD_VALUE) and an id-keyed copy of
+# their COMP table, BGI_REL_COMPID_*, so the app ships integers and decodes
+# only the rows it displays. The dictionary is append-only and carried into
+# each build by the shadow clone, so ids are stable across builds.
+
+def sql_dictionary_append(dict_name, comp_name):
+    """Give every new non-NULL value in the COMP table the next free id."""
+    return f"""
+INSERT INTO {dict_name} (ID, FIELD_VALUE)
+SELECT (SELECT COALESCE(MAX(ID), 0) FROM {dict_name}) + ROW_NUMBER() OVER (ORDER BY c.field_value),
+       c.field_value
+FROM {comp_name} c
+WHERE c.field_value IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM {dict_name} d WHERE d.FIELD_VALUE = c.field_value)
+"""
+
+
+def dictionary_updater(dict_name, comp_name):
+    """Run-step that creates the dictionary if needed and appends new values."""
+    def update_dictionary(conn):
+        execute_ddl(f"CREATE TABLE IF NOT EXISTS {dict_name} "
+                    f"(ID NUMBER NOT NULL, FIELD_VALUE VARCHAR NOT NULL)", conn)
+        execute_ddl(sql_dictionary_append(dict_name, comp_name), conn)
+    return update_dictionary
+
+
+def sql_comp_ids(comp_name, dict_name):
+    """COMP facts keyed by dictionary id; FIELD_ID is NULL for the NULL value."""
+    return f"""
+SELECT d.ID AS FIELD_ID, c.* EXCLUDE (field_value)
+FROM {comp_name} c
+LEFT JOIN {dict_name} d ON d.FIELD_VALUE = c.field_value
+ORDER BY c.v2_count DESC NULLS LAST, c.v1_count DESC NULLS LAST
 """
 
 
+# ─────────────────────── EXAMPLE POSTINGS (drill-down) ────────────────────
+
+# Key columns shown next to each example posting
+_EXAMPLE_COLS = {
+    "v1": {"id": f"v1.{V1_ID}", "date": f"v1.{V1_DATE}", "title": "v1.BGI_TITLE_NAME",
+           "company": "v1.COMPANY_NAME", "city": "v1.BGI_CITY", "state": "v1.BGI_STATE"},
+    "v2": {"id": f"v2.{V2_ID}", "date": f"v2.{V2_DATE}", "title": "v2.BGI_TITLE_NAME",
+           "company": "v2.COMPANY_NAME", "city": "v2.BGI_CITY", "state": "v2.BGI_STATE"},
+    "lc": {"id": f"lc.{LC_ID}", "date": f"lc.{LC_DATE}", "title": "lc.TITLE_NAME",
+           "company": "lc.COMPANY_NAME", "city": "lc.CITY_NAME", "state": "lc.STATE_NAME"},
+}
+
+
+def _example_sample(src, raw):
+    """Up to EXAMPLES_PER_VALUE postings of the group, picked by HASH(id) so reruns
+    return the same postings (an aggregate: goes in the value-count GROUP BY)"""
+    cols = _EXAMPLE_COLS[src]
+    obj = (f"OBJECT_CONSTRUCT('RAW_VALUE', {raw}, 'POSTING_ID', {cols['id']}::VARCHAR, "
+           f"'POST_DATE', {cols['date']}::DATE, 'TITLE', {cols['title']}, 'COMPANY', {cols['company']}, "
+           f"'CITY', {cols['city']}, 'STATE', {cols['state']})")
+    return f"MIN_BY({obj}, HASH({cols['id']}), {EXAMPLES_PER_VALUE})"
+
+
+def sql_examples(comp_name, v1_expr, v2_expr, lc_expr,
+                 v1_from, v2_from, lc_from,
+                 exclude_ilike=None, extra_where=None):
+    """Example postings for every value charted from comp_name.
+
+    Values are the top EXAMPLE_TOP_N by each source's count and by each pair's
+    absolute %-point difference. The postings are the ones sampled in COMP's
+    value counts ({src}_examples); those CTEs are the same Select nodes as
+    COMP's, so a shared build reads them from the CSE tables instead of
+    scanning the sources again.
+    """
+    inputs = _field_inputs(v1_expr, v2_expr, lc_expr, v1_from, v2_from, lc_from, exclude_ilike, extra_where)
+    raws = {"v1": v1_expr, "v2": v2_expr, "lc": lc_expr}
+
+    ranks = [f"ROW_NUMBER() OVER (ORDER BY {src}_count DESC) <= {EXAMPLE_TOP_N}"
+             for src in ("v1", "v2", "lc")]
+    ranks += [f"ROW_NUMBER() OVER (ORDER BY ABS({a}_{b}_diff) DESC) <= {EXAMPLE_TOP_N}"
+              for a, b in _DIFF_PAIRS]
+    top_values = "\n           OR ".join(ranks)
+
+    ctes = [(f"{src}_ind", _q_comp_values(src, inputs, raws[src])) for src in inputs]
+    ctes.append(("top_values", f"""    SELECT field_value
+    FROM {comp_name}
+    QUALIFY {top_values}"""))
+    selects = "\nUNION ALL\n".join(f"""SELECT '{src}' AS SOURCE,
+       i.field_value AS FIELD_VALUE,
+       e.value:RAW_VALUE::VARCHAR AS RAW_VALUE,
+       e.value:POSTING_ID::VARCHAR AS POSTING_ID,
+       e.value:POST_DATE::DATE AS POST_DATE,
+       e.value:TITLE::VARCHAR AS TITLE,
+       e.value:COMPANY::VARCHAR AS COMPANY,
+       e.value:CITY::VARCHAR AS CITY,
+       e.value:STATE::VARCHAR AS STATE
+FROM {src}_ind i, LATERAL FLATTEN(input => i.{src}_examples) e
+WHERE i.field_value IN (SELECT field_value FROM top_values)""" for src in inputs)
+    return Statement(ctes, f"""SELECT * FROM (
+{selects}
+)
+ORDER BY FIELD_VALUE, SOURCE
+""")
+
+
 # ─────────────────────────── ONET CHANGES (v1 vs v2) ────────────────────
 
 def sql_onet_changes():
@@ -550,115 +667,290 @@ def sql_onet_change_summary():
     """
 
 
-# ─────────────────────────── SALARY (v1 vs v2 only) ─────────────────────
+# ─────────────────────── POSTING-ID SKETCHES (v1 vs v2) ──────────────────
+# HLL sketches of job_id per (source, month, state, NAICS2). Sketches merge with
+# HLL_COMBINE, so in-v1-only / in-v2-only / in-both can be estimated for any
+# slice and time range without joining the two releases. Each release's own
+# state/NAICS2 decides which slice a posting falls into. ID_OVERLAP_MONTHLY
+# holds the estimates for every slice the dashboard offers, with ALL_SLICES
+# in a column that is rolled up.
+ALL_SLICES = "All"  # must match the "All" option in rev_version_comparison_app.py
 
-def sql_salary_stats():
+def sql_id_sketches():
+    return f"""
+    SELECT 'v1' AS SOURCE,
+           DATE_TRUNC('month', v1.{V1_DATE}) AS MONTH_START,
+           UPPER(TRIM(v1.BGI_STATE)) AS STATE,
+           UPPER(TRIM(v1.BGI_NAICS2_NAME)) AS NAICS2,
+           COUNT(*) AS N_ROWS,
+           HLL_ACCUMULATE(v1.{V1_ID}) AS ID_SKETCH
+    FROM {V1_TABLE} v1
+    WHERE v1.bgi_country = 'United States' AND YEAR(v1.{V1_DATE}) >= {FULL_MIN_YEAR}
+    GROUP BY 1, 2, 3, 4
+    UNION ALL
+    SELECT 'v2' AS SOURCE,
+           DATE_TRUNC('month', v2.{V2_DATE}) AS MONTH_START,
+           UPPER(TRIM(v2.BGI_STATE)) AS STATE,
+           UPPER(TRIM(v2.BGI_NAICS2_NAME)) AS NAICS2,
+           COUNT(*) AS N_ROWS,
+           HLL_ACCUMULATE(v2.{V2_ID}) AS ID_SKETCH
+    FROM {V2_TABLE} v2
+    WHERE v2.bgi_country = 'United States' AND YEAR(v2.{V2_DATE}) >= {FULL_MIN_YEAR}
+    GROUP BY 1, 2, 3, 4
+    """
+
+
+def sql_id_overlap(group_by=(), where="", rollup=()):
+    """Estimated v1-only / v2-only / both job_id counts from BGI_REL_ID_SKETCHES.
+
+    group_by: sketch columns to keep (MONTH_START, STATE, NAICS2)
+    where:    optional extra predicate on the sketch table, e.g. "STATE = 'TEXAS'"
+    rollup:   group_by columns also estimated across all their values, in rows
+              where the column is ALL_SLICES (every combination, via GROUPING SETS)
+    """
+    sketch_table = f"{TABLE_PREFIX}_ID_SKETCHES"
+    keys = ", ".join(group_by)
+    select_keys = ", ".join(f"IFF(GROUPING({c}) = 1, '{ALL_SLICES}', {c}) AS {c}" if c in rollup else c
+                            for c in group_by)
+    select_keys = f"{select_keys},\n               " if keys else ""
+    group_clause = f"GROUP BY {keys}" if keys else ""
+    if rollup:
+        sets = [[c for c in group_by if c not in dropped]
+                for n in range(len(rollup) + 1) for dropped in combinations(rollup, n)]
+        group_clause = "GROUP BY GROUPING SETS (" + ", ".join(f"({', '.join(cols)})" for cols in sets) + ")"
+    order_clause = f"ORDER BY {keys}" if keys else ""
+    where_clause = f"WHERE {where}" if where else ""
+    return f"""
+    WITH est AS (
+        SELECT {select_keys}HLL_ESTIMATE(HLL_COMBINE(IFF(SOURCE = 'v1', ID_SKETCH, NULL))) AS V1_IDS,
+               HLL_ESTIMATE(HLL_COMBINE(IFF(SOURCE = 'v2', ID_SKETCH, NULL))) AS V2_IDS,
+               HLL_ESTIMATE(HLL_COMBINE(ID_SKETCH)) AS UNION_IDS
+        FROM {sketch_table}
+        {where_clause}
+        {group_clause}
+    )
+    SELECT est.*,
+           GREATEST(UNION_IDS - V2_IDS, 0) AS V1_ONLY,
+           GREATEST(UNION_IDS - V1_IDS, 0) AS V2_ONLY,
+           GREATEST(V1_IDS + V2_IDS - UNION_IDS, 0) AS BOTH_IDS
+    FROM est
+    {order_clause}
+    """
+
+
+# ─────────────────────────── SALARY (v1 vs v2 vs lc) ────────────────────
+# The postings ⨝ SALARY_TABLE join and YEARLY_SALARY_EXPR are evaluated once,
+# into a slim fact table; every salary output below aggregates that table.
+SALARY_FACT = f"{TABLE_PREFIX}_SALARY_FACT"
+SALARY_SKETCHES = f"{TABLE_PREFIX}_SALARY_SKETCHES"
+SALARY_COUNTRIES = ("United States", "United Kingdom", "Hong Kong")
+
+# Plausibility bounds: log-salary further than K × IQR from the group median is
+# an outlier. Groups smaller than MIN_N are never flagged. The IQR is floored at
+# MIN_LOG_IQR so groups where most postings share one salary (posted pay bands,
+# IQR 0) flag only values ~2× off the median, not everything but the median.
+SALARY_OUTLIER_K = 3.0
+SALARY_BOUNDS_MIN_N = 50
+SALARY_MIN_LOG_IQR = 0.25
+
+
+def sql_salary_fact():
+    """One row per posting with a parsed salary: annualized min salary + slice keys.
+
+    IS_OUTLIER flags salaries outside median ± SALARY_OUTLIER_K × IQR of
+    LN(YEARLY_SALARY) within their (source, SOC2, SALARY_PER) group, computed
+    with window functions in the same pass. CLEAN_SALARY is YEARLY_SALARY
+    with outliers nulled out (and NULL where there is no yearly salary), so
+    clean counts are COUNT(CLEAN_SALARY).
+    """
+    countries = ", ".join(f"'{c}'" for c in SALARY_COUNTRIES)
+    group = "PARTITION BY SOURCE, SOC2, SALARY_PER"
     return f"""
+    WITH joined AS (
     SELECT 'v1' AS SOURCE,
-           MIN({YEARLY_SALARY_EXPR}) AS MIN_SALARY,
-           MAX({YEARLY_SALARY_EXPR}) AS MAX_SALARY,
-           AVG({YEARLY_SALARY_EXPR}) AS AVG_SALARY,
-           MEDIAN({YEARLY_SALARY_EXPR}) AS MEDIAN_SALARY,
-           COUNT(*) AS N_POSTINGS_WITH_SALARY
+           p.desc_id::VARCHAR AS DESC_ID,
+           YEAR(p.{V1_DATE}) AS YR,
+           p.bgi_country AS COUNTRY,
+           UPPER(TRIM(p.BGI_STATE)) AS STATE,
+           p.BGI_SOC2_NAME AS SOC2,
+           UPPER(TRIM(p.BGI_NAICS2_NAME)) AS NAICS2,
+           LOWER(sal.SALARY_PER) AS SALARY_PER,
+           {YEARLY_SALARY_EXPR} AS YEARLY_SALARY
     FROM {V1_TABLE} p
     INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
     WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-      AND p.bgi_country = 'United States'
+      AND p.bgi_country IN ({countries})
     UNION ALL
     SELECT 'v2' AS SOURCE,
-           MIN({YEARLY_SALARY_EXPR}) AS MIN_SALARY,
-           MAX({YEARLY_SALARY_EXPR}) AS MAX_SALARY,
-           AVG({YEARLY_SALARY_EXPR}) AS AVG_SALARY,
-           MEDIAN({YEARLY_SALARY_EXPR}) AS MEDIAN_SALARY,
-           COUNT(*) AS N_POSTINGS_WITH_SALARY
+           p.desc_id::VARCHAR AS DESC_ID,
+           YEAR(p.{V2_DATE}) AS YR,
+           p.bgi_country AS COUNTRY,
+           UPPER(TRIM(p.BGI_STATE)) AS STATE,
+           p.BGI_SOC2_NAME AS SOC2,
+           UPPER(TRIM(p.BGI_NAICS2_NAME)) AS NAICS2,
+           LOWER(sal.SALARY_PER) AS SALARY_PER,
+           {YEARLY_SALARY_EXPR} AS YEARLY_SALARY
     FROM {V2_TABLE} p
     INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
     WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-      AND p.bgi_country = 'United States'
+      AND p.bgi_country IN ({countries})
+    UNION ALL
+    SELECT 'lc' AS SOURCE,
+           lc.{LC_ID}::VARCHAR AS DESC_ID,
+           YEAR(lc.{LC_DATE}) AS YR,
+           'United States' AS COUNTRY,
+           UPPER(TRIM(lc.STATE_NAME)) AS STATE,
+           lc.soc_2_name AS SOC2,
+           UPPER(TRIM(lc.NAICS2_NAME)) AS NAICS2,
+           'year' AS SALARY_PER,
+           lc.SALARY_FROM AS YEARLY_SALARY
+    FROM {LC_TABLE} lc
+    WHERE lc.SALARY_FROM IS NOT NULL AND lc.SALARY_FROM > 0
+    ),
+    bounds AS (
+        SELECT joined.*,
+               MEDIAN(LN(YEARLY_SALARY)) OVER ({group}) AS LOG_MEDIAN,
+               PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY LN(YEARLY_SALARY)) OVER ({group})
+             - PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY LN(YEARLY_SALARY)) OVER ({group}) AS LOG_IQR,
+               COUNT(YEARLY_SALARY) OVER ({group}) AS GROUP_N
+        FROM joined
+    )
+    SELECT SOURCE, DESC_ID, YR, COUNTRY, STATE, SOC2, NAICS2, SALARY_PER, YEARLY_SALARY,
+           COALESCE(GROUP_N >= {SALARY_BOUNDS_MIN_N}
+                    AND ABS(LN(YEARLY_SALARY) - LOG_MEDIAN) > {SALARY_OUTLIER_K} * GREATEST(LOG_IQR, {SALARY_MIN_LOG_IQR}),
+                    FALSE) AS IS_OUTLIER,
+           IFF(IS_OUTLIER, NULL, YEARLY_SALARY) AS CLEAN_SALARY
+    FROM bounds
     """
 
 
-def sql_salary_distribution():
+def sql_salary_sketches():
+    """Mergeable t-digest salary sketches per (source, year, country, state, SOC2, NAICS2)."""
     return f"""
-    WITH v1_sal AS (
-        SELECT {YEARLY_SALARY_EXPR} AS YEARLY_SALARY
-        FROM {V1_TABLE} p
-        INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-        WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-          AND p.bgi_country = 'United States' AND YEAR(p.{V1_DATE}) = 2025
-    ),
-    v2_sal AS (
-        SELECT {YEARLY_SALARY_EXPR} AS YEARLY_SALARY
-        FROM {V2_TABLE} p
-        INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-        WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-          AND p.bgi_country = 'United States' AND YEAR(p.{V2_DATE}) = 2025
+    SELECT SOURCE, YR, COUNTRY, STATE, SOC2, NAICS2,
+           COUNT(*) AS N_POSTINGS,
+           APPROX_PERCENTILE_ACCUMULATE(YEARLY_SALARY) AS SALARY_SKETCH,
+           COUNT(CLEAN_SALARY) AS N_POSTINGS_CLEAN,
+           APPROX_PERCENTILE_ACCUMULATE(CLEAN_SALARY) AS SALARY_SKETCH_CLEAN
+    FROM {SALARY_FACT}
+    WHERE YEARLY_SALARY IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """
+
+
+def sql_salary_percentiles(percentiles=(0.1, 0.25, 0.5, 0.75, 0.9),
+                           group_by=("SOURCE",), where="", clean=False):
+    """Any salary percentiles for any slice, by merging rows of SALARY_SKETCHES.
+
+    group_by: sketch dimensions to keep, e.g. ("SOURCE", "SOC2")
+    where:    optional predicate on the sketch table, e.g. "YR = 2025 AND STATE = 'TEXAS'"
+    clean:    merge the outlier-free sketches instead
+    """
+    sfx = "_CLEAN" if clean else ""
+    keys = ", ".join(group_by)
+    where_clause = f"WHERE {where}" if where else ""
+    pct_cols = ",\n           ".join(
+        f"APPROX_PERCENTILE_ESTIMATE(SALARY_SKETCH, {p}) AS P{round(p * 100)}"
+        for p in percentiles
     )
-    SELECT 'v1' AS SOURCE,
-           CASE WHEN YEARLY_SALARY > 200000 THEN 210000
-                ELSE FLOOR(YEARLY_SALARY / 10000) * 10000 END AS SALARY_BUCKET,
-           COUNT(*) AS CNT
-    FROM v1_sal WHERE YEARLY_SALARY IS NOT NULL
-    GROUP BY 1, 2
-    UNION ALL
-    SELECT 'v2' AS SOURCE,
+    return f"""
+    WITH merged AS (
+        SELECT {keys},
+               SUM(N_POSTINGS{sfx}) AS N_POSTINGS,
+               APPROX_PERCENTILE_COMBINE(SALARY_SKETCH{sfx}) AS SALARY_SKETCH
+        FROM {SALARY_SKETCHES}
+        {where_clause}
+        GROUP BY {keys}
+    )
+    SELECT {keys}, N_POSTINGS,
+           {pct_cols}
+    FROM merged
+    ORDER BY {keys}
+    """
+
+
+def sql_salary_stats():
+    return f"""
+    SELECT SOURCE,
+           MIN(YEARLY_SALARY) AS MIN_SALARY,
+           MAX(YEARLY_SALARY) AS MAX_SALARY,
+           AVG(YEARLY_SALARY) AS AVG_SALARY,
+           MEDIAN(YEARLY_SALARY) AS MEDIAN_SALARY,
+           COUNT(*) AS N_POSTINGS_WITH_SALARY,
+           MIN(CLEAN_SALARY) AS MIN_SALARY_CLEAN,
+           MAX(CLEAN_SALARY) AS MAX_SALARY_CLEAN,
+           AVG(CLEAN_SALARY) AS AVG_SALARY_CLEAN,
+           MEDIAN(CLEAN_SALARY) AS MEDIAN_SALARY_CLEAN,
+           COUNT_IF(IS_OUTLIER) AS N_OUTLIERS
+    FROM {SALARY_FACT}
+    WHERE COUNTRY = 'United States'
+    GROUP BY 1
+    """
+
+
+def sql_salary_distribution():
+    return f"""
+    SELECT SOURCE,
            CASE WHEN YEARLY_SALARY > 200000 THEN 210000
                 ELSE FLOOR(YEARLY_SALARY / 10000) * 10000 END AS SALARY_BUCKET,
-           COUNT(*) AS CNT
-    FROM v2_sal WHERE YEARLY_SALARY IS NOT NULL
+           COUNT(*) AS CNT,
+           COUNT(CLEAN_SALARY) AS CNT_CLEAN
+    FROM {SALARY_FACT}
+    WHERE COUNTRY = 'United States' AND YR = 2025
+      AND YEARLY_SALARY IS NOT NULL
     GROUP BY 1, 2
     """
 
 
 def sql_salary_by_soc2():
     return f"""
-    SELECT 'v1' AS SOURCE, p.BGI_SOC2_NAME AS SOC2,
-           MEDIAN({YEARLY_SALARY_EXPR}) AS MEDIAN_SALARY, COUNT(*) AS N_POSTINGS
-    FROM {V1_TABLE} p
-    INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-    WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-      AND p.bgi_country = 'United States' AND p.BGI_SOC2_NAME IS NOT NULL
-      AND YEAR(p.{V1_DATE}) = 2025
-    GROUP BY 1, 2
-    UNION ALL
-    SELECT 'v2' AS SOURCE, p.BGI_SOC2_NAME AS SOC2,
-           MEDIAN({YEARLY_SALARY_EXPR}) AS MEDIAN_SALARY, COUNT(*) AS N_POSTINGS
-    FROM {V2_TABLE} p
-    INNER JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-    WHERE sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-      AND p.bgi_country = 'United States' AND p.BGI_SOC2_NAME IS NOT NULL
-      AND YEAR(p.{V2_DATE}) = 2025
+    SELECT SOURCE, SOC2,
+           MEDIAN(YEARLY_SALARY) AS MEDIAN_SALARY, COUNT(*) AS N_POSTINGS,
+           MEDIAN(CLEAN_SALARY) AS MEDIAN_SALARY_CLEAN,
+           COUNT(CLEAN_SALARY) AS N_POSTINGS_CLEAN
+    FROM {SALARY_FACT}
+    WHERE COUNTRY = 'United States' AND SOC2 IS NOT NULL
+      AND YR = 2025
     GROUP BY 1, 2
     """
 
 
 def sql_salary_coverage():
+    countries = ", ".join(f"'{c}'" for c in SALARY_COUNTRIES)
     return f"""
-    SELECT 'v1' AS SOURCE,
-           CASE WHEN p.bgi_country = 'United States' THEN 'US'
-                WHEN p.bgi_country = 'United Kingdom' THEN 'UK'
-                WHEN p.bgi_country = 'Hong Kong'      THEN 'HK' END AS COUNTRY,
-           COUNT(*) AS TOTAL_POSTINGS,
-           SUM(CASE WHEN sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-                    THEN 1 ELSE 0 END) AS POSTINGS_WITH_SALARY
-    FROM {V1_TABLE} p
-    LEFT JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-    WHERE p.bgi_country IN ('United States','United Kingdom','Hong Kong')
-      AND YEAR(p.{V1_DATE}) = 2025
-    GROUP BY 1, 2
-    UNION ALL
-    SELECT 'v2' AS SOURCE,
-           CASE WHEN p.bgi_country = 'United States' THEN 'US'
-                WHEN p.bgi_country = 'United Kingdom' THEN 'UK'
-                WHEN p.bgi_country = 'Hong Kong'      THEN 'HK' END AS COUNTRY,
-           COUNT(*) AS TOTAL_POSTINGS,
-           SUM(CASE WHEN sal.PARSED_SALARY_MIN IS NOT NULL AND sal.PARSED_SALARY_MIN > 0
-                    THEN 1 ELSE 0 END) AS POSTINGS_WITH_SALARY
-    FROM {V2_TABLE} p
-    LEFT JOIN {SALARY_TABLE} sal ON sal.desc_id = p.desc_id
-    WHERE p.bgi_country IN ('United States','United Kingdom','Hong Kong')
-      AND YEAR(p.{V2_DATE}) = 2025
-    GROUP BY 1, 2
+    WITH totals AS (
+        SELECT 'v1' AS SOURCE, bgi_country AS COUNTRY, COUNT(*) AS TOTAL_POSTINGS
+        FROM {V1_TABLE}
+        WHERE bgi_country IN ({countries}) AND YEAR({V1_DATE}) = 2025
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT 'v2' AS SOURCE, bgi_country AS COUNTRY, COUNT(*) AS TOTAL_POSTINGS
+        FROM {V2_TABLE}
+        WHERE bgi_country IN ({countries}) AND YEAR({V2_DATE}) = 2025
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT 'lc' AS SOURCE, 'United States' AS COUNTRY, COUNT(*) AS TOTAL_POSTINGS
+        FROM {LC_TABLE}
+        WHERE YEAR({LC_DATE}) = 2025
+        GROUP BY 1, 2
+    ),
+    with_salary AS (
+        SELECT SOURCE, COUNTRY,
+               COUNT(*) AS POSTINGS_WITH_SALARY,
+               COUNT(CLEAN_SALARY) AS POSTINGS_WITH_CLEAN_SALARY
+        FROM {SALARY_FACT}
+        WHERE YR = 2025
+        GROUP BY 1, 2
+    )
+    SELECT t.SOURCE,
+           CASE WHEN t.COUNTRY = 'United States' THEN 'US'
+                WHEN t.COUNTRY = 'United Kingdom' THEN 'UK'
+                WHEN t.COUNTRY = 'Hong Kong'      THEN 'HK' END AS COUNTRY,
+           t.TOTAL_POSTINGS,
+           COALESCE(s.POSTINGS_WITH_SALARY, 0) AS POSTINGS_WITH_SALARY,
+           COALESCE(s.POSTINGS_WITH_CLEAN_SALARY, 0) AS POSTINGS_WITH_CLEAN_SALARY
+    FROM totals t
+    LEFT JOIN with_salary s ON s.SOURCE = t.SOURCE AND s.COUNTRY = t.COUNTRY
     """
 
 
@@ -668,42 +960,24 @@ def fetch_and_upload_jolts_state(conn):
     """Fetch JOLTS state-level job openings (2024) via BLS API and upload to staging table."""
     # Build series IDs: JTS + 000000 (total nonfarm) + {state_fips} + 0000000 + JO + L
     series_ids = {f"JTS000000{code}0000000JOL": name for code, name in STATE_FIPS.items()}
-    all_ids = list(series_ids.keys())
-
-    # Fetch in 2 batches (API allows up to 50 per request)
-    jolts_rows = []
-    for batch in [all_ids[:26], all_ids[26:]]:
-        payload = json.dumps({
-            "seriesid": batch, "startyear": "2024", "endyear": "2024",
-            "annualaverage": True, "registrationkey": BLS_API_KEY,
-        })
-        resp = requests.post(BLS_URL, data=payload, headers={"Content-type": "application/json"})
-        resp.raise_for_status()
-        data = resp.json()
-        for series in data["Results"]["series"]:
-            sid = series["seriesID"]
-            state_name = series_ids[sid]
-            monthly_vals = [
-                float(item["value"]) * 1000
-                for item in series["data"]
-                if item["year"] == "2024" and item["period"] != "M13"
-            ]
-            if monthly_vals:
-                jolts_rows.append((state_name, round(sum(monthly_vals) / len(monthly_vals))))
+    client = BLSClient(api_key=BLS_API_KEY)
+    data = client.fetch(list(series_ids), JOLTS_STATE_YEAR, JOLTS_STATE_YEAR, annualaverage=True)
+
+    points = pd.DataFrame(
+        [(sid, p["year"], p["period"], p["value"]) for sid, pts in data.items() for p in pts],
+        columns=["SERIES_ID", "YEAR", "PERIOD", "VALUE"],
+    )
+    monthly = points[(points["YEAR"] == str(JOLTS_STATE_YEAR)) & (points["PERIOD"] != "M13")]
+    avg = pd.to_numeric(monthly["VALUE"], errors="coerce").mul(1000).groupby(monthly["SERIES_ID"]).mean().dropna()
+    result = pd.DataFrame({
+        "STATE": avg.index.map(series_ids),
+        "JOLTS_COUNT": avg.round().astype("int64").values,
+    })
 
     # Upload to staging table
     raw_table = f"{TABLE_PREFIX}_JOLTS_STATE_RAW"
-    execute_ddl(f"CREATE OR REPLACE TABLE {raw_table} (STATE VARCHAR, JOLTS_COUNT NUMBER)", conn)
-    cur = conn.cursor()
-    try:
-        cur.executemany(
-            f"INSERT INTO {raw_table} (STATE, JOLTS_COUNT) VALUES (%s, %s)",
-            jolts_rows,
-        )
-        conn.commit()
-    finally:
-        cur.close()
-    print(f"  Uploaded {len(jolts_rows)} states to {raw_table}")
+    n = upload_df(result, raw_table, "STATE VARCHAR, JOLTS_COUNT NUMBER", conn)
+    print(f"  Uploaded {n} states to {raw_table}")
 
 
 def sql_jolts_state_comparison():
@@ -740,16 +1014,16 @@ SELECT
     j.STATE,
     j.JOLTS_COUNT,
     CASE WHEN jt.total > 0 THEN ROUND(j.JOLTS_COUNT / jt.total * 100, 1) ELSE 0 END AS JOLTS_PCT,
-    COALESCE(v1.V1_COUNT, 0) AS V1_COUNT,
-    CASE WHEN v1t.total > 0 THEN ROUND(COALESCE(v1.V1_COUNT, 0) / v1t.total * 100, 1) ELSE 0 END AS V1_PCT,
-    COALESCE(v2.V2_COUNT, 0) AS V2_COUNT,
-    CASE WHEN v2t.total > 0 THEN ROUND(COALESCE(v2.V2_COUNT, 0) / v2t.total * 100, 1) ELSE 0 END AS V2_PCT,
-    COALESCE(lc.LC_COUNT, 0) AS LC_COUNT,
-    CASE WHEN lct.total > 0 THEN ROUND(COALESCE(lc.LC_COUNT, 0) / lct.total * 100, 1) ELSE 0 END AS LC_PCT
+    COALESCE(vs1.V1_COUNT, 0) AS V1_COUNT,
+    CASE WHEN v1t.total > 0 THEN ROUND(COALESCE(vs1.V1_COUNT, 0) / v1t.total * 100, 1) ELSE 0 END AS V1_PCT,
+    COALESCE(vs2.V2_COUNT, 0) AS V2_COUNT,
+    CASE WHEN v2t.total > 0 THEN ROUND(COALESCE(vs2.V2_COUNT, 0) / v2t.total * 100, 1) ELSE 0 END AS V2_PCT,
+    COALESCE(lcs.LC_COUNT, 0) AS LC_COUNT,
+    CASE WHEN lct.total > 0 THEN ROUND(COALESCE(lcs.LC_COUNT, 0) / lct.total * 100, 1) ELSE 0 END AS LC_PCT
 FROM jolts j
-LEFT JOIN v1_state v1 ON j.STATE = v1.STATE
-LEFT JOIN v2_state v2 ON j.STATE = v2.STATE
-LEFT JOIN lc_state lc ON j.STATE = lc.STATE
+LEFT JOIN v1_state vs1 ON j.STATE = vs1.STATE
+LEFT JOIN v2_state vs2 ON j.STATE = vs2.STATE
+LEFT JOIN lc_state lcs ON j.STATE = lcs.STATE
 CROSS JOIN jolts_total jt
 CROSS JOIN v1_total v1t
 CROSS JOIN v2_total v2t
@@ -758,141 +1032,917 @@ ORDER BY JOLTS_PCT DESC
 """
 
 
-# ─────────────────────────── MAIN ─────────────────────────────
-def main():
-    print(f"[{datetime.now()}] Starting BGI v1 vs v2 vs Lightcast temp table creation...")
-    print(f"  v1: {V1_TABLE}")
-    print(f"  v2: {V2_TABLE}")
-    print(f"  lc: {LC_TABLE}")
+def sql_long_jolts_state():
+    """Long (STATE, SOURCE, CNT, PCT, JOLTS_RANK) from the JOLTS state comparison, labelled for the chart."""
+    comp = f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON"
+    labels = {"JOLTS": "JOLTS", "V1": "v1", "V2": "v2", "LC": "Lightcast"}
+    selects = "\nUNION ALL\n".join(
+        f"SELECT STATE, '{label}' AS SOURCE, {col}_COUNT AS CNT, {col}_PCT AS PCT, JOLTS_RANK FROM ranked"
+        for col, label in labels.items()
+    )
+    return f"""
+WITH ranked AS (
+    SELECT INITCAP(STATE) AS STATE, JOLTS_COUNT, JOLTS_PCT, V1_COUNT, V1_PCT, V2_COUNT, V2_PCT, LC_COUNT, LC_PCT,
+           ROW_NUMBER() OVER (ORDER BY JOLTS_PCT DESC, STATE) AS JOLTS_RANK
+    FROM {comp}
+)
+{selects}
+ORDER BY JOLTS_RANK, SOURCE
+"""
 
-    conn = snow.connect(
-        user=user, password=password, account=account,
-        warehouse=warehouse, database=database, schema=schema
+
+# ─────────────────────── PUBLISH (shadow build + schema swap) ─────────────
+# Tables are built in a clone of the live schema and swapped in atomically
+# (see publish.py). The schema is shared with the overlap-sample builder
+# (postings_v1_overlapping_sample_lc_create_temp_tables.py), which publishes
+# through this same publisher and so takes the same build lock.
+publisher = SchemaPublisher(database, schema)
+SHADOW_SCHEMA = publisher.shadow_schema
+
+
+# ─────────────────────── BUILD MANIFEST + SNAPSHOTS ──────────────────────
+# Each published build is kept as a zero-copy clone named <schema>_BUILD_<id>;
+# the dashboard can point at any retained build. The overlap-sample builder
+# publishes into the same schema: each builder replaces the manifest rows of its
+# own sources, and both snapshot and prune through the functions below.
+MANIFEST_TABLE = f"{TABLE_PREFIX}_BUILD_MANIFEST"
+SNAPSHOT_PREFIX = f"{schema}_BUILD_"
+SNAPSHOTS_TO_KEEP = 8
+
+SOURCE_TABLES = {
+    "v1": V1_TABLE,
+    "v2": V2_TABLE,
+    "lc": LC_TABLE,
+    "salary": SALARY_TABLE,
+    "onet_soc_lookup": ONET_SOC_LOOKUP,
+}
+
+
+def sql_build_manifest(build_id, as_of=None, pinned=(), sources=SOURCE_TABLES):
+    """One row per source table: name, the timestamp it was read AT (if pinned),
+    and its last-altered time and row count at build time."""
+    selects = []
+    for source, table in sources.items():
+        db, sch, name = table.upper().split(".")
+        info = f"{db}.INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{sch}' AND TABLE_NAME = '{name}'"
+        read_at = f"'{as_of}'::TIMESTAMP_LTZ" if (db, sch, name) in pinned else "NULL::TIMESTAMP_LTZ"
+        selects.append(f"""
+    SELECT '{build_id}' AS BUILD_ID, CURRENT_TIMESTAMP() AS BUILT_AT,
+           '{source}' AS SOURCE, '{table}' AS SOURCE_TABLE,
+           {read_at} AS SOURCE_AS_OF,
+           (SELECT MAX(LAST_ALTERED) FROM {info}) AS SOURCE_LAST_ALTERED,
+           (SELECT MAX(ROW_COUNT) FROM {info}) AS SOURCE_ROW_COUNT""")
+    return "\n    UNION ALL".join(selects)
+
+
+def write_manifest(build_id, conn, as_of=None, pinned=(), sources=SOURCE_TABLES):
+    """Replace the rows of `sources` in MANIFEST_TABLE (in the session's current
+    schema) with this build's; other builders' rows are kept."""
+    body = sql_build_manifest(build_id, as_of, pinned, sources)
+    execute_ddl(f"CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} AS\nSELECT * FROM ({body}) WHERE FALSE", conn)
+    keys = ", ".join(f"'{_esc(source)}'" for source in sources)
+    execute_ddl(f"DELETE FROM {MANIFEST_TABLE} WHERE SOURCE IN ({keys})", conn)
+    execute_ddl(f"INSERT INTO {MANIFEST_TABLE}\n{body}", conn)
+
+
+def snapshot_live(build_id, conn, sources=SOURCE_TABLES):
+    """Zero-copy clone the just-published schema, tagged with the build's sources."""
+    snapshot = f"{SNAPSHOT_PREFIX}{build_id}"
+    comment = "; ".join(f"{k}={v}" for k, v in sources.items())
+    execute_ddl(
+        f"CREATE SCHEMA {database}.{snapshot} CLONE {database}.{schema} "
+        f"COMMENT = 'build {build_id}: {_esc(comment)}'", conn
     )
-    print(f"[{datetime.now()}] Connected to {database}.{schema}")
+    return snapshot
+
+
+def prune_snapshots(conn, keep=SNAPSHOTS_TO_KEEP):
+    """Drop all but the newest `keep` build snapshots (build ids sort chronologically)."""
+    rows = fetch_rows(f"""
+        SELECT SCHEMA_NAME FROM {database}.INFORMATION_SCHEMA.SCHEMATA
+        WHERE STARTSWITH(SCHEMA_NAME, '{SNAPSHOT_PREFIX}')
+        ORDER BY SCHEMA_NAME DESC
+    """, conn)
+    dropped = [name for (name,) in rows[keep:]]
+    for name in dropped:
+        execute_ddl(f"DROP SCHEMA IF EXISTS {database}.{name}", conn)
+    return dropped
+
+
+# ─────────────────────── PREFLIGHT (source column check) ────────────────
+# Column references of the form alias.column are resolved to the source table
+# the alias is bound to in the same statement (FROM/JOIN db.schema.table alias)
+# and checked against INFORMATION_SCHEMA.COLUMNS in a single metadata query.
+# Unqualified columns and references to CTEs / earlier build outputs are not checked.
+_SQL_KEYWORDS = {
+    "ON", "WHERE", "GROUP", "ORDER", "LEFT", "RIGHT", "INNER", "FULL", "OUTER", "CROSS",
+    "JOIN", "UNION", "QUALIFY", "HAVING", "LIMIT", "USING", "LATERAL", "AT", "BEFORE",
+}
+_TABLE_REF_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*\.[A-Za-z_]\w*\.[A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?",
+    re.IGNORECASE,
+)
+_COL_REF_RE = re.compile(r'(?<![\w."])([A-Za-z_]\w*)\.("[^"]+"|[A-Za-z_]\w*)(?![\w.])')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def _ident(name):
+    return name[1:-1] if name.startswith('"') else name.upper()
+
+
+def referenced_columns(sql):
+    """{(DB, SCHEMA, TABLE): {COLUMN, ...}} for alias-qualified source columns in one statement."""
+    sql = _STRING_RE.sub("''", sql)
+    aliases, refs = {}, {}
+    for m in _TABLE_REF_RE.finditer(sql):
+        table = tuple(part.upper() for part in m.group(1).split("."))
+        refs.setdefault(table, set())
+        alias = m.group(2)
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            aliases.setdefault(alias.upper(), set()).add(table)
+    for m in _COL_REF_RE.finditer(sql):
+        for table in aliases.get(m.group(1).upper(), ()):
+            refs[table].add(_ident(m.group(2)))
+    return refs
+
+
+def preflight_check(steps, conn):
+    """Return a list of problems (missing tables / columns) for the selected steps' sources."""
+    needed = {}  # (db, schema, table) -> {column: [step names]}
+    for step in steps:
+        if not step.get("sql"):
+            continue
+        for table, cols in referenced_columns(step["sql"]).items():
+            per_table = needed.setdefault(table, {})
+            for col in cols:
+                per_table.setdefault(col, []).append(step["name"])
+    if not needed:
+        return []
+
+    by_db = {}
+    for db, sch, tbl in needed:
+        by_db.setdefault(db, []).append(f"(TABLE_SCHEMA = '{sch}' AND TABLE_NAME = '{tbl}')")
+    union = "\nUNION ALL\n".join(
+        f"SELECT TABLE_CATALOG, TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME "
+        f"FROM {db}.INFORMATION_SCHEMA.COLUMNS WHERE {' OR '.join(conds)}"
+        for db, conds in by_db.items()
+    )
+    existing = {}
+    for cat, sch, tbl, col in fetch_rows(union, conn):
+        existing.setdefault((cat.upper(), sch.upper(), tbl.upper()), set()).add(col)
+
+    problems = []
+    for table, cols in sorted(needed.items()):
+        name = ".".join(table)
+        if table not in existing:
+            problems.append(f"{name}: table not found (or not visible to this role)")
+            continue
+        have = existing[table]
+        have_upper = {c.upper() for c in have}
+        for col, used_by in sorted(cols.items()):
+            if col not in have and col.upper() not in have_upper:
+                more = f" +{len(used_by) - 1} more" if len(used_by) > 1 else ""
+                problems.append(f"{name}.{col}: column not found (used by {used_by[0]}{more})")
+    return problems
+
+
+# ─────────────────────── POINT-IN-TIME SOURCE READS ──────────────────────
+# Every statement reads its source tables AT one timestamp pinned at build start
+# (or --as-of), so KPI / COMP / salary tables agree with each other and a rerun
+# against the same timestamp issues identical SQL (result-cache hits).
+_SOURCE_REF_RE = re.compile(
+    r"\b(FROM|JOIN)\s+([A-Za-z_]\w*\.[A-Za-z_]\w*\.[A-Za-z_]\w*)\b", re.IGNORECASE
+)
+
+
+def _at(as_of):
+    return f"AT(TIMESTAMP => '{as_of}'::TIMESTAMP_LTZ)"
+
+
+def resolve_as_of(as_of, conn):
+    """Canonical text for the pinned timestamp (Snowflake's clock if not given)."""
+    expr = f"'{_esc(as_of)}'::TIMESTAMP_LTZ" if as_of else "CURRENT_TIMESTAMP()"
+    return fetch_rows(f"SELECT TO_VARCHAR({expr}, 'YYYY-MM-DD HH24:MI:SS.FF3 TZHTZM')", conn)[0][0]
+
+
+def pinnable_sources(steps, as_of, conn):
+    """Source tables that can be read AT as_of; views and tables outside their
+    Time Travel retention are reported and read live."""
+    tables = set()
+    for step in steps:
+        if step.get("sql"):
+            tables.update(referenced_columns(step["sql"]))
+    pinned = set()
+    for table in sorted(tables):
+        name = ".".join(table)
+        try:
+            fetch_rows(f"SELECT 1 FROM {name} {_at(as_of)} LIMIT 1", conn)
+            pinned.add(table)
+        except Exception as e:
+            print(f"  ! {name}: read live, cannot pin ({e})")
+    return pinned
+
+
+def pin_sources(sql, as_of, pinned):
+    """Rewrite reads of pinned source tables to AT(as_of), and CURRENT_DATE() to as_of's date."""
+    def sub(m):
+        table = tuple(part.upper() for part in m.group(2).split("."))
+        return f"{m.group(1)} {m.group(2)} {_at(as_of)}" if table in pinned else m.group(0)
+    sql = _SOURCE_REF_RE.sub(sub, sql)
+    return sql.replace("CURRENT_DATE()", f"TO_DATE('{as_of}'::TIMESTAMP_LTZ)")
+
 
+# ─────────────────────── USAGE-DRIVEN BUILD ORDER ─────────────────────────
+# Tables the dashboard reads most are built first. Reads come from
+# ACCOUNT_USAGE.ACCESS_HISTORY (SELECTs only, so the builder's own CTAS reads of
+# COMP / SALARY_FACT do not count) against the live schema and its snapshots.
+USAGE_DAYS = 30
+
+
+def sql_table_reads(days=USAGE_DAYS):
+    return f"""
+    SELECT SPLIT_PART(obj.value:"objectName"::STRING, '.', 3) AS TABLE_NAME,
+           COUNT(DISTINCT ah.query_id) AS READS
+    FROM SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY ah,
+         LATERAL FLATTEN(ah.base_objects_accessed) obj
+    WHERE ah.query_start_time >= DATEADD('day', -{days}, CURRENT_TIMESTAMP())
+      AND ARRAY_SIZE(ah.objects_modified) = 0
+      AND obj.value:"objectDomain"::STRING = 'Table'
+      AND STARTSWITH(obj.value:"objectName"::STRING, '{database.upper()}.{schema.upper()}')
+    GROUP BY 1
+    """
+
+
+def table_reads(conn, days=USAGE_DAYS):
+    """{table name: dashboard reads in the last `days`}; empty if ACCESS_HISTORY is unavailable."""
     try:
-        execute_ddl(f"CREATE SCHEMA IF NOT EXISTS {database}.{schema}", conn)
-        print(f"[{datetime.now()}] Schema {schema} ready")
+        return {name: reads for name, reads in fetch_rows(sql_table_reads(days), conn)}
     except Exception as e:
-        print(f"  Schema note: {e}")
+        print(f"  ! Usage history unavailable, keeping default order ({e})")
+        return {}
+
 
-    total = 0
+def order_by_usage(steps, reads):
+    """Dependency-respecting order, most-read first.
 
-    # ── 1. Total counts ──────────────────────────────────────────────────
-    for name, sql_fn in [
-        (f"{TABLE_PREFIX}_TOTAL_COUNTS_YEARLY", sql_total_counts_yearly),
-        (f"{TABLE_PREFIX}_TOTAL_COUNTS_MONTHLY", sql_total_counts_monthly),
-    ]:
-        print(f"\n[{datetime.now()}] Creating {name}...")
+    A step inherits the highest read count of anything that depends on it, so a
+    hot EXAMPLES table pulls its COMP table forward. Ties keep the default order.
+    """
+    by_name = {s["name"]: s for s in steps}
+    priority = {s["name"]: reads.get(s["name"].upper(), 0) for s in steps}
+    for step in reversed(steps):  # dependents come after their deps in default order
+        for dep in step["deps"]:
+            if dep in priority:
+                priority[dep] = max(priority[dep], priority[step["name"]])
+
+    index = {s["name"]: i for i, s in enumerate(steps)}
+    waiting = {s["name"]: {d for d in s["deps"] if d in by_name} for s in steps}
+    ready = [(-priority[n], index[n], n) for n, deps in waiting.items() if not deps]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, _, name = heapq.heappop(ready)
+        ordered.append(by_name[name])
+        for other, deps in waiting.items():
+            if name in deps:
+                deps.discard(name)
+                if not deps:
+                    heapq.heappush(ready, (-priority[other], index[other], other))
+    return ordered
+
+
+# ─────────────────────── SHARED SUBQUERIES (cross-statement CSE) ──────────
+# KPI / COMP statements repeat the same per-source subqueries (v1_total,
+# v2_total, lc_total, and the *_ind value counts between COMP, COMPLC and
+# EXAMPLES, which unpacks the examples sampled there). Every Select
+# node used by two or more selected statements is materialized once per build as
+# a session TEMPORARY table, created just before the first step that reads it.
+SHARED_PREFIX = f"{TABLE_PREFIX}_CSE"
+
+
+def plan_shared_subqueries(steps):
+    """{Select key: Shared} across the selected steps' IR statements."""
+    return plan_shared([s["ir"] for s in steps if s.get("ir")], prefix=SHARED_PREFIX)
+
+
+def shared_body(shared, as_of=None, pinned=()):
+    sql = shared.select.sql()
+    return pin_sources(sql, as_of, pinned) if as_of else sql
+
+
+def sql_shared(shared, as_of=None, pinned=()):
+    return f"CREATE OR REPLACE TEMPORARY TABLE {shared.table} AS\n{shared_body(shared, as_of, pinned)}"
+
+
+def materialize_shared(step, plan, created, conn, as_of=None, pinned=(), max_bytes=None):
+    """Create the shared tables `step` reads that don't exist yet; return {key: table}
+    for the ones available. `created` maps key -> table (None if creation failed,
+    in which case the step computes that subquery inline)."""
+    if not step.get("ir"):
+        return {}
+    for _, q in step["ir"].selects():
+        key = q.key()
+        if key not in plan or key in created:
+            continue
+        shared = plan[key]
         try:
-            execute_ddl(f"CREATE OR REPLACE TABLE {name} AS\n{sql_fn()}", conn)
-            print(f"  ✓ {name}")
-            total += 1
+            check_budget(shared_body(shared, as_of, pinned), max_bytes, conn)
+            execute_ddl(sql_shared(shared, as_of, pinned), conn)
+            created[key] = shared.table
+            print(f"  ✓ {shared.table} (shared by {shared.uses} tables)")
         except Exception as e:
-            print(f"  ✗ {name}: {e}")
+            created[key] = None
+            print(f"  ✗ {shared.table}: {e} (computed inline instead)")
+    return {k: t for k, t in created.items() if t}
 
-    # ── 2. KPI + COMP per topic / field ──────────────────────────────────
-    for topic, meta in TOPICS.items():
-        exclude_ilike = meta.get("exclude_values_ilike", [])
-        extra_where = meta.get("extra_where")
 
-        for field_name, fmap in meta["fields"].items():
-            v1_from = fmap.get("v1_from", _V1_FROM)
-            v2_from = fmap.get("v2_from", _V2_FROM)
-            lc_from = fmap.get("lc_from", _LC_FROM)
+def drop_shared(created, conn):
+    for table in filter(None, created.values()):
+        try:
+            execute_ddl(f"DROP TABLE IF EXISTS {table}", conn)
+        except Exception as e:
+            print(f"  ! {table}: not dropped ({e})")
+
+
+# ─────────────────────── BUILD TELEMETRY (per-statement query stats) ───────
+# Statements are tagged with the build id, phase, step and topic/field; the
+# build's query stats are appended to TELEMETRY_TABLE (see build_telemetry.py).
+TELEMETRY_TABLE = f"{TABLE_PREFIX}_BUILD_TELEMETRY"
+telemetry = BuildTelemetry(database, schema, TELEMETRY_TABLE, "release_comparisons.postings")
+
+
+# ─────────────────────── BUILD PLAN (cost / ETA estimate) ─────────────────
+# --plan EXPLAINs every selected statement and projects runtime and credits
+# from BUILD_TELEMETRY (see build_telemetry.py). --max-bytes-per-statement
+# refuses to start any statement whose EXPLAIN exceeds the budget (the step
+# fails, the build goes on).
+
+def plan_build(steps, shared_plan, as_of, pinned, max_bytes, conn, warehouses=None):
+    """Print per-statement scan / runtime / credit estimates and the projected total.
+
+    warehouses: {step name: warehouse it is routed to}; credits are priced at
+    that warehouse's size (default: the build warehouse). A shared subquery
+    runs on the warehouse of the first step that reads it.
+    """
+    history, secs_per_byte = telemetry.history(conn)
+    warehouses = warehouses or {}
+
+    # Empty stand-ins for the shared temp tables, so steps EXPLAIN as they will run
+    created = {}
+    for key, shared in shared_plan.items():
+        try:
+            execute_ddl(f"CREATE OR REPLACE TEMPORARY TABLE {shared.table} AS\n"
+                        f"SELECT * FROM ({shared.select.sql()}) WHERE FALSE", conn)
+            created[key] = shared.table
+        except Exception as e:
+            print(f"  ! {shared.table}: {e} (steps explained with it inline)")
+
+    statement_wh = {}
+    for step in steps:
+        wh = warehouses.get(step["name"]) or provider.warehouse
+        statement_wh[step["name"]] = wh
+        for _, q in step["ir"].selects() if step.get("ir") else ():
+            if q.key() in shared_plan:
+                statement_wh.setdefault(shared_plan[q.key()].table, wh)
+
+    statements = [(shared.table, shared_body(shared, as_of, pinned), statement_wh.get(shared.table, provider.warehouse))
+                  for shared in shared_plan.values()]
+    statements += [(step["name"], None if step["run"] else step_body(step, as_of, pinned, created),
+                    statement_wh[step["name"]])
+                   for step in steps]
+    try:
+        print_plan(statements, history, secs_per_byte, max_bytes, conn)
+    finally:
+        drop_shared(created, conn)
+
+
+# ─────────────────────── RESOURCE CLASSES (per-step warehouse) ────────────
+# Each step gets a resource class and the build switches USE WAREHOUSE before
+# it, so the big COMP / ONET-join statements run on a larger warehouse and the
+# small KPI / JOLTS ones on an XS. A step's class is its annotation in
+# build_steps, else the bytes it scanned in recent builds (BUILD_TELEMETRY),
+# else its EXPLAIN bytes. Classes without a warehouse (the default) run on the
+# connection's warehouse, so routing is off until one is configured.
+RESOURCE_CLASSES = [("heavy", 200e9), ("medium", 10e9), ("small", 0)]  # (class, minimum bytes scanned)
+CLASS_WAREHOUSES = {
+    "heavy": os.environ.get("RELEASE_WH_HEAVY"),
+    "medium": os.environ.get("RELEASE_WH_MEDIUM"),
+    "small": os.environ.get("RELEASE_WH_SMALL"),
+}
+
 
-            print(f"\n[{datetime.now()}] Processing: {topic} | {field_name}")
+def parse_class_warehouse(text):
+    """'heavy=WH_L' -> ('heavy', 'WH_L')"""
+    cls, _, name = text.partition("=")
+    if cls not in CLASS_WAREHOUSES or not name:
+        raise argparse.ArgumentTypeError(f"expected CLASS=WAREHOUSE with CLASS in {', '.join(CLASS_WAREHOUSES)}")
+    return cls, name
 
-            # KPI table
-            kpi_name = make_kpi_name(topic, field_name)
-            kpi_sql = sql_generic_kpis(
+
+def resource_class(scan):
+    return next(cls for cls, min_bytes in RESOURCE_CLASSES if scan >= min_bytes)
+
+
+def classify_steps(steps, history, conn, as_of=None, pinned=()):
+    """{step name: resource class}; None where nothing is known about the step."""
+    classes = {}
+    for step in steps:
+        cls = step.get("resource")
+        if cls is None and step["run"]:
+            cls = "small"
+        if cls is None:
+            scan = history.get(step["name"], (None, None))[1]
+            if not scan:
+                try:
+                    scan = explain_scan(step_body(step, as_of, pinned), conn)[0]
+                except Exception:
+                    scan = None
+            cls = resource_class(scan) if scan is not None else None
+        classes[step["name"]] = cls
+    return classes
+
+
+# ─────────────────────── QUICK CHECK (release go/no-go) ────────────────────
+# Cheap KPI gates for a new release before paying for a full build: yearly
+# counts and per-field coverage from one scan of each BGI release, plus the
+# ONET same / different ratio. v2 (new release) is gated against v1 (previous
+# release); Lightcast does not change between BGI releases, so it is skipped.
+# Only complete years both releases cover are gated: the current, partial
+# year and years only v2 has are reported for information.
+QC_MAX_YEAR_CHANGE = 0.25    # |v2 / v1 - 1| allowed per year
+QC_MAX_COVERAGE_DROP = 0.05  # share points of postings with a usable value
+QC_MIN_SAME_ONET = 0.80      # matched postings keeping their ONET code
+
+
+def _coverage_cols():
+    """{column alias: (topic, field, {src: (coverage predicate, field Source, population predicate)})}
+    for every TOPICS field. As in the KPI tables, a field's extra_where restricts
+    both the covered postings and the population (None: all postings)."""
+    cols = {}
+    for topic, meta in TOPICS.items():
+        for field_name, fmap in meta["fields"].items():
+            inputs = _field_inputs(
                 fmap["v1_expr"], fmap["v2_expr"], fmap["lc_expr"],
-                v1_from, v2_from, lc_from, exclude_ilike, extra_where
+                fmap.get("v1_from", _V1_FROM), fmap.get("v2_from", _V2_FROM), fmap.get("lc_from", _LC_FROM),
+                meta.get("exclude_values_ilike", []), meta.get("extra_where"),
             )
-            try:
-                execute_ddl(f"CREATE OR REPLACE TABLE {kpi_name} AS\n{kpi_sql}", conn)
-                print(f"  ✓ {kpi_name}")
-                total += 1
-            except Exception as e:
-                print(f"  ✗ {kpi_name}: {e}")
+            preds = {src: (" AND ".join(value_filters + extra), source, " AND ".join(extra) or None)
+                     for src, (_, source, value_filters, extra) in inputs.items()}
+            cols[f"COV_{_clean(topic)}_{_clean(field_name)}"] = (topic, field_name, preds)
+    return cols
 
-            # COMP table
-            comp_name = make_comp_name(topic, field_name)
-            comp_sql = sql_generic_compare(
+
+def sql_quick_check(src):
+    """One scan of a source: postings per year and postings with a usable value per field.
+
+    Joins that fields need (e.g. the SOC lookup) become LEFT JOINs so they
+    don't drop postings from the other counts; ids are counted DISTINCT, as
+    in the KPI tables, so a fanned-out join row is not counted twice.
+    """
+    table, id_col, date = _SOURCES[src]
+    cols = _coverage_cols()
+    joins = []
+    for _, _, preds in cols.values():
+        for join in preds[src][1].joins:
+            left = Join("LEFT JOIN", join.table, join.alias, join.on)
+            if left not in joins:
+                joins.append(left)
+    counts = [f"       COUNT(DISTINCT IFF({preds[src][0]}, {src}.{id_col}, NULL)) AS {alias}"
+              for alias, (_, _, preds) in cols.items()]
+    counts += [f"       COUNT(DISTINCT IFF({preds[src][2]}, {src}.{id_col}, NULL)) AS {alias}_N"
+               for alias, (_, _, preds) in cols.items() if preds[src][2]]
+    counts = ",\n".join(counts)
+    return f"""
+SELECT YEAR({src}.{date}) AS YR,
+       COUNT(DISTINCT {src}.{id_col}) AS N,
+{counts}
+FROM {Source(table, src, tuple(joins)).sql()}
+WHERE {" AND ".join(_base_filters(src, f">= {FULL_MIN_YEAR}"))}
+GROUP BY 1
+ORDER BY 1
+"""
+
+
+def quick_check(conn):
+    """Print the KPI gates (v2 vs v1) and return the number of anomalies."""
+    cols = _coverage_cols()
+    by_src = {}
+    for src in ("v1", "v2"):
+        print(f"[{datetime.now()}] Scanning {src}...")
+        names = ["YR", "N", *cols, *(f"{alias}_N" for alias, (_, _, preds) in cols.items() if preds[src][2])]
+        by_src[src] = {row[0]: dict(zip(names, row)) for row in fetch_rows(sql_quick_check(src), conn)}
+    print(f"[{datetime.now()}] Comparing ONET codes on matched postings...")
+    same, different, matched = fetch_rows(sql_onet_change_summary(), conn)[0]
+
+    checks = []  # (check, v1, v2, ok); ok None = information only
+    v1, v2 = by_src["v1"], by_src["v2"]
+    current_year = datetime.now().year
+    gated = [yr for yr in sorted(v1) if yr < current_year]  # complete years v1 covers
+    for yr in sorted(set(v1) | set(v2)):
+        n1, n2 = v1.get(yr, {}).get("N", 0), v2.get(yr, {}).get("N", 0)
+        if yr in gated:
+            ok = abs(n2 / n1 - 1) <= QC_MAX_YEAR_CHANGE
+            label = f"postings {yr}"
+        else:
+            ok = None
+            label = f"postings {yr} ({'partial year' if yr >= current_year else 'v2 only'})"
+        checks.append((label, f"{n1:,}", f"{n2:,}", ok))
+    # coverage over the gated years only, so new or partial data doesn't move it
+    for alias, (topic, field_name, preds) in cols.items():
+        cov = {}
+        for src, rows in by_src.items():
+            n_col = f"{alias}_N" if preds[src][2] else "N"
+            n = sum(rows.get(yr, {}).get(n_col, 0) for yr in gated)
+            cov[src] = sum(rows.get(yr, {}).get(alias, 0) for yr in gated) / n if n else 0
+        checks.append((f"coverage {topic}/{field_name}", f"{cov['v1']:.1%}", f"{cov['v2']:.1%}",
+                       cov["v1"] - cov["v2"] <= QC_MAX_COVERAGE_DROP))
+    same_share = same / matched if matched else 0
+    checks.append(("same ONET (matched 2024 postings)", "", f"{same_share:.1%}",
+                   same_share >= QC_MIN_SAME_ONET))
+
+    print(f"\n  {'check':<45} {'v1':>12} {'v2':>12}")
+    for name, a, b, ok in checks:
+        mark = "·" if ok is None else "✓" if ok else "✗"
+        print(f"  {mark} {name:<43} {a:>12} {b:>12}")
+    return sum(ok is False for *_, ok in checks)
+
+
+# ─────────────────────────── BUILD STEPS ─────────────────────────────
+STEP_GROUPS = ["totals", "topics", "onet", "id_sketches", "salary", "jolts"]
+
+
+def build_steps():
+    """Every table the build can create, in build order.
+
+    A step is a dict with name, group, topic/field (topic steps only), `deps`
+    (build outputs it reads) and either `sql` (CTAS body) or `run` (callable
+    taking conn, for uploads). Steps built from a query_ir Statement also keep
+    it as `ir`; `sql` is then its fully inlined rendering. `resource` pins a
+    resource class where bytes scanned understate the work (large joins).
+    """
+    steps = []
+
+    def add(name, group, sql=None, run=None, topic=None, field=None, deps=(), resource=None):
+        ir = sql if isinstance(sql, Statement) else None
+        steps.append({"name": name, "group": group, "topic": topic, "field": field,
+                      "sql": ir.sql() if ir else sql, "ir": ir, "run": run, "deps": list(deps),
+                      "resource": resource})
+
+    # ── 1. Total counts
+    add(f"{TABLE_PREFIX}_TOTAL_COUNTS_YEARLY", "totals", sql_total_counts_yearly())
+    add(f"{TABLE_PREFIX}_TOTAL_COUNTS_MONTHLY", "totals", sql_total_counts_monthly())
+
+    # ── 2. KPI + COMP (+ examples, + LC-sorted COMP for employers) per topic / field
+    for topic, meta in TOPICS.items():
+        exclude_ilike = meta.get("exclude_values_ilike", [])
+        extra_where = meta.get("extra_where")
+        for field_name, fmap in meta["fields"].items():
+            args = (
                 fmap["v1_expr"], fmap["v2_expr"], fmap["lc_expr"],
-                v1_from, v2_from, lc_from, exclude_ilike, extra_where
+                fmap.get("v1_from", _V1_FROM), fmap.get("v2_from", _V2_FROM), fmap.get("lc_from", _LC_FROM),
+                exclude_ilike, extra_where,
             )
+            comp_name = make_comp_name(topic, field_name)
+            add(make_kpi_name(topic, field_name), "topics", sql_generic_kpis(*args),
+                topic=topic, field=field_name)
+            add(comp_name, "topics", sql_generic_compare(*args), topic=topic, field=field_name)
+            add(make_long_name(comp_name), "topics", sql_long_comp(comp_name),
+                topic=topic, field=field_name, deps=[comp_name])
+            if fmap.get("dictionary"):
+                dict_name = make_dict_name(topic, field_name)
+                add(dict_name, "topics", run=dictionary_updater(dict_name, comp_name),
+                    topic=topic, field=field_name, deps=[comp_name])
+                add(make_comp_id_name(topic, field_name), "topics", sql_comp_ids(comp_name, dict_name),
+                    topic=topic, field=field_name, deps=[comp_name, dict_name])
+            # Example postings for every charted value (reads the COMP table)
+            add(make_examples_name(topic, field_name), "topics", sql_examples(comp_name, *args),
+                topic=topic, field=field_name, deps=[comp_name])
+            if topic == "employers":
+                comp_lc_name = make_comp_lc_name(topic, field_name)
+                add(comp_lc_name, "topics", sql_generic_compare_lc(*args), topic=topic, field=field_name)
+                add(make_long_name(comp_lc_name), "topics", sql_long_comp(comp_lc_name, sort_by=("lc",)),
+                    topic=topic, field=field_name, deps=[comp_lc_name])
+
+    # ── 3. ONET changes (v1 vs v2)
+    add(f"{TABLE_PREFIX}_ONET_CHANGES", "onet", sql_onet_changes(), resource="heavy")
+    add(f"{TABLE_PREFIX}_ONET_CHANGE_SUMMARY", "onet", sql_onet_change_summary(), resource="heavy")
+
+    # ── 3b. Posting-ID sketches + monthly overlap estimate (v1 vs v2)
+    add(f"{TABLE_PREFIX}_ID_SKETCHES", "id_sketches", sql_id_sketches())
+    add(f"{TABLE_PREFIX}_ID_OVERLAP_MONTHLY", "id_sketches",
+        sql_id_overlap(["MONTH_START", "STATE", "NAICS2"], rollup=("STATE", "NAICS2")),
+        deps=[f"{TABLE_PREFIX}_ID_SKETCHES"])
+
+    # ── 4. Salary fact table, then salary tables derived from it
+    add(SALARY_FACT, "salary", sql_salary_fact())
+    add(SALARY_SKETCHES, "salary", sql_salary_sketches(), deps=[SALARY_FACT])
+    add(f"{TABLE_PREFIX}_SALARY_PERCENTILES", "salary",
+        sql_salary_percentiles(group_by=("SOURCE", "YR"), where="COUNTRY = 'United States'"),
+        deps=[SALARY_SKETCHES])
+    add(f"{TABLE_PREFIX}_SALARY_STATS", "salary", sql_salary_stats(), deps=[SALARY_FACT])
+    add(f"{TABLE_PREFIX}_SALARY_DISTRIBUTION", "salary", sql_salary_distribution(), deps=[SALARY_FACT])
+    add(f"{TABLE_PREFIX}_SALARY_BY_SOC2", "salary", sql_salary_by_soc2(), deps=[SALARY_FACT])
+    add(f"{TABLE_PREFIX}_SALARY_COVERAGE", "salary", sql_salary_coverage(), deps=[SALARY_FACT])
+
+    # ── 5. JOLTS state comparison (BLS API upload, then comparison)
+    add(f"{TABLE_PREFIX}_JOLTS_STATE_RAW", "jolts", run=fetch_and_upload_jolts_state)
+    add(f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON", "jolts", sql_jolts_state_comparison(),
+        deps=[f"{TABLE_PREFIX}_JOLTS_STATE_RAW"])
+    add(make_long_name(f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON"), "jolts", sql_long_jolts_state(),
+        deps=[f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON"])
+    return steps
+
+
+def _field_matches(step, fields):
+    """`fields` entries are FIELD or TOPIC/FIELD (case-insensitive)."""
+    for f in fields:
+        topic, _, field = f.rpartition("/")
+        if field.upper() == step["field"].upper() and (not topic or topic.lower() == step["topic"]):
+            return True
+    return False
+
+
+def select_steps(steps, topics=None, fields=None, only=None):
+    """Filter steps by group (--only) and, for topic steps, by topic / field.
+
+    --topics / --fields on their own imply --only topics.
+    """
+    if (topics or fields) and not only:
+        only = ["topics"]
+    selected = []
+    for step in steps:
+        if only and step["group"] not in only:
+            continue
+        if step["group"] == "topics":
+            if topics and step["topic"] not in topics:
+                continue
+            if fields and not _field_matches(step, fields):
+                continue
+        selected.append(step)
+    return selected
+
+
+def steps_reading(steps, sources):
+    """Steps whose SQL reads any of `sources` (db.schema.table), plus every step
+    built from their outputs, in their original order."""
+    sources = {tuple(part.upper() for part in t.split(".")) for t in sources}
+    names = {step["name"] for step in steps
+             if step.get("sql") and sources & referenced_columns(step["sql"]).keys()}
+    grew = True
+    while grew:
+        grew = False
+        for step in steps:
+            if step["name"] not in names and names & set(step["deps"]):
+                names.add(step["name"])
+                grew = True
+    return [step for step in steps if step["name"] in names]
+
+
+def step_body(step, as_of=None, pinned=(), shared=None):
+    """SELECT for a SQL step, with source reads pinned to as_of when given and
+    shared subqueries ({key: table}) read from their temporary tables."""
+    sql = step["ir"].sql(shared) if shared and step.get("ir") else step["sql"]
+    return pin_sources(sql, as_of, pinned) if as_of else sql
+
+
+def step_sql(step, as_of=None, pinned=(), shared=None):
+    return f"CREATE OR REPLACE TABLE {step['name']} AS\n{step_body(step, as_of, pinned, shared)}"
+
+
+def run_step(step, conn, as_of=None, pinned=(), shared=None, max_bytes=None):
+    if step["run"]:
+        step["run"](conn)
+    else:
+        check_budget(step_body(step, as_of, pinned, shared), max_bytes, conn)
+        execute_ddl(step_sql(step, as_of, pinned, shared), conn)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build BGI v1 vs v2 vs Lightcast comparison tables (all by default)."
+    )
+    parser.add_argument("--topics", nargs="+", choices=list(TOPICS), metavar="TOPIC",
+                        help=f"only these topics ({', '.join(TOPICS)})")
+    parser.add_argument("--fields", nargs="+", metavar="[TOPIC/]FIELD",
+                        help="only these fields, e.g. SOC2 or occupation/SOC2")
+    parser.add_argument("--only", nargs="+", choices=STEP_GROUPS, metavar="GROUP",
+                        help=f"only these step groups ({', '.join(STEP_GROUPS)})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the SQL for the selected tables without connecting")
+    parser.add_argument("--list", action="store_true",
+                        help="list the selected targets and exit")
+    parser.add_argument("--as-of", metavar="TIMESTAMP",
+                        help="read all sources AT this timestamp (default: build start), "
+                             "e.g. '2026-03-01 06:00:00 -0500'")
+    parser.add_argument("--no-pin", action="store_true",
+                        help="read sources live instead of at a pinned timestamp")
+    parser.add_argument("--order", choices=["usage", "default"], default="usage",
+                        help="build most-read tables first (usage, from ACCESS_HISTORY) or in definition order")
+    parser.add_argument("--skip-preflight", action="store_true",
+                        help="don't check source columns against INFORMATION_SCHEMA before building")
+    parser.add_argument("--no-share", action="store_true",
+                        help="compute every subquery inline instead of sharing repeated ones via temp tables")
+    parser.add_argument("--plan", action="store_true",
+                        help="estimate bytes, runtime and credits per statement (EXPLAIN + past builds) and exit")
+    parser.add_argument("--max-bytes-per-statement", type=parse_bytes, metavar="SIZE",
+                        help="don't run statements whose EXPLAIN exceeds this many bytes, e.g. 500GB")
+    parser.add_argument("--warehouse", type=parse_class_warehouse, action="append", metavar="CLASS=NAME",
+                        help=f"run steps of a resource class ({', '.join(CLASS_WAREHOUSES)}) on this warehouse, "
+                             f"e.g. heavy=WH_L (repeatable; also RELEASE_WH_HEAVY etc.)")
+    parser.add_argument("--changed-source", nargs="+", metavar="DB.SCHEMA.TABLE",
+                        help="only the tables that read these sources, and the tables built from them")
+    parser.add_argument("--quick-check", action="store_true",
+                        help="only compare cheap release KPIs (v2 vs v1) against thresholds; "
+                             "exit non-zero on anomalies")
+    return parser.parse_args(argv)
+
+
+# ─────────────────────────── MAIN ─────────────────────────────
+def main(argv=None):
+    args = parse_args(argv)
+    steps = select_steps(build_steps(), args.topics, args.fields, args.only)
+    if args.changed_source:
+        steps = steps_reading(steps, args.changed_source)
+
+    if args.list:
+        for step in steps:
+            where = f"{step['topic']}/{step['field']}" if step["group"] == "topics" else ""
+            print(f"{step['group']:<12} {step['name']:<55} {where}")
+        print(f"\n{len(steps)} targets")
+        return
+
+    build_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if args.dry_run:
+        # No connection: sources are shown pinned only when --as-of is given
+        as_of = None if args.no_pin else args.as_of
+        pinned = {tuple(t.upper().split(".")) for t in SOURCE_TABLES.values()} if as_of else set()
+        shared_plan = {} if args.no_share else plan_shared_subqueries(steps)
+        for shared in shared_plan.values():
+            print(f"\n-- {shared.table} (shared by {shared.uses} tables)\n{sql_shared(shared, as_of, pinned)};")
+        tables = {key: shared.table for key, shared in shared_plan.items()}
+        for step in steps:
+            print(f"\n-- {step['name']} ({step['group']})")
+            if step["run"]:
+                print(f"-- runs {step['run'].__name__}(conn)")
+            else:
+                print(f"{step_sql(step, as_of, pinned, tables)};")
+        print(f"\n-- {MANIFEST_TABLE} (replaces the rows of these sources)\nINSERT INTO {MANIFEST_TABLE}\n"
+              f"{sql_build_manifest(build_id, as_of, pinned)};")
+        return
+
+    if args.quick_check:
+        print(f"[{datetime.now()}] Quick check: {V2_TABLE} vs {V1_TABLE}")
+        conn = provider.connect()
+        telemetry.set_query_tag(conn, build_id, phase="quick_check")
+        try:
+            anomalies = quick_check(conn)
+        finally:
+            conn.close()
+        if anomalies:
+            raise SystemExit(f"Quick check failed ({anomalies} anomalies); don't start a full build.")
+        print(f"\n[{datetime.now()}] ✓ Quick check passed")
+        return
+
+    print(f"[{datetime.now()}] Starting BGI v1 vs v2 vs Lightcast temp table creation (build {build_id})...")
+    print(f"  v1: {V1_TABLE}")
+    print(f"  v2: {V2_TABLE}")
+    print(f"  lc: {LC_TABLE}")
+    print(f"  {len(steps)} tables selected")
+
+    conn = provider.connect()
+    print(f"[{datetime.now()}] Connected to {database}.{schema}")
+    telemetry.set_query_tag(conn, build_id, phase="setup")
+
+    if not args.skip_preflight:
+        print(f"[{datetime.now()}] Preflight: checking source columns...")
+        problems = preflight_check(steps, conn)
+        if problems:
+            for p in problems:
+                print(f"  ✗ {p}")
+            conn.close()
+            raise SystemExit(f"Preflight failed ({len(problems)} problems); nothing was built.")
+        print(f"  ✓ All referenced source columns exist")
+
+    as_of, pinned = None, set()
+    if not args.no_pin:
+        as_of = resolve_as_of(args.as_of, conn)
+        print(f"[{datetime.now()}] Reading sources as of {as_of}")
+        pinned = pinnable_sources(steps, as_of, conn)
+
+    if args.order == "usage":
+        reads = table_reads(conn)
+        steps = order_by_usage(steps, reads)
+        hot = [s["name"] for s in steps[:5] if reads.get(s["name"].upper())]
+        if hot:
+            print(f"[{datetime.now()}] Building most-read tables first: {', '.join(hot)}")
+
+    shared_plan = {} if args.no_share else plan_shared_subqueries(steps)
+
+    routing = {**CLASS_WAREHOUSES, **dict(args.warehouse or [])}
+    classes = {}
+    if any(routing.values()):
+        history, _ = telemetry.history(conn)
+        classes = classify_steps(steps, history, conn, as_of, pinned)
+        counts = {}
+        for cls in classes.values():
+            counts[cls] = counts.get(cls, 0) + 1
+        print(f"[{datetime.now()}] Warehouse routing: " + ", ".join(
+            f"{n} {cls or 'unclassified'} → {routing.get(cls) or provider.warehouse}" for cls, n in counts.items()))
+    warehouses = {step["name"]: routing.get(classes.get(step["name"])) or provider.warehouse for step in steps}
+
+    if args.plan:
+        print(f"[{datetime.now()}] Planning {len(steps)} tables ({len(shared_plan)} shared subqueries)...")
+        plan_build(steps, shared_plan, as_of, pinned, args.max_bytes_per_statement, conn, warehouses)
+        conn.close()
+        return
+
+    try:
+        publisher.acquire_lock(f"postings build {build_id}", conn)
+    except BaseException:
+        conn.close()
+        raise
+    try:
+        built_since = publisher.prepare_shadow(conn)
+        print(f"[{datetime.now()}] Building into shadow schema {database}.{SHADOW_SCHEMA}")
+
+        current_wh = provider.warehouse
+
+        if shared_plan:
+            print(f"[{datetime.now()}] Sharing {len(shared_plan)} repeated subqueries via temporary tables")
+        if args.max_bytes_per_statement:
+            print(f"[{datetime.now()}] Per-statement scan budget: {args.max_bytes_per_statement / 1e9:,.1f} GB")
+        created = {}
+
+        total = 0
+        failed = 0
+
+        for step in steps:
+            print(f"\n[{datetime.now()}] Creating {step['name']}...")
+            telemetry.set_query_tag(conn, build_id, phase="step", step=step["name"], group=step["group"],
+                          topic=step["topic"], field=step["field"], resource=classes.get(step["name"]))
+            wh = warehouses[step["name"]]
+            if wh != current_wh:
+                execute_ddl(f"USE WAREHOUSE {wh}", conn)
+                current_wh = wh
+            shared = materialize_shared(step, shared_plan, created, conn, as_of, pinned,
+                                        args.max_bytes_per_statement)
             try:
-                execute_ddl(f"CREATE OR REPLACE TABLE {comp_name} AS\n{comp_sql}", conn)
-                print(f"  ✓ {comp_name}")
+                run_step(step, conn, as_of, pinned, shared, args.max_bytes_per_statement)
+                print(f"  ✓ {step['name']}")
                 total += 1
             except Exception as e:
-                print(f"  ✗ {comp_name}: {e}")
-
-            # COMP LC table (top 25 by Lightcast, employers only)
-            if topic == "employers":
-                complc_name = make_comp_lc_name(topic, field_name)
-                complc_sql = sql_generic_compare_lc(
-                    fmap["v1_expr"], fmap["v2_expr"], fmap["lc_expr"],
-                    v1_from, v2_from, lc_from, exclude_ilike, extra_where
-                )
-                try:
-                    execute_ddl(f"CREATE OR REPLACE TABLE {complc_name} AS\n{complc_sql}", conn)
-                    print(f"  ✓ {complc_name}")
-                    total += 1
-                except Exception as e:
-                    print(f"  ✗ {complc_name}: {e}")
-
-    # ── 3. ONET changes (v1 vs v2) ──────────────────────────────────────
-    for name, sql_fn in [
-        (f"{TABLE_PREFIX}_ONET_CHANGES", sql_onet_changes),
-        (f"{TABLE_PREFIX}_ONET_CHANGE_SUMMARY", sql_onet_change_summary),
-    ]:
-        print(f"\n[{datetime.now()}] Creating {name}...")
+                print(f"  ✗ {step['name']}: {e}")
+                failed += 1
+        telemetry.set_query_tag(conn, build_id, phase="finish")
+        if current_wh != provider.warehouse:
+            execute_ddl(f"USE WAREHOUSE {provider.warehouse}", conn)
+        drop_shared(created, conn)
+
+        # ── Build manifest (source versions for this build) ─────────────────
+        print(f"\n[{datetime.now()}] Creating {MANIFEST_TABLE}...")
         try:
-            execute_ddl(f"CREATE OR REPLACE TABLE {name} AS\n{sql_fn()}", conn)
-            print(f"  ✓ {name}")
+            write_manifest(build_id, conn, as_of, pinned)
+            print(f"  ✓ {MANIFEST_TABLE} (build {build_id})")
             total += 1
         except Exception as e:
-            print(f"  ✗ {name}: {e}")
-
-    # ── 4. Salary tables (v1 vs v2 only) ────────────────────────────────
-    for name, sql_fn in [
-        (f"{TABLE_PREFIX}_SALARY_STATS", sql_salary_stats),
-        (f"{TABLE_PREFIX}_SALARY_DISTRIBUTION", sql_salary_distribution),
-        (f"{TABLE_PREFIX}_SALARY_BY_SOC2", sql_salary_by_soc2),
-        (f"{TABLE_PREFIX}_SALARY_COVERAGE", sql_salary_coverage),
-    ]:
-        print(f"\n[{datetime.now()}] Creating {name}...")
+            print(f"  ✗ {MANIFEST_TABLE}: {e}")
+            failed += 1
+
+        # ── Validate shadow build and publish ────────────────────────────────
+        print(f"\n[{datetime.now()}] Validating {SHADOW_SCHEMA}...")
+        ok, msg = publisher.validate_shadow(built_since, failed, conn)
+        print(f"  {msg}")
+        if ok:
+            publisher.publish_shadow(conn)
+            print(f"  ✓ Published {SHADOW_SCHEMA} → {schema}")
+            try:
+                snapshot = snapshot_live(build_id, conn)
+                print(f"  ✓ Snapshot {snapshot}")
+                for name in prune_snapshots(conn):
+                    print(f"  ✓ Dropped old snapshot {name}")
+            except Exception as e:
+                print(f"  ✗ Snapshot: {e}")
+        else:
+            print(f"  ✗ Not published; {schema} unchanged, build kept in {SHADOW_SCHEMA}")
+
+        # ── Telemetry (query stats per statement) ────────────────────────────
+        print(f"\n[{datetime.now()}] Recording telemetry in {schema}.{TELEMETRY_TABLE}...")
         try:
-            execute_ddl(f"CREATE OR REPLACE TABLE {name} AS\n{sql_fn()}", conn)
-            print(f"  ✓ {name}")
-            total += 1
+            n = telemetry.record(build_id, conn)
+            print(f"  ✓ {n} statements recorded")
+            telemetry.print_summary(build_id, conn)
         except Exception as e:
-            print(f"  ✗ {name}: {e}")
-
-    # ── 5. JOLTS state comparison ──────────────────────────────────────
-    print(f"\n[{datetime.now()}] Fetching JOLTS state-level data from BLS API...")
-    try:
-        fetch_and_upload_jolts_state(conn)
-        total += 1
-    except Exception as e:
-        print(f"  ✗ Failed to upload JOLTS state data: {e}")
-
-    jolts_state_table = f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON"
-    print(f"\n[{datetime.now()}] Creating {jolts_state_table}...")
-    try:
-        execute_ddl(f"CREATE OR REPLACE TABLE {jolts_state_table} AS\n{sql_jolts_state_comparison()}", conn)
-        print(f"  ✓ {jolts_state_table}")
-        total += 1
-    except Exception as e:
-        print(f"  ✗ {jolts_state_table}: {e}")
+            print(f"  ✗ Telemetry: {e}")
+    finally:
+        publisher.release_lock(conn)
+        conn.close()
 
-    conn.close()
     print(f"\n[{datetime.now()}] ═══════════════════════════════════════")
-    print(f"[{datetime.now()}] Done! Created {total} tables in {database}.{schema}")
+    print(f"[{datetime.now()}] Done! Created {total} tables in {database}.{schema if ok else SHADOW_SCHEMA}")
     print(f"[{datetime.now()}] ═══════════════════════════════════════")
+    if not ok:
+        raise SystemExit(f"Build {build_id} not published ({failed} tables failed)")
 
 
 if __name__ == "__main__":
@@ -2,12 +2,19 @@
 # Script to pre-compute BGI vs Lightcast postings comparison queries
 # and store as tables in PROJECT_DATA.POSTINGS_RELEASE_COMPARISONS
 # Now includes 4 sources: Overlap_BGI, Overlap_LC, Full_BGI, Full_LC
+#
+# The schema is shared with postings_release_temp_tables.py; tables are built
+# in its shadow schema under its build lock and swapped in the same way.
 
-import snowflake.connector as snow
 from datetime import datetime
 import os
-import importlib.util
+import hashlib
 import pandas as pd
+from connection import ConnectionProvider
+from postings_release_temp_tables import (
+    MANIFEST_TABLE, SHADOW_SCHEMA, prune_snapshots, publisher, snapshot_live, upload_df, write_manifest,
+)
+from query_ir import Join, Source
 
 # ─────────────────────────── SOURCE TABLES ───────────────────────────
 BGI_POSTINGS = "revelio_clean.v1.bgi_postings"
@@ -18,6 +25,14 @@ XWALK_TABLE = "TEMPORARY_DATA.ARATHI.LC_RL_MAY25_XWALK"
 BGI_DATE_COL = "post_date"
 LC_DATE_COL = "posted"
 
+# Manifest rows / snapshot comment for this builder's sources (keys distinct
+# from the postings builder's, whose manifest rows are kept)
+SOURCE_TABLES = {
+    "overlap_bgi": BGI_POSTINGS,
+    "overlap_lc": LC_POSTINGS,
+    "overlap_xwalk": XWALK_TABLE,
+}
+
 # Year filter for full datasets (not applied to overlap)
 FULL_MIN_YEAR = 2015
 
@@ -26,6 +41,9 @@ JOLTS_EXCEL_PATH = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Docu
 OEWS_EXCEL_PATH = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Documents\GitHub\release_comparisons\oews_empl_national_M2024_dl.xlsx"
 JOLTS_SF_TABLE = "OUTSIDE_DATA.JOLTS.ALL_DATA"
 
+# Parsed workbooks are cached here as Parquet, keyed by the workbook's sha256
+REFERENCE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "reference")
+
 # NAICS2 → JOLTS-compatible sector mapping
 NAICS2_SECTOR_MAP = {
     'MINING, QUARRYING, AND OIL AND GAS EXTRACTION': 'Mining, Quarrying, and Oil and Gas Extraction',
@@ -70,21 +88,10 @@ JOLTS_CODE_MAP = {
 }
 
 # ─────────────────────────── SNOWFLAKE CONNECTION ─────────────────────────
-config_file_path = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Documents\Python\config.py"
-
-if not os.path.isfile(config_file_path):
-    raise FileNotFoundError(f"Config file does not exist at the specified path: {config_file_path}")
-
-spec = importlib.util.spec_from_file_location("config", config_file_path)
-config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(config)
-
-user = config.credentials['USERNAME']
-password = config.credentials['PASSWORD']
-account = 'PCA67849'
-warehouse = config.credentials['WAREHOUSE']
 database = 'PROJECT_DATA'
-schema = 'POSTINGS_RELEASE_COMPARISONS'
+schema = 'POSTINGS_RELEASE_COMPARISONS'  # must match postings_release_temp_tables (shared shadow + lock)
+# Credentials are looked up on first connect (env vars or config.py, see connection.py)
+provider = ConnectionProvider(database, schema)
 
 def execute_ddl(query, conn):
     """Execute DDL statement (CREATE TABLE, etc.)"""
@@ -99,21 +106,40 @@ def execute_ddl(query, conn):
     finally:
         cur.close()
 
+
+# ─────────────────────── REFERENCE DATA LOADING ───────────────────────
+def read_excel_cached(path, **kwargs):
+    """pd.read_excel, cached as Parquet keyed by the file's sha256 and the read options."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(repr(sorted(kwargs.items())).encode("utf-8"))
+    cache_path = os.path.join(REFERENCE_CACHE_DIR, f"{h.hexdigest()}.parquet")
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    df = pd.read_excel(path, **kwargs)
+    # Parquet needs string column names and one type per column
+    df.columns = [str(c) for c in df.columns]
+    for c in df.columns[df.dtypes == object]:
+        df[c] = df[c].astype("string")
+    os.makedirs(REFERENCE_CACHE_DIR, exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, cache_path)
+    return df
+
+
 # ───────────────────────── TOPIC METADATA ─────────────────────────────
-# Each field now has overlap_bgi_from, overlap_lc_from, full_bgi_from, full_lc_from
+# Each field has bgi_expr / lc_expr and the full_bgi_from / full_lc_from they
+# are evaluated over; overlap values are pre-computed in OVERLAP_BGI / OVERLAP_LC
 TOPICS = {
     "industry_naics2": {
         "fields": {
             "NAICS2_DISTRIBUTION": {
                 "bgi_expr": "n.naics_2022_2_name",
                 "lc_expr": "lc.naics_2022_2_name",
-                # Overlap (with crosswalk)
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
-                    INNER JOIN temporary_data.sswee.naics_full_hierarchy n ON n.naics_2022_6 = bgi.bgi_naics6""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
-                # Full (no crosswalk)
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi
                     INNER JOIN temporary_data.sswee.naics_full_hierarchy n ON n.naics_2022_6 = bgi.bgi_naics6""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
@@ -137,10 +163,6 @@ TOPICS = {
                     THEN 'DOCTORATE DEGREE'
                     ELSE lc.MIN_EDULEVELS_NAME
                 END""",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             }
@@ -152,21 +174,12 @@ TOPICS = {
             "ONET_NAME": {
                 "bgi_expr": "bgi.BGI_ONET_NAME",
                 "lc_expr": "lc.ONET_2019_NAME",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             },
             "SOC2": {
                 "bgi_expr": "lu.bgi_soc2_name",
                 "lc_expr": "lc.soc_2_name",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
-                    INNER JOIN temporary_data.jnania.onet_soc_lookup lu ON lu.bgi_onet = bgi.onet_code""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi
                     INNER JOIN temporary_data.jnania.onet_soc_lookup lu ON lu.bgi_onet = bgi.onet_code""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
@@ -179,30 +192,18 @@ TOPICS = {
             "CITY": {
                 "bgi_expr": "bgi.BGI_CITY",
                 "lc_expr": "SUBSTR(lc.CITY_NAME, 1, LENGTH(lc.CITY_NAME) - 4)",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             },
             "STATE": {
                 "bgi_expr": "bgi.BGI_STATE",
                 "lc_expr": "lc.STATE_NAME",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             },
             "MSA": {
                 "bgi_expr": "bgi.BGI_MSA",
                 "lc_expr": "lc.MSA_NAME",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             },
@@ -214,10 +215,6 @@ TOPICS = {
             "TITLE_NAME": {
                 "bgi_expr": "bgi.BGI_TITLE_NAME",
                 "lc_expr": "lc.TITLE_NAME",
-                "overlap_bgi_from": f"""{BGI_POSTINGS} bgi
-                    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id""",
-                "overlap_lc_from": f"""{LC_POSTINGS} lc
-                    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id""",
                 "full_bgi_from": f"""{BGI_POSTINGS} bgi""",
                 "full_lc_from": f"""{LC_POSTINGS} lc""",
             }
@@ -233,22 +230,80 @@ def _escape(value: str) -> str:
 def _normalized(expr: str) -> str:
     return f"UPPER(TRIM({expr}))"
 
+def _exclusions(val: str, exclude_ilike: list[str] | None) -> str:
+    return "".join(f" AND {val} NOT LIKE '{_escape(pat).upper()}'" for pat in exclude_ilike or [])
+
+# ───────────────────── OVERLAP SAMPLE (crosswalk-keyed) ─────────────────────
+# Built first on every run: the crosswalk deduplicated to distinct
+# (rl_id, lc_id) pairs, then one slim row per overlapping BGI (US) / LC
+# posting carrying the normalized value of every TOPICS field, with the
+# NAICS / SOC lookups pre-joined. Overlap totals, KPIs and COMPs read these
+# instead of re-joining the full postings tables to the crosswalk per field.
+OVERLAP_XWALK = "OVERLAP_XWALK"
+OVERLAP_BGI = "OVERLAP_BGI"
+OVERLAP_LC = "OVERLAP_LC"
+
+def overlap_col(topic: str, field: str) -> str:
+    """Column holding a field's normalized value in OVERLAP_BGI / OVERLAP_LC"""
+    return f"{clean_name(topic)}_{clean_name(field)}"
+
+def _overlap_values(src: str) -> tuple[list[str], list[Join]]:
+    """('<normalized expr> AS <column>' per field, LEFT JOINs they need) for src 'bgi' or 'lc'"""
+    cols, joins = [], []
+    for topic, meta in TOPICS.items():
+        for field_name, field_map in meta["fields"].items():
+            expr, from_sql = field_map[src + "_expr"], field_map[f"full_{src}_from"]
+            cols.append(f"{_normalized(expr)} AS {overlap_col(topic, field_name)}")
+            # LEFT so a missing lookup row nulls that field instead of dropping the posting
+            for join in Source.parse(from_sql).joins:
+                left = Join("LEFT JOIN", join.table, join.alias, join.on)
+                if left not in joins:
+                    joins.append(left)
+    return cols, joins
+
+def sql_overlap_xwalk() -> str:
+    """Distinct (rl_id, LC_ID) pairs of the LC↔RL crosswalk"""
+    return f"""
+    SELECT DISTINCT rl_id, LC_ID
+    FROM {XWALK_TABLE}
+    WHERE rl_id IS NOT NULL
+      AND LC_ID IS NOT NULL
+    """
+
+def sql_overlap_bgi() -> str:
+    """US BGI postings in the crosswalk: id, post date and every field's value"""
+    cols, joins = _overlap_values("bgi")
+    select = ",\n           ".join(["bgi.job_id", f"bgi.{BGI_DATE_COL}"] + cols)
+    return f"""
+    SELECT {select}
+    FROM {Source(BGI_POSTINGS, "bgi", tuple(joins)).sql()}
+    WHERE bgi.bgi_country = 'United States'
+      AND bgi.job_id IN (SELECT rl_id FROM {OVERLAP_XWALK})
+    """
+
+def sql_overlap_lc() -> str:
+    """LC postings in the crosswalk: id, posted date and every field's value"""
+    cols, joins = _overlap_values("lc")
+    select = ",\n           ".join(["lc.id", f"lc.{LC_DATE_COL}"] + cols)
+    return f"""
+    SELECT {select}
+    FROM {Source(LC_POSTINGS, "lc", tuple(joins)).sql()}
+    WHERE lc.id IN (SELECT LC_ID FROM {OVERLAP_XWALK})
+    """
+
 def sql_total_counts_yearly() -> str:
     """Yearly totals for all 4 sources (Full sources filtered to >= FULL_MIN_YEAR)"""
     return f"""
     SELECT 'Overlap_BGI' AS source,
            YEAR(bgi.{BGI_DATE_COL}) AS yr,
            COUNT(DISTINCT bgi.job_id) AS cnt
-    FROM {BGI_POSTINGS} bgi
-    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
-    WHERE bgi.bgi_country = 'United States'
+    FROM {OVERLAP_BGI} bgi
     GROUP BY YEAR(bgi.{BGI_DATE_COL})
     UNION ALL
     SELECT 'Overlap_LC' AS source,
            YEAR(lc.{LC_DATE_COL}) AS yr,
            COUNT(DISTINCT lc.id) AS cnt
-    FROM {LC_POSTINGS} lc
-    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id
+    FROM {OVERLAP_LC} lc
     GROUP BY YEAR(lc.{LC_DATE_COL})
     UNION ALL
     SELECT 'Full_BGI' AS source,
@@ -283,10 +338,8 @@ def sql_total_counts_monthly_last12() -> str:
     LEFT JOIN (
       SELECT DATE_TRUNC('month', bgi.{BGI_DATE_COL}) AS month_start,
              COUNT(DISTINCT bgi.job_id) AS cnt
-      FROM {BGI_POSTINGS} bgi
-      INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
+      FROM {OVERLAP_BGI} bgi
       WHERE bgi.{BGI_DATE_COL} >= DATEADD('month', -11, DATE_TRUNC('month', CURRENT_DATE()))
-        AND bgi.bgi_country = 'United States'
       GROUP BY 1
     ) b USING (month_start)
     UNION ALL
@@ -298,8 +351,7 @@ def sql_total_counts_monthly_last12() -> str:
     LEFT JOIN (
       SELECT DATE_TRUNC('month', lc.{LC_DATE_COL}) AS month_start,
              COUNT(DISTINCT lc.id) AS cnt
-      FROM {LC_POSTINGS} lc
-      INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id
+      FROM {OVERLAP_LC} lc
       WHERE lc.{LC_DATE_COL} >= DATEADD('month', -11, DATE_TRUNC('month', CURRENT_DATE()))
       GROUP BY 1
     ) l USING (month_start)
@@ -337,8 +389,7 @@ def sql_total_counts_monthly_last12() -> str:
 def sql_generic_compare(
     bgi_expr: str,
     lc_expr: str,
-    overlap_bgi_from: str,
-    overlap_lc_from: str,
+    overlap_value: str,
     full_bgi_from: str,
     full_lc_from: str,
     exclude_ilike: list[str] | None = None,
@@ -346,44 +397,40 @@ def sql_generic_compare(
     """Generic comparison for a single field with all 4 sources (Full sources filtered to >= FULL_MIN_YEAR)"""
     bgi_val = _normalized(bgi_expr)
     lc_val = _normalized(lc_expr)
+    # overlap_value: this field's column in OVERLAP_BGI / OVERLAP_LC (already normalized)
+    overlap_bgi_val = f"bgi.{overlap_value}"
+    overlap_lc_val = f"lc.{overlap_value}"
 
-    excl_bgi = ""
-    excl_lc = ""
-    if exclude_ilike:
-        for pat in exclude_ilike:
-            patt = _escape(pat).upper()
-            excl_bgi += f" AND {bgi_val} NOT LIKE '{patt}'"
-            excl_lc += f" AND {lc_val} NOT LIKE '{patt}'"
+    excl_bgi = _exclusions(bgi_val, exclude_ilike)
+    excl_lc = _exclusions(lc_val, exclude_ilike)
+    excl_overlap_bgi = _exclusions(overlap_bgi_val, exclude_ilike)
+    excl_overlap_lc = _exclusions(overlap_lc_val, exclude_ilike)
 
     return f"""
 WITH 
 -- Overlap BGI counts (no year filter)
 overlap_bgi_ind AS (
-    SELECT {bgi_val} AS field_value, COUNT(DISTINCT bgi.job_id) AS overlap_bgi_count
-    FROM {overlap_bgi_from}
-    WHERE bgi.bgi_country = 'United States'
-      AND {bgi_val} IS NOT NULL
-      {excl_bgi}
-    GROUP BY {bgi_val}
+    SELECT {overlap_bgi_val} AS field_value, COUNT(DISTINCT bgi.job_id) AS overlap_bgi_count
+    FROM {OVERLAP_BGI} bgi
+    WHERE {overlap_bgi_val} IS NOT NULL
+      {excl_overlap_bgi}
+    GROUP BY {overlap_bgi_val}
 ),
 overlap_bgi_total AS (
     SELECT COUNT(DISTINCT bgi.job_id) AS total_overlap_bgi
-    FROM {BGI_POSTINGS} bgi
-    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
-    WHERE bgi.bgi_country = 'United States'
+    FROM {OVERLAP_BGI} bgi
 ),
 -- Overlap LC counts (no year filter)
 overlap_lc_ind AS (
-    SELECT {lc_val} AS field_value, COUNT(DISTINCT lc.id) AS overlap_lc_count
-    FROM {overlap_lc_from}
-    WHERE {lc_val} IS NOT NULL
-      {excl_lc}
-    GROUP BY {lc_val}
+    SELECT {overlap_lc_val} AS field_value, COUNT(DISTINCT lc.id) AS overlap_lc_count
+    FROM {OVERLAP_LC} lc
+    WHERE {overlap_lc_val} IS NOT NULL
+      {excl_overlap_lc}
+    GROUP BY {overlap_lc_val}
 ),
 overlap_lc_total AS (
     SELECT COUNT(DISTINCT lc.id) AS total_overlap_lc
-    FROM {LC_POSTINGS} lc
-    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id
+    FROM {OVERLAP_LC} lc
 ),
 -- Full BGI counts (filtered to >= FULL_MIN_YEAR)
 full_bgi_ind AS (
@@ -459,8 +506,7 @@ ORDER BY full_bgi_count DESC NULLS LAST, overlap_bgi_count DESC NULLS LAST
 def sql_generic_kpis(
     bgi_expr: str,
     lc_expr: str,
-    overlap_bgi_from: str,
-    overlap_lc_from: str,
+    overlap_value: str,
     full_bgi_from: str,
     full_lc_from: str,
     exclude_ilike: list[str] | None = None,
@@ -468,42 +514,38 @@ def sql_generic_kpis(
     """KPI totals + coverage for all 4 sources (Full sources filtered to >= FULL_MIN_YEAR)"""
     bgi_val = _normalized(bgi_expr)
     lc_val = _normalized(lc_expr)
+    # overlap_value: this field's column in OVERLAP_BGI / OVERLAP_LC (already normalized)
+    overlap_bgi_val = f"bgi.{overlap_value}"
+    overlap_lc_val = f"lc.{overlap_value}"
 
-    excl_bgi = ""
-    excl_lc = ""
-    if exclude_ilike:
-        for pat in exclude_ilike:
-            patt = _escape(pat).upper()
-            excl_bgi += f" AND {bgi_val} NOT LIKE '{patt}'"
-            excl_lc += f" AND {lc_val} NOT LIKE '{patt}'"
+    excl_bgi = _exclusions(bgi_val, exclude_ilike)
+    excl_lc = _exclusions(lc_val, exclude_ilike)
+    excl_overlap_bgi = _exclusions(overlap_bgi_val, exclude_ilike)
+    excl_overlap_lc = _exclusions(overlap_lc_val, exclude_ilike)
 
     return f"""
 WITH 
 -- Overlap BGI (no year filter)
 overlap_bgi_total AS (
     SELECT COUNT(DISTINCT bgi.job_id) AS total_overlap_bgi
-    FROM {BGI_POSTINGS} bgi
-    INNER JOIN {XWALK_TABLE} xwalk_bgi ON xwalk_bgi.rl_id = bgi.job_id
-    WHERE bgi.bgi_country = 'United States'
+    FROM {OVERLAP_BGI} bgi
 ),
 overlap_bgi_cov AS (
     SELECT COUNT(DISTINCT bgi.job_id) AS covered_overlap_bgi
-    FROM {overlap_bgi_from}
-    WHERE bgi.bgi_country = 'United States'
-      AND {bgi_val} IS NOT NULL
-      {excl_bgi}
+    FROM {OVERLAP_BGI} bgi
+    WHERE {overlap_bgi_val} IS NOT NULL
+      {excl_overlap_bgi}
 ),
 -- Overlap LC (no year filter)
 overlap_lc_total AS (
     SELECT COUNT(DISTINCT lc.id) AS total_overlap_lc
-    FROM {LC_POSTINGS} lc
-    INNER JOIN {XWALK_TABLE} xwalk_lc ON xwalk_lc.LC_ID = lc.id
+    FROM {OVERLAP_LC} lc
 ),
 overlap_lc_cov AS (
     SELECT COUNT(DISTINCT lc.id) AS covered_overlap_lc
-    FROM {overlap_lc_from}
-    WHERE {lc_val} IS NOT NULL
-      {excl_lc}
+    FROM {OVERLAP_LC} lc
+    WHERE {overlap_lc_val} IS NOT NULL
+      {excl_overlap_lc}
 ),
 -- Full BGI (filtered to >= FULL_MIN_YEAR)
 full_bgi_total AS (
@@ -561,7 +603,7 @@ def _jolts_code_to_sector():
 # ── JOLTS monthly: load Excel and upload to staging table ────────────────
 def load_and_upload_jolts(conn):
     """Load JOLTS Excel (wide format, values in thousands), upload as JOLTS_MONTHLY_RAW"""
-    jolts_raw = pd.read_excel(JOLTS_EXCEL_PATH, sheet_name='Sheet1')
+    jolts_raw = read_excel_cached(JOLTS_EXCEL_PATH, sheet_name='Sheet1')
     year_col = jolts_raw.columns[0]
     month_cols = jolts_raw.columns[1:]
     # Melt wide → long
@@ -569,48 +611,38 @@ def load_and_upload_jolts(conn):
                                 var_name='MONTH_NAME', value_name='POSTING_COUNT')
     jolts_long.rename(columns={year_col: 'YEAR'}, inplace=True)
     jolts_long['YEAR'] = pd.to_numeric(jolts_long['YEAR'], errors='coerce')
-    jolts_long = jolts_long.dropna(subset=['YEAR'])
+    jolts_long['POSTING_COUNT'] = pd.to_numeric(jolts_long['POSTING_COUNT'], errors='coerce')
     # Map month names → numbers → date
     month_map = {m: i for i, m in enumerate(
         ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1)}
     jolts_long['MONTH_NUM'] = jolts_long['MONTH_NAME'].map(month_map)
-    jolts_long['MONTH'] = pd.to_datetime(
-        jolts_long['YEAR'].astype(int).astype(str) + '-' +
-        jolts_long['MONTH_NUM'].astype(int).astype(str) + '-01', errors='coerce')
-    jolts_long = jolts_long.dropna(subset=['MONTH', 'POSTING_COUNT'])
-    jolts_long['POSTING_COUNT'] = (jolts_long['POSTING_COUNT'] * 1000).astype(int)
-    result = jolts_long[['MONTH', 'POSTING_COUNT']].sort_values('MONTH').reset_index(drop=True)
-    # Upload to Snowflake
-    execute_ddl("CREATE OR REPLACE TABLE JOLTS_MONTHLY_RAW (MONTH DATE, POSTING_COUNT NUMBER)", conn)
-    cur = conn.cursor()
-    try:
-        cur.executemany(
-            "INSERT INTO JOLTS_MONTHLY_RAW (MONTH, POSTING_COUNT) VALUES (%s, %s)",
-            [(r['MONTH'].strftime('%Y-%m-%d'), int(r['POSTING_COUNT'])) for _, r in result.iterrows()])
-        conn.commit()
-    finally:
-        cur.close()
+    jolts_long = jolts_long.dropna(subset=['YEAR', 'MONTH_NUM', 'POSTING_COUNT'])
+    jolts_long['MONTH'] = pd.to_datetime(pd.DataFrame({
+        'year': jolts_long['YEAR'].astype(int),
+        'month': jolts_long['MONTH_NUM'].astype(int),
+        'day': 1,
+    }), errors='coerce')
+    jolts_long = jolts_long.dropna(subset=['MONTH'])
+    result = pd.DataFrame({
+        'MONTH': jolts_long['MONTH'].dt.date,
+        'POSTING_COUNT': (jolts_long['POSTING_COUNT'] * 1000).round().astype('int64'),
+    }).sort_values('MONTH').reset_index(drop=True)
+    return upload_df(result, "JOLTS_MONTHLY_RAW", "MONTH DATE, POSTING_COUNT NUMBER", conn)
 
 
 # ── OEWS national: load Excel and upload to staging table ────────────────
 def load_and_upload_oews(conn):
     """Load OEWS Excel, keep major occupation groups, upload as OEWS_NATIONAL_RAW"""
-    oews_raw = pd.read_excel(OEWS_EXCEL_PATH)
-    oews_major = oews_raw[oews_raw['O_GROUP'] == 'major'].copy()
+    oews_raw = read_excel_cached(OEWS_EXCEL_PATH)
+    oews_major = oews_raw.loc[oews_raw['O_GROUP'] == 'major', ['OCC_TITLE', 'TOT_EMP']].copy()
     oews_major['TOT_EMP'] = pd.to_numeric(oews_major['TOT_EMP'], errors='coerce')
     oews_major = oews_major.dropna(subset=['TOT_EMP'])
-    result = oews_major[['OCC_TITLE', 'TOT_EMP']].reset_index(drop=True)
-    # Upload to Snowflake
-    execute_ddl("CREATE OR REPLACE TABLE OEWS_NATIONAL_RAW (OCC_TITLE VARCHAR, TOT_EMP NUMBER)", conn)
-    cur = conn.cursor()
-    try:
-        cur.executemany(
-            "INSERT INTO OEWS_NATIONAL_RAW (OCC_TITLE, TOT_EMP) VALUES (%s, %s)",
-            [(str(r['OCC_TITLE']), int(r['TOT_EMP'])) for _, r in result.iterrows()])
-        conn.commit()
-    finally:
-        cur.close()
+    result = pd.DataFrame({
+        'OCC_TITLE': oews_major['OCC_TITLE'].astype(str),
+        'TOT_EMP': oews_major['TOT_EMP'].astype('int64'),
+    }).reset_index(drop=True)
+    return upload_df(result, "OEWS_NATIONAL_RAW", "OCC_TITLE VARCHAR, TOT_EMP NUMBER", conn)
 
 
 # ── JOLTS monthly comparison SQL (JOLTS + Full_BGI + Full_LC) ────────────
@@ -758,6 +790,56 @@ def sql_oews_soc2_comparison():
     """
 
 
+# ── Long-format benchmark tables (one row per key × source, chart-ready) ──
+_BENCH_LABELS = {"JOLTS": "JOLTS", "OEWS": "OEWS", "BGI": "BGI", "LC": "Lightcast",
+                 "Full_BGI": "BGI", "Full_LC": "Lightcast"}
+
+def sql_long_jolts_monthly() -> str:
+    """JOLTS_MONTHLY_COMPARISON with display source labels."""
+    labels = "\n".join(f"                WHEN '{k}' THEN '{v}'" for k, v in _BENCH_LABELS.items())
+    return f"""
+    SELECT CASE SOURCE
+{labels}
+                ELSE SOURCE END AS SOURCE,
+           MONTH_START, CNT
+    FROM JOLTS_MONTHLY_COMPARISON
+    ORDER BY SOURCE, MONTH_START
+    """
+
+def sql_long_benchmark(table: str, key_col: str, sources: list, rank_by: str, key_expr: str = None) -> str:
+    """Long (key, SOURCE, CNT, PCT, KEY_RANK) from a wide benchmark table.
+
+    sources: [(prefix, count column)] with a <prefix>_PCT share column each.
+    KEY_RANK orders keys by `rank_by` (the chart's sort order).
+    """
+    key_expr = key_expr or key_col
+    selects = "\n    UNION ALL\n".join(
+        f"    SELECT KEY_LABEL AS {key_col}, '{_BENCH_LABELS[prefix]}' AS SOURCE,\n"
+        f"           {count_col} AS CNT, {prefix}_PCT AS PCT, KEY_RANK\n"
+        f"    FROM ranked"
+        for prefix, count_col in sources
+    )
+    return f"""
+    WITH ranked AS (
+        SELECT w.*, {key_expr} AS KEY_LABEL,
+               ROW_NUMBER() OVER (ORDER BY {rank_by} DESC, {key_col}) AS KEY_RANK
+        FROM {table} w
+    )
+{selects}
+    ORDER BY KEY_RANK, SOURCE
+    """
+
+def sql_long_jolts_industry() -> str:
+    return sql_long_benchmark("JOLTS_INDUSTRY_COMPARISON", "SECTOR",
+                              [("JOLTS", "JOLTS_COUNT"), ("BGI", "BGI_COUNT"), ("LC", "LC_COUNT")],
+                              rank_by="JOLTS_COUNT")
+
+def sql_long_oews_soc2() -> str:
+    return sql_long_benchmark("OEWS_SOC2_COMPARISON", "SOC2_NAME",
+                              [("OEWS", "OEWS_EMPL"), ("BGI", "BGI_COUNT"), ("LC", "LC_COUNT")],
+                              rank_by="OEWS_EMPL", key_expr="INITCAP(SOC2_NAME)")
+
+
 # ─────────────────────────── TABLE NAME HELPERS ─────────────────────────────
 def clean_name(s: str) -> str:
     return s.upper().replace(" ", "_").replace("-", "_").replace("'", "")
@@ -770,27 +852,76 @@ def make_kpi_table_name(topic: str, field: str) -> str:
 
 # ─────────────────────────── MAIN SCRIPT ─────────────────────────────
 def main():
-    print(f"[{datetime.now()}] Starting temp table creation...")
-
-    conn = snow.connect(
-        user=user,
-        password=password,
-        account=account,
-        warehouse=warehouse,
-        database=database,
-        schema=schema
-    )
+    build_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"[{datetime.now()}] Starting temp table creation (build {build_id})...")
+
+    conn = provider.connect()
     print(f"[{datetime.now()}] Connected to Snowflake")
     print(f"[{datetime.now()}] Using {database}.{schema}")
 
+    try:
+        publisher.acquire_lock(f"overlap-sample build {build_id}", conn)
+    except BaseException:
+        conn.close()
+        raise
+    try:
+        built_since = publisher.prepare_shadow(conn)
+        print(f"[{datetime.now()}] Building into shadow schema {database}.{SHADOW_SCHEMA}")
+        total_tables, failed = build_tables(conn)
+
+        print(f"\n[{datetime.now()}] Updating {MANIFEST_TABLE}...")
+        try:
+            write_manifest(build_id, conn, sources=SOURCE_TABLES)
+            print(f"  ✓ {MANIFEST_TABLE} (build {build_id})")
+            total_tables += 1
+        except Exception as e:
+            print(f"  ✗ {MANIFEST_TABLE}: {e}")
+            failed += 1
+
+        print(f"\n[{datetime.now()}] Validating {SHADOW_SCHEMA}...")
+        ok, msg = publisher.validate_shadow(built_since, failed, conn)
+        print(f"  {msg}")
+        if ok:
+            publisher.publish_shadow(conn)
+            print(f"  ✓ Published {SHADOW_SCHEMA} → {schema}")
+            try:
+                snapshot = snapshot_live(build_id, conn, SOURCE_TABLES)
+                print(f"  ✓ Snapshot {snapshot}")
+                for name in prune_snapshots(conn):
+                    print(f"  ✓ Dropped old snapshot {name}")
+            except Exception as e:
+                print(f"  ✗ Snapshot: {e}")
+        else:
+            print(f"  ✗ Not published; {schema} unchanged, build kept in {SHADOW_SCHEMA}")
+    finally:
+        publisher.release_lock(conn)
+        conn.close()
+
+    print(f"\n[{datetime.now()}] ═══════════════════════════════════════")
+    print(f"[{datetime.now()}] Complete! Created {total_tables} tables in {database}.{schema if ok else SHADOW_SCHEMA}")
+    print(f"[{datetime.now()}] ═══════════════════════════════════════")
+    if not ok:
+        raise SystemExit(1)
+
+def build_tables(conn):
+    """Create every table in the session's current (shadow) schema; return (created, failed)."""
     total_tables = 0
+    failed = 0
 
-    # Create schema if not exists
-    try:
-        execute_ddl(f"CREATE SCHEMA IF NOT EXISTS {database}.{schema}", conn)
-        print(f"[{datetime.now()}] Schema {schema} ready")
-    except Exception as e:
-        print(f"[{datetime.now()}] Schema note: {e}")
+    # Overlap sample: deduplicated crosswalk, then slim overlap-only tables
+    for table, sql in [
+        (OVERLAP_XWALK, sql_overlap_xwalk()),
+        (OVERLAP_BGI, sql_overlap_bgi()),
+        (OVERLAP_LC, sql_overlap_lc()),
+    ]:
+        print(f"\n[{datetime.now()}] Creating {table}...")
+        try:
+            execute_ddl(f"CREATE OR REPLACE TABLE {table} AS\n{sql}", conn)
+            print(f"  ✓ Created {table}")
+            total_tables += 1
+        except Exception as e:
+            print(f"  ✗ Failed to create {table}: {e}")
+            failed += 1
 
     # Total counts yearly
     print(f"\n[{datetime.now()}] Processing: total counts yearly (4 sources)")
@@ -801,6 +932,7 @@ def main():
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to create TOTAL_COUNTS_YEARLY: {e}")
+        failed += 1
 
     # Total counts monthly (last 12 months)
     print(f"\n[{datetime.now()}] Processing: total counts monthly (4 sources)")
@@ -811,6 +943,7 @@ def main():
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to create TOTAL_COUNTS_MONTHLY: {e}")
+        failed += 1
 
     # Process topic/field combinations (no year loop - single table per field)
     for topic, meta in TOPICS.items():
@@ -819,8 +952,7 @@ def main():
         for field_name, field_map in meta["fields"].items():
             bgi_expr = field_map["bgi_expr"]
             lc_expr = field_map["lc_expr"]
-            overlap_bgi_from = field_map["overlap_bgi_from"]
-            overlap_lc_from = field_map["overlap_lc_from"]
+            overlap_value = overlap_col(topic, field_name)
             full_bgi_from = field_map["full_bgi_from"]
             full_lc_from = field_map["full_lc_from"]
 
@@ -830,7 +962,7 @@ def main():
             kpi_table = make_kpi_table_name(topic, field_name)
             kpi_sql = sql_generic_kpis(
                 bgi_expr, lc_expr,
-                overlap_bgi_from, overlap_lc_from,
+                overlap_value,
                 full_bgi_from, full_lc_from,
                 exclude_ilike
             )
@@ -840,12 +972,13 @@ def main():
                 total_tables += 1
             except Exception as e:
                 print(f"  ✗ Failed to create {kpi_table}: {e}")
+                failed += 1
 
             # Comparison table
             comp_table = make_comparison_table_name(topic, field_name)
             comp_sql = sql_generic_compare(
                 bgi_expr, lc_expr,
-                overlap_bgi_from, overlap_lc_from,
+                overlap_value,
                 full_bgi_from, full_lc_from,
                 exclude_ilike
             )
@@ -855,17 +988,19 @@ def main():
                 total_tables += 1
             except Exception as e:
                 print(f"  ✗ Failed to create {comp_table}: {e}")
+                failed += 1
 
     # ── 3. Public data comparisons ──────────────────────────────────────
 
     # Upload JOLTS Excel → staging table
     print(f"\n[{datetime.now()}] Uploading JOLTS monthly data from Excel...")
     try:
-        load_and_upload_jolts(conn)
-        print(f"  ✓ Uploaded JOLTS_MONTHLY_RAW")
+        n = load_and_upload_jolts(conn)
+        print(f"  ✓ Uploaded JOLTS_MONTHLY_RAW ({n} rows)")
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to upload JOLTS data: {e}")
+        failed += 1
 
     # JOLTS monthly comparison (JOLTS + Full_BGI + Full_LC)
     print(f"\n[{datetime.now()}] Creating JOLTS_MONTHLY_COMPARISON...")
@@ -875,6 +1010,7 @@ def main():
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to create JOLTS_MONTHLY_COMPARISON: {e}")
+        failed += 1
 
     # JOLTS industry comparison (JOLTS + Full_BGI + Full_LC by sector, 2024)
     print(f"\n[{datetime.now()}] Creating JOLTS_INDUSTRY_COMPARISON...")
@@ -884,15 +1020,17 @@ def main():
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to create JOLTS_INDUSTRY_COMPARISON: {e}")
+        failed += 1
 
     # Upload OEWS Excel → staging table
     print(f"\n[{datetime.now()}] Uploading OEWS national data from Excel...")
     try:
-        load_and_upload_oews(conn)
-        print(f"  ✓ Uploaded OEWS_NATIONAL_RAW")
+        n = load_and_upload_oews(conn)
+        print(f"  ✓ Uploaded OEWS_NATIONAL_RAW ({n} rows)")
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to upload OEWS data: {e}")
+        failed += 1
 
     # OEWS SOC2 comparison (OEWS + Full_BGI + Full_LC by SOC2)
     print(f"\n[{datetime.now()}] Creating OEWS_SOC2_COMPARISON...")
@@ -902,11 +1040,24 @@ def main():
         total_tables += 1
     except Exception as e:
         print(f"  ✗ Failed to create OEWS_SOC2_COMPARISON: {e}")
+        failed += 1
 
-    conn.close()
-    print(f"\n[{datetime.now()}] ═══════════════════════════════════════")
-    print(f"[{datetime.now()}] Complete! Created {total_tables} tables in {database}.{schema}")
-    print(f"[{datetime.now()}] ═══════════════════════════════════════")
+    # Long-format benchmark tables for the dashboard charts
+    for long_table, long_sql in [
+        ("LONG_JOLTS_MONTHLY_COMPARISON", sql_long_jolts_monthly()),
+        ("LONG_JOLTS_INDUSTRY_COMPARISON", sql_long_jolts_industry()),
+        ("LONG_OEWS_SOC2_COMPARISON", sql_long_oews_soc2()),
+    ]:
+        print(f"\n[{datetime.now()}] Creating {long_table}...")
+        try:
+            execute_ddl(f"CREATE OR REPLACE TABLE {long_table} AS\n{long_sql}", conn)
+            print(f"  ✓ Created {long_table}")
+            total_tables += 1
+        except Exception as e:
+            print(f"  ✗ Failed to create {long_table}: {e}")
+            failed += 1
+
+    return total_tables, failed
 
 if __name__ == "__main__":
     main()
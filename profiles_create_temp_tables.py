@@ -4,11 +4,12 @@
 # ── Only change BASE_VERSION and NEW_VERSION below to run a new comparison ──
 
 import pandas as pd
-import snowflake.connector as snow
 from datetime import datetime
 
-import os
-import importlib.util
+import argparse
+from build_telemetry import BuildTelemetry, check_budget, parse_bytes, print_plan
+from connection import ConnectionProvider, execute_ddl
+from publish import SchemaPublisher
 
 # ─────────────────────────── VERSION CONFIG ───────────────────────────
 BASE_VERSION = "v5_OCT25"
@@ -27,21 +28,10 @@ COUNTRY_OPTIONS = [
 ]
 
 # ─────────────────────────── SNOWFLAKE CONNECTION ─────────────────────────
-config_file_path = r"C:\Users\JuliaNania\OneDrive - Burning Glass Institute\Documents\Python\config.py"
-
-if not os.path.isfile(config_file_path):
-    raise FileNotFoundError(f"Config file does not exist at the specified path: {config_file_path}")
-
-spec = importlib.util.spec_from_file_location("config", config_file_path)
-config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(config)
-
-user = config.credentials['USERNAME']
-password = config.credentials['PASSWORD']
-account = 'PCA67849'
-warehouse = config.credentials['WAREHOUSE']
 database = 'PROJECT_DATA'
 schema = 'PDL_RELEASE_COMPARISONS_BGI_2026_02'
+# Credentials are looked up on first connect (env vars or config.py, see connection.py)
+provider = ConnectionProvider(database, schema)
 
 def get_query(query, conn):
     """Execute query and return pandas dataframe"""
@@ -53,19 +43,6 @@ def get_query(query, conn):
     finally:
         cur.close()
 
-def execute_ddl(query, conn):
-    """Execute DDL statement (CREATE TABLE, etc.)"""
-    cur = conn.cursor()
-    try:
-        cur.execute(query)
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        cur.close()
-
 # ───────────────────────── TOPIC METADATA ─────────────────────────────
 # Table paths are built dynamically as pdl_clean.{version}.{table_name}
 TOPICS = {
@@ -284,67 +261,20 @@ def make_comparison_table_name(topic: str, field: str, country: str) -> str:
 def make_kpi_table_name(topic: str, field: str, country: str) -> str:
     return f"KPI_{clean_name(topic)}_{clean_name(field)}_{clean_name(country)}"
 
-# ─────────────────────────── MAIN SCRIPT ─────────────────────────────
-def main():
+# ─────────────────────── PUBLISH (shadow build + schema swap) ─────────────
+# Tables are built in a clone of the live schema and swapped in atomically,
+# under the schema's build lock (see publish.py).
+publisher = SchemaPublisher(database, schema)
+SHADOW_SCHEMA = publisher.shadow_schema
+
+# ─────────────────────────── BENCHMARK SQL ─────────────────────────────
+def build_roles_benchmark_query() -> str:
+    """US SOC-2 shares (base vs new) against OEWS / ACS employment shares."""
     base_a = _alias(BASE_VERSION)
     new_a = _alias(NEW_VERSION)
-
-    print(f"[{datetime.now()}] Starting temp table creation...")
-    print(f"[{datetime.now()}] Comparing {BASE_VERSION} (base) → {NEW_VERSION} (new)")
-
-    conn = snow.connect(
-        user=user, password=password, account=account,
-        warehouse=warehouse, database=database, schema=schema
-    )
-    execute_ddl(f"USE DATABASE {database}", conn)
-    execute_ddl(f"CREATE SCHEMA IF NOT EXISTS {schema}", conn)
-    execute_ddl(f"USE SCHEMA {schema}", conn)
-    print(f"[{datetime.now()}] Connected to Snowflake")
-    print(f"[{datetime.now()}] Using {database}.{schema}")
-
-    total_tables = 0
-
-    # Process standard topic/field/country combinations
-    for topic, meta in TOPICS.items():
-        table_base = _get_table(meta, BASE_VERSION)
-        table_new = _get_table(meta, NEW_VERSION)
-        country_col = meta["country_col"]
-        id_col = meta.get("id_col", "ID")
-
-        for field in meta["fields"]:
-            for country in COUNTRY_OPTIONS:
-                print(f"\n[{datetime.now()}] Processing: {topic} | {field} | {country}")
-
-                # KPI table
-                kpi_table = make_kpi_table_name(topic, field, country)
-                kpi_sql = build_kpi_query(
-                    table_base, table_new, field, country, country_col,
-                    id_col=id_col, topic=topic
-                )
-                try:
-                    execute_ddl(f"CREATE OR REPLACE TABLE {kpi_table} AS\n{kpi_sql}", conn)
-                    print(f"  ✓ Created {kpi_table}")
-                    total_tables += 1
-                except Exception as e:
-                    print(f"  ✗ Failed to create {kpi_table}: {e}")
-
-                # Comparison table
-                comp_table = make_comparison_table_name(topic, field, country)
-                comp_sql = build_comparison_query(
-                    table_base, table_new, field, country, country_col, topic=topic
-                )
-                try:
-                    execute_ddl(f"CREATE OR REPLACE TABLE {comp_table} AS\n{comp_sql}", conn)
-                    print(f"  ✓ Created {comp_table}")
-                    total_tables += 1
-                except Exception as e:
-                    print(f"  ✗ Failed to create {comp_table}: {e}")
-
-    # Special case: Roles benchmark (US only)
-    print(f"\n[{datetime.now()}] Processing: roles benchmark (OEWS/ACS)")
     roles_base = _get_table(TOPICS["roles"], BASE_VERSION)
     roles_new = _get_table(TOPICS["roles"], NEW_VERSION)
-    role_bench_sql = f"""
+    return f"""
     WITH new_ver AS (
       SELECT
         bgi_soc2_name,
@@ -378,20 +308,15 @@ def main():
       ON oews.soc_2_name = COALESCE(base_ver.bgi_soc2_name, new_ver.bgi_soc2_name)
     """
 
-    try:
-        execute_ddl(f"CREATE OR REPLACE TABLE ROLES_BENCHMARK_OEWS_ACS AS\n{role_bench_sql}", conn)
-        print(f"  ✓ Created ROLES_BENCHMARK_OEWS_ACS")
-        total_tables += 1
-    except Exception as e:
-        print(f"  ✗ Failed to create ROLES_BENCHMARK_OEWS_ACS: {e}")
-
-    # Special case: Employer industry vs BLS
-    print(f"\n[{datetime.now()}] Processing: employer industry (BLS)")
+def build_employers_industry_bls_query() -> str:
+    """US employer NAICS-2 shares (base vs new) mapped onto BLS industries, 2023."""
+    base_a = _alias(BASE_VERSION)
+    new_a = _alias(NEW_VERSION)
     emp_base = _get_table(TOPICS["employers"], BASE_VERSION)
     emp_new = _get_table(TOPICS["employers"], NEW_VERSION)
     perc_base = f"PERC_{base_a.upper()}"
     perc_new = f"PERC_{new_a.upper()}"
-    employer_bls_sql = f"""
+    return f"""
     WITH NEW_EXP AS (
         SELECT
             exp.PERSON_ID,
@@ -446,17 +371,209 @@ def main():
     GROUP BY BLS_CODE, bls.INDUSTRY
     """
 
+# ─────────────────────── BUILD TELEMETRY (per-statement query stats) ───────
+# Statements are tagged with the build id, phase, step and topic/field/country;
+# the build's query stats are appended to BUILD_TELEMETRY (see build_telemetry.py).
+TELEMETRY_TABLE = "BUILD_TELEMETRY"
+telemetry = BuildTelemetry(database, schema, TELEMETRY_TABLE, "release_comparisons.profiles",
+                           extra_tags=("country",))
+
+# ─────────────────────── BUILD PLAN (cost / ETA estimate) ─────────────────
+# --plan EXPLAINs every selected statement and projects runtime and credits
+# from BUILD_TELEMETRY (see build_telemetry.py). --max-bytes-per-statement
+# refuses to start any statement whose EXPLAIN exceeds the budget (the table
+# fails, the build goes on).
+
+def plan_build(steps, max_bytes, conn):
+    """Print per-statement scan / runtime / credit estimates and the projected total."""
+    history, secs_per_byte = telemetry.history(conn)
+    statements = [(step["name"], step["sql"], provider.warehouse) for step in steps]
+    print_plan(statements, history, secs_per_byte, max_bytes, conn)
+
+# ─────────────────────────── BUILD STEPS ─────────────────────────────
+STEP_GROUPS = ["topics", "benchmarks"]
+
+def build_steps():
+    """Every table the build can create, in build order.
+
+    A step is a dict with name, group, topic/field/country (topic steps only) and `sql`.
+    """
+    steps = []
+    for topic, meta in TOPICS.items():
+        table_base = _get_table(meta, BASE_VERSION)
+        table_new = _get_table(meta, NEW_VERSION)
+        country_col = meta["country_col"]
+        id_col = meta.get("id_col", "ID")
+
+        for field in meta["fields"]:
+            for country in COUNTRY_OPTIONS:
+                where = {"topic": topic, "field": field, "country": country}
+                steps.append({
+                    "name": make_kpi_table_name(topic, field, country), "group": "topics", **where,
+                    "sql": build_kpi_query(
+                        table_base, table_new, field, country, country_col,
+                        id_col=id_col, topic=topic
+                    ),
+                })
+                steps.append({
+                    "name": make_comparison_table_name(topic, field, country), "group": "topics", **where,
+                    "sql": build_comparison_query(
+                        table_base, table_new, field, country, country_col, topic=topic
+                    ),
+                })
+
+    # Special cases: roles benchmark (US only), employer industry vs BLS
+    steps.append({"name": "ROLES_BENCHMARK_OEWS_ACS", "group": "benchmarks",
+                  "topic": None, "field": None, "country": None, "sql": build_roles_benchmark_query()})
+    steps.append({"name": "EMPLOYERS_INDUSTRY_BLS", "group": "benchmarks",
+                  "topic": None, "field": None, "country": None, "sql": build_employers_industry_bls_query()})
+    return steps
+
+def _field_matches(step, fields):
+    """`fields` entries are FIELD or TOPIC/FIELD (case-insensitive)."""
+    for f in fields:
+        topic, _, field = f.rpartition("/")
+        if field.upper() == step["field"].upper() and (not topic or topic.lower() == step["topic"]):
+            return True
+    return False
+
+def select_steps(steps, topics=None, fields=None, countries=None, only=None):
+    """Filter steps by group (--only) and, for topic steps, by topic / field / country.
+
+    --topics / --fields / --countries on their own imply --only topics.
+    """
+    if (topics or fields or countries) and not only:
+        only = ["topics"]
+    countries = {c.lower() for c in countries} if countries else None
+    selected = []
+    for step in steps:
+        if only and step["group"] not in only:
+            continue
+        if step["group"] == "topics":
+            if topics and step["topic"] not in topics:
+                continue
+            if fields and not _field_matches(step, fields):
+                continue
+            if countries and step["country"].lower() not in countries:
+                continue
+        selected.append(step)
+    return selected
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=f"Build PDL {BASE_VERSION} vs {NEW_VERSION} comparison tables (all by default)."
+    )
+    parser.add_argument("--topics", nargs="+", choices=list(TOPICS), metavar="TOPIC",
+                        help=f"only these topics ({', '.join(TOPICS)})")
+    parser.add_argument("--fields", nargs="+", metavar="[TOPIC/]FIELD",
+                        help="only these fields, e.g. BGI_CITY or location/BGI_CITY")
+    parser.add_argument("--countries", nargs="+", metavar="COUNTRY",
+                        help="only these countries, e.g. 'United Kingdom' Singapore")
+    parser.add_argument("--only", nargs="+", choices=STEP_GROUPS, metavar="GROUP",
+                        help=f"only these step groups ({', '.join(STEP_GROUPS)})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the SQL for the selected tables without connecting")
+    parser.add_argument("--list", action="store_true",
+                        help="list the selected targets and exit")
+    parser.add_argument("--plan", action="store_true",
+                        help="estimate bytes, runtime and credits per statement (EXPLAIN + past builds) and exit")
+    parser.add_argument("--max-bytes-per-statement", type=parse_bytes, metavar="SIZE",
+                        help="don't run statements whose EXPLAIN exceeds this many bytes, e.g. 500GB")
+    args = parser.parse_args(argv)
+    unknown = [c for c in args.countries or [] if c.lower() not in {o.lower() for o in COUNTRY_OPTIONS}]
+    if unknown:
+        parser.error(f"unknown countries: {', '.join(unknown)} (choose from {', '.join(COUNTRY_OPTIONS)})")
+    return args
+
+# ─────────────────────────── MAIN SCRIPT ─────────────────────────────
+def main(argv=None):
+    args = parse_args(argv)
+    steps = select_steps(build_steps(), args.topics, args.fields, args.countries, args.only)
+
+    if args.list:
+        for step in steps:
+            where = f"{step['topic']}/{step['field']} · {step['country']}" if step["group"] == "topics" else ""
+            print(f"{step['group']:<11} {step['name']:<70} {where}")
+        print(f"\n{len(steps)} targets")
+        return
+
+    if args.dry_run:
+        for step in steps:
+            print(f"\n-- {step['name']} ({step['group']})")
+            print(f"CREATE OR REPLACE TABLE {step['name']} AS\n{step['sql']};")
+        return
+
+    build_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"[{datetime.now()}] Starting temp table creation (build {build_id})...")
+    print(f"[{datetime.now()}] Comparing {BASE_VERSION} (base) → {NEW_VERSION} (new)")
+    print(f"[{datetime.now()}] {len(steps)} tables selected")
+
+    conn = provider.connect()
+    telemetry.set_query_tag(conn, build_id, phase="setup")
+
+    if args.plan:
+        print(f"[{datetime.now()}] Planning {len(steps)} tables...")
+        plan_build(steps, args.max_bytes_per_statement, conn)
+        conn.close()
+        return
+
     try:
-        execute_ddl(f"CREATE OR REPLACE TABLE EMPLOYERS_INDUSTRY_BLS AS\n{employer_bls_sql}", conn)
-        print(f"  ✓ Created EMPLOYERS_INDUSTRY_BLS")
-        total_tables += 1
-    except Exception as e:
-        print(f"  ✗ Failed to create EMPLOYERS_INDUSTRY_BLS: {e}")
+        publisher.acquire_lock(f"profiles build {build_id}", conn)
+    except BaseException:
+        conn.close()
+        raise
+    try:
+        built_since = publisher.prepare_shadow(conn)
+        print(f"[{datetime.now()}] Connected to Snowflake")
+        print(f"[{datetime.now()}] Building into shadow schema {database}.{SHADOW_SCHEMA}")
+
+        total_tables = 0
+        failed = 0
+
+        for step in steps:
+            if step["group"] == "topics":
+                print(f"\n[{datetime.now()}] Processing: {step['topic']} | {step['field']} | {step['country']}")
+            else:
+                print(f"\n[{datetime.now()}] Processing: {step['name']}")
+            telemetry.set_query_tag(conn, build_id, phase="step", step=step["name"], group=step["group"],
+                          topic=step["topic"], field=step["field"], country=step["country"])
+            try:
+                check_budget(step["sql"], args.max_bytes_per_statement, conn)
+                execute_ddl(f"CREATE OR REPLACE TABLE {step['name']} AS\n{step['sql']}", conn)
+                print(f"  ✓ Created {step['name']}")
+                total_tables += 1
+            except Exception as e:
+                print(f"  ✗ Failed to create {step['name']}: {e}")
+                failed += 1
+
+        # Validate shadow build and publish
+        telemetry.set_query_tag(conn, build_id, phase="finish")
+        print(f"\n[{datetime.now()}] Validating {SHADOW_SCHEMA}...")
+        ok, msg = publisher.validate_shadow(built_since, failed, conn)
+        print(f"  {msg}")
+        if ok:
+            publisher.publish_shadow(conn)
+            print(f"  ✓ Published {SHADOW_SCHEMA} → {schema}")
+        else:
+            print(f"  ✗ Not published; {schema} unchanged, build kept in {SHADOW_SCHEMA}")
+
+        # Telemetry (query stats per statement)
+        print(f"\n[{datetime.now()}] Recording telemetry in {schema}.{TELEMETRY_TABLE}...")
+        try:
+            n = telemetry.record(build_id, conn)
+            print(f"  ✓ {n} statements recorded")
+            telemetry.print_summary(build_id, conn)
+        except Exception as e:
+            print(f"  ✗ Telemetry: {e}")
+    finally:
+        publisher.release_lock(conn)
+        conn.close()
 
-    conn.close()
     print(f"\n[{datetime.now()}] ═══════════════════════════════════════")
-    print(f"[{datetime.now()}] Complete! Created {total_tables} tables in {database}.{schema}")
+    print(f"[{datetime.now()}] Complete! Created {total_tables} tables in {database}.{schema if ok else SHADOW_SCHEMA}")
     print(f"[{datetime.now()}] ═══════════════════════════════════════")
+    if not ok:
+        raise SystemExit(f"Build {build_id} not published ({failed} tables failed)")
 
 if __name__ == "__main__":
     main()
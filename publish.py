@@ -0,0 +1,83 @@
+# publish.py
+# Shadow build + atomic schema swap for the release-comparison builders.
+#
+# Tables are built in a clone of the live schema (<schema>_SHADOW) and swapped
+# in atomically, so dashboard readers never see a half-finished build. A builder
+# holds the build lock (an empty <schema>_LOCK schema) from cloning to swapping,
+# so builders sharing a schema cannot write it in between or have the swap
+# revert each other's tables.
+#
+#   publisher = SchemaPublisher(database, schema)
+#   publisher.acquire_lock(f"postings build {build_id}", conn)
+#   try:
+#       built_since = publisher.prepare_shadow(conn)
+#       ...  # CREATE TABLE statements, unqualified
+#       ok, msg = publisher.validate_shadow(built_since, failed, conn)
+#       if ok:
+#           publisher.publish_shadow(conn)
+#   finally:
+#       publisher.release_lock(conn)
+
+from connection import execute_ddl, fetch_rows
+
+
+def _esc(val):
+    return str(val).replace("'", "''")
+
+
+class SchemaPublisher:
+    def __init__(self, database: str, schema: str, publish_on_partial: bool = False):
+        self.database = database
+        self.schema = schema
+        self.shadow_schema = f"{schema}_SHADOW"
+        self.lock_schema = f"{schema}_LOCK"
+        self.publish_on_partial = publish_on_partial  # True: swap in even if some tables failed
+
+    def acquire_lock(self, owner, conn):
+        """Take the build lock (an empty schema; CREATE SCHEMA fails if it exists) or exit."""
+        try:
+            execute_ddl(f"CREATE SCHEMA {self.database}.{self.lock_schema} COMMENT = '{_esc(owner)}'", conn)
+        except Exception as e:
+            rows = fetch_rows(f"""
+                SELECT COMMENT, CREATED FROM {self.database}.INFORMATION_SCHEMA.SCHEMATA
+                WHERE SCHEMA_NAME = '{self.lock_schema}'
+            """, conn)
+            if not rows:
+                raise
+            holder, since = rows[0]
+            raise SystemExit(f"{self.database}.{self.schema} is being built by {holder} (since {since}); "
+                             f"if that build is dead, DROP SCHEMA {self.database}.{self.lock_schema}") from e
+        execute_ddl(f"USE DATABASE {self.database}", conn)  # CREATE SCHEMA switched the session to the lock
+
+    def release_lock(self, conn):
+        execute_ddl(f"DROP SCHEMA IF EXISTS {self.database}.{self.lock_schema}", conn)
+
+    def prepare_shadow(self, conn):
+        """Clone the live schema into the shadow schema, point the session at it and
+        return the database time the build started."""
+        execute_ddl(f"CREATE SCHEMA IF NOT EXISTS {self.database}.{self.schema}", conn)
+        execute_ddl(f"CREATE OR REPLACE SCHEMA {self.database}.{self.shadow_schema} "
+                    f"CLONE {self.database}.{self.schema}", conn)
+        execute_ddl(f"USE SCHEMA {self.database}.{self.shadow_schema}", conn)
+        return fetch_rows("SELECT CURRENT_TIMESTAMP()", conn)[0][0]
+
+    def validate_shadow(self, built_since, failed, conn):
+        """Return (ok, message) for the shadow build; empty tables are reported but allowed."""
+        rows = fetch_rows(f"""
+            SELECT TABLE_NAME, ROW_COUNT
+            FROM {self.database}.INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = '{self.shadow_schema}'
+              AND TABLE_TYPE = 'BASE TABLE'
+              AND LAST_ALTERED >= '{built_since}'::TIMESTAMP_LTZ
+        """, conn)
+        empty = sorted(name for name, n in rows if not n)
+        msg = f"{len(rows)} tables refreshed, {failed} failed, {len(empty)} empty"
+        if empty:
+            msg += f" ({', '.join(empty)})"
+        return failed == 0 or self.publish_on_partial, msg
+
+    def publish_shadow(self, conn):
+        """Atomically swap the shadow schema into place and drop the previous build."""
+        execute_ddl(f"ALTER SCHEMA {self.database}.{self.schema} SWAP WITH "
+                    f"{self.database}.{self.shadow_schema}", conn)
+        execute_ddl(f"DROP SCHEMA IF EXISTS {self.database}.{self.shadow_schema}", conn)
@@ -0,0 +1,150 @@
+# query_ir.py
+# Small query IR for the release-comparison builders.
+#
+#   Source     FROM table alias, plus any joins
+#   Select     one SELECT block: source, output columns (aggregates / keys),
+#              ANDed filters, GROUP BY / ORDER BY / LIMIT
+#   Statement  WITH name AS (<Select or raw SQL>), ... <body>
+#
+# Select nodes compare by a canonical key (whitespace collapsed, filters
+# sorted), so the same subquery built by different statements is recognised.
+# plan_shared() finds the ones used by several statements so the builder can
+# materialize each once as a temporary table.
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+_WS_RE = re.compile(r"\s+")
+_JOIN_RE = re.compile(r"\b((?:(?:INNER|LEFT|RIGHT|FULL|CROSS)\s+)?(?:OUTER\s+)?JOIN)\b", re.IGNORECASE)
+_ON_RE = re.compile(r"\s+ON\s+", re.IGNORECASE)
+
+
+def _canon(sql):
+    return _WS_RE.sub(" ", sql).strip()
+
+
+# ─────────────────────────── NODES ───────────────────────────
+@dataclass(frozen=True)
+class Join:
+    kind: str  # "INNER JOIN", "LEFT JOIN", ...
+    table: str
+    alias: str
+    on: str = ""
+
+    def sql(self):
+        on = f" ON {self.on}" if self.on else ""
+        return f"{self.kind} {self.table} {self.alias}{on}"
+
+
+@dataclass(frozen=True)
+class Source:
+    table: str
+    alias: str
+    joins: tuple = ()
+
+    @classmethod
+    def parse(cls, from_sql):
+        """Source from FROM-clause text: 'db.schema.table alias [INNER JOIN db.schema.table alias ON ...]...'"""
+        parts = _JOIN_RE.split(_canon(from_sql))
+        table, alias = parts[0].split()
+        joins = []
+        for kind, rest in zip(parts[1::2], parts[2::2]):
+            target, *on = _ON_RE.split(rest.strip(), maxsplit=1)
+            join_table, join_alias = target.split()
+            joins.append(Join(_canon(kind).upper(), join_table, join_alias, on[0] if on else ""))
+        return cls(table, alias, tuple(joins))
+
+    def sql(self, indent="    "):
+        return "\n".join([f"{self.table} {self.alias}"] + [f"{indent}    {j.sql()}" for j in self.joins])
+
+    def __str__(self):
+        return self.sql()
+
+
+@dataclass(frozen=True)
+class Select:
+    source: Source
+    columns: tuple  # "expr AS name"
+    filters: tuple = ()  # ANDed predicates
+    group_by: tuple = ()
+    order_by: tuple = ()
+    limit: int | None = None
+
+    def key(self):
+        return (
+            self.source,
+            tuple(_canon(c) for c in self.columns),
+            tuple(sorted(_canon(f) for f in self.filters)),
+            tuple(_canon(g) for g in self.group_by),
+            tuple(_canon(o) for o in self.order_by),
+            self.limit,
+        )
+
+    def fingerprint(self):
+        return hashlib.sha1(repr(self.key()).encode("utf-8")).hexdigest()[:8]
+
+    def sql(self, indent="    "):
+        lines = [f"{indent}SELECT {', '.join(self.columns)}", f"{indent}FROM {self.source.sql(indent)}"]
+        if self.filters:
+            lines.append(f"{indent}WHERE " + f"\n{indent}  AND ".join(self.filters))
+        if self.group_by:
+            lines.append(f"{indent}GROUP BY {', '.join(self.group_by)}")
+        if self.order_by:
+            lines.append(f"{indent}ORDER BY {', '.join(self.order_by)}")
+        if self.limit is not None:
+            lines.append(f"{indent}LIMIT {self.limit}")
+        return "\n".join(lines)
+
+
+@dataclass
+class Statement:
+    ctes: list  # [(name, Select | raw SQL text)]
+    body: str
+
+    def selects(self):
+        return [(name, q) for name, q in self.ctes if isinstance(q, Select)]
+
+    def sql(self, tables=None):
+        """Render; a CTE whose Select key is in `tables` ({key: table}) reads that table instead."""
+        tables = tables or {}
+        parts = []
+        for name, q in self.ctes:
+            if isinstance(q, Select):
+                table = tables.get(q.key())
+                q = f"    SELECT * FROM {table}" if table else q.sql()
+            parts.append(f"{name} AS (\n{q}\n)")
+        return "\nWITH\n" + ",\n".join(parts) + "\n" + self.body
+
+    def __str__(self):
+        return self.sql()
+
+
+# ─────────────────────────── PLANNER ───────────────────────────
+@dataclass
+class Shared:
+    table: str
+    select: Select
+    uses: int
+
+
+def plan_shared(statements, prefix="CSE", min_uses=2):
+    """{Select key: Shared} for Select nodes that appear in at least `min_uses` statements.
+
+    Table names are <prefix>_<first CTE name>_<fingerprint>, so they are stable
+    across runs and readable in query history.
+    """
+    first, uses = {}, {}
+    for stmt in statements:
+        seen = set()
+        for name, q in stmt.selects():
+            key = q.key()
+            if key in seen:
+                continue
+            seen.add(key)
+            first.setdefault(key, (name, q))
+            uses[key] = uses.get(key, 0) + 1
+    return {
+        key: Shared(f"{prefix}_{first[key][0].upper()}_{first[key][1].fingerprint().upper()}", first[key][1], n)
+        for key, n in uses.items() if n >= min_uses
+    }
@@ -17,6 +17,9 @@ st.set_page_config(
 # ─────────────────────────── CONSTANTS ─────────────────────────────
 SCHEMA = "PROJECT_DATA.POSTINGS_RELEASE_COMPARISONS"
 TABLE_PREFIX = "BGI_REL"
+# Retained builds are zero-copy clones named <schema>_BUILD_<build id>
+SNAPSHOT_PREFIX = "POSTINGS_RELEASE_COMPARISONS_BUILD_"
+LATEST_BUILD = "Latest"
 
 _SOURCE_ORDER = ["v1", "v2", "lc"]
 _SOURCE_LABELS = {"v1": "BGI v1", "v2": "BGI 2026-02", "lc": "Lightcast"}
@@ -31,6 +34,13 @@ THREE_COLOR_SCALE = [_RED, _BLUE, _ORANGE]
 _DARK_GREY = "#333333"
 NULL_LABEL = "<NULL>"
 
+# Must match CI_Z in postings_release_temp_tables.py (95% intervals)
+_CI_Z = 1.96
+
+# Fields flagged "dictionary" in postings_release_temp_tables.py TOPICS: their
+# COMP facts are also stored keyed by integer id (BGI_REL_COMPID_*)
+DICTIONARY_FIELDS = {"EMPLOYER_NAME", "CITY", "TITLE_NAME"}
+
 # ─────────────────────────── TABLE NAME HELPERS ─────────────────────────────
 def _clean(s: str) -> str:
     return s.upper().replace(" ", "_").replace("-", "_").replace("'", "")
@@ -44,6 +54,19 @@ def make_comp_name(topic: str, field: str) -> str:
 def make_comp_lc_name(topic: str, field: str) -> str:
     return f"{TABLE_PREFIX}_COMPLC_{_clean(topic)}_{_clean(field)}"
 
+def make_examples_name(topic: str, field: str) -> str:
+    return f"{TABLE_PREFIX}_EXAMPLES_{_clean(topic)}_{_clean(field)}"
+
+def make_dict_name(topic: str, field: str) -> str:
+    return f"{TABLE_PREFIX}_DICT_{_clean(topic)}_{_clean(field)}"
+
+def make_comp_id_name(topic: str, field: str) -> str:
+    return f"{TABLE_PREFIX}_COMPID_{_clean(topic)}_{_clean(field)}"
+
+def make_long_name(table_name: str) -> str:
+    """BGI_REL_COMP_X -> BGI_REL_LONG_COMP_X (chart-ready long format)"""
+    return f"{TABLE_PREFIX}_LONG_{table_name[len(TABLE_PREFIX) + 1:]}"
+
 # ─────────────────────────── TOPIC METADATA ─────────────────────────────
 TOPICS = {
     "dashboard information": {"fields": []},
@@ -127,12 +150,87 @@ def get_session() -> Session:
 
 session = get_session()
 
+# ─────────────────────────── BUILD SELECTION ─────────────────────────────
+@st.cache_data(show_spinner=False, ttl="1h")
+def list_builds() -> list:
+    """Retained build ids, newest first."""
+    df = session.sql(f"""
+        SELECT SCHEMA_NAME FROM PROJECT_DATA.INFORMATION_SCHEMA.SCHEMATA
+        WHERE STARTSWITH(SCHEMA_NAME, '{SNAPSHOT_PREFIX}')
+        ORDER BY SCHEMA_NAME DESC
+    """).to_pandas()
+    return [name[len(SNAPSHOT_PREFIX):] for name in df["SCHEMA_NAME"]]
+
+def _schema() -> str:
+    """Schema of the build selected in the sidebar (live schema by default)."""
+    build = st.session_state.get("build", LATEST_BUILD)
+    if build == LATEST_BUILD:
+        return SCHEMA
+    return f"PROJECT_DATA.{SNAPSHOT_PREFIX}{build}"
+
 # ─────────────────────────── QUERY HELPER ─────────────────────────────
-def _query(table_name: str) -> pd.DataFrame:
-    df = session.sql(f"SELECT * FROM {SCHEMA}.{table_name}").to_pandas()
+def _query(table_name: str, where: str = None, order_by: str = None, limit: int = None) -> pd.DataFrame:
+    sql = f"SELECT * FROM {_schema()}.{table_name}"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    if limit:
+        sql += f" LIMIT {limit}"
+    df = session.sql(sql).to_pandas()
     df.columns = [c.lower() for c in df.columns]
     return df
 
+def _query_value(table_name: str, field_value: str) -> pd.DataFrame:
+    """Rows of a FIELD_VALUE-keyed table for a single value."""
+    val = field_value.replace("'", "''")
+    df = session.sql(
+        f"SELECT * FROM {_schema()}.{table_name} WHERE FIELD_VALUE = '{val}'"
+    ).to_pandas()
+    df.columns = [c.lower() for c in df.columns]
+    return df
+
+@st.cache_data(show_spinner=False, ttl="1h")
+def _table_columns(schema: str, table_name: str) -> set:
+    """Lower-cased columns of a table in `schema` (empty if the table does not exist)."""
+    db, sch = schema.split(".")
+    df = session.sql(f"""
+        SELECT COLUMN_NAME FROM {db}.INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = '{sch}' AND TABLE_NAME = '{table_name.upper()}'
+    """).to_pandas()
+    return {c.lower() for c in df["COLUMN_NAME"]}
+
+# ─────────────────────── DICTIONARY-ENCODED FACTS ───────────────────────
+def _query_comp(topic, field, a, b, significant_only=False, top_n=15):
+    """The top_n COMP rows by |a - b| (share columns, e.g. v1_frac / v2_frac),
+    optionally only those whose a-vs-b z-score clears _CI_Z. Dictionary fields
+    come back keyed by field_id; pass the rows you display through _decode_values."""
+    table = make_comp_id_name(topic, field)
+    columns = _table_columns(_schema(), table) if field in DICTIONARY_FIELDS else set()
+    if not columns:  # not a dictionary field, or a build from before the dictionaries
+        table = make_comp_name(topic, field)
+        columns = _table_columns(_schema(), table)
+    z = f"{a[:-5]}_{b[:-5]}_z"
+    where = f"ABS({z}) >= {_CI_Z}" if significant_only and z in columns else None
+    df = _query(table, where=where, order_by=f"ABS({a} - {b}) DESC NULLS LAST", limit=top_n)
+    if "field_value" not in df.columns and "field_id" not in df.columns:
+        df = df.rename(columns={df.columns[0]: "field_value"})
+    return df
+
+def _decode_values(df, topic, field):
+    """Add field_value to id-keyed rows. Dictionary entries are cached in the
+    session per build, so only ids not seen on earlier pages are fetched."""
+    if "field_id" not in df.columns:
+        return df
+    dict_table = make_dict_name(topic, field)
+    cache = st.session_state.setdefault("value_dictionaries", {})
+    values = cache.setdefault(f"{_schema()}.{dict_table}", {})
+    missing = {int(i) for i in df["field_id"].dropna()} - values.keys()
+    if missing:
+        rows = _query(dict_table, where=f"ID IN ({', '.join(map(str, sorted(missing)))})")
+        values.update(zip(rows["id"].astype(int), rows["field_value"]))
+    return df.assign(field_value=df["field_id"].map(values))
+
 # ─────────────────────────── CHART HELPERS ─────────────────────────────
 def _prepare(val):
     if isinstance(val, pd.Series):
@@ -140,15 +238,34 @@ def _prepare(val):
     return NULL_LABEL if pd.isna(val) else str(val)
 
 
-def _melt(df, value_cols, value_name):
-    df_disp = df.copy()
-    df_disp["field_value"] = _prepare(df_disp["field_value"])
-    return df_disp.melt(
-        id_vars="field_value",
-        value_vars=value_cols,
-        var_name="source",
-        value_name=value_name,
-    )
+# The builders write chart-ready long tables (one row per value × source) that
+# go to Altair as queried. Builds from before those tables existed are reshaped
+# from the wide table instead.
+def _wide_to_long(df, key_col, sources, rank_col, rank_name, share_name="frac"):
+    """sources: {label: (count column, share column)}; rank_name ranks keys by rank_col."""
+    df = df.copy()
+    df[key_col] = _prepare(df[key_col])
+    df[rank_name] = df[rank_col].rank(method="first", ascending=False).astype(int)
+    parts = [
+        df[[key_col, cnt, share, rank_name]]
+        .rename(columns={cnt: "cnt", share: share_name})
+        .assign(source=label)
+        for label, (cnt, share) in sources.items()
+    ]
+    return pd.concat(parts, ignore_index=True).sort_values(rank_name, kind="stable")
+
+
+def _query_long_comp(wide_table, sort_col, top_n=25):
+    """Top `top_n` values of a COMP / COMPLC table, long: field_value, source, cnt, frac, value_rank."""
+    try:
+        return _query(make_long_name(wide_table), where=f"VALUE_RANK <= {top_n}", order_by="VALUE_RANK, SOURCE")
+    except Exception:
+        df = _query(wide_table)
+        if "field_value" not in df.columns:
+            df = df.rename(columns={df.columns[0]: "field_value"})
+        sources = {src: (f"{src}_count", f"{src}_frac") for src in _SOURCE_ORDER}
+        long = _wide_to_long(df, "field_value", sources, sort_col, "value_rank")
+        return long[long["value_rank"] <= top_n]
 
 
 def chart_line_counts(df, x_field, title, x_fmt=None):
@@ -170,33 +287,21 @@ def chart_line_counts(df, x_field, title, x_fmt=None):
     st.altair_chart(chart, use_container_width=True)
 
 
-def chart_bars(df, value_col, title, fmt=",", sort_col=None):
-    """Grouped horizontal bar chart for 3 sources."""
-    sort_col = sort_col or "v2_count"
-    order = (
-        df.sort_values(sort_col, ascending=False)["field_value"]
-        .apply(_prepare)
-        .tolist()
-    )
-    long = df.rename(columns={
-        "v1_count": "v1", "v2_count": "v2", "lc_count": "lc",
-        "v1_frac": "v1", "v2_frac": "v2", "lc_frac": "lc",
-    })
-    long = _melt(long, _SOURCE_ORDER, value_col)
-
-    x_fmt = ".1%" if "frac" in sort_col or "pct" in value_col else None
+def chart_bars(long, value_col, title, fmt=",", axis_fmt=None, axis_title=None):
+    """Grouped horizontal bar chart for 3 sources from a long table
+    (field_value, source, value_rank, value_col)."""
     chart = (
         alt.Chart(long, title=title)
         .mark_bar()
         .encode(
-            y=alt.Y("field_value:N", sort=order, **_Y_AXIS),
+            y=alt.Y("field_value:N", sort=alt.EncodingSortField("value_rank", op="min"), **_Y_AXIS),
             yOffset=alt.YOffset("source:N", sort=_SOURCE_ORDER),
-            x=alt.X(f"{value_col}:Q", axis=_x_axis(fmt=x_fmt, title=value_col.title()), stack=None),
+            x=alt.X(f"{value_col}:Q", axis=_x_axis(fmt=axis_fmt, title=axis_title), stack=None),
             color=_COLOR_ENC,
             tooltip=[
                 "field_value",
                 "source",
-                alt.Tooltip(f"{value_col}:Q", format=fmt),
+                alt.Tooltip(f"{value_col}:Q", format=fmt, title=axis_title),
             ],
         )
         .properties(height=700)
@@ -204,7 +309,8 @@ def chart_bars(df, value_col, title, fmt=",", sort_col=None):
     st.altair_chart(chart, use_container_width=True)
 
 
-def chart_pct_diff(df, title, col1, col2, label):
+def chart_pct_diff(df, title, col1, col2, label, ci_prefix=None):
+    """%-point difference bars, with 95% CI whiskers when the COMP table has them."""
     df_disp = df.copy()
     df_disp["field_value"] = _prepare(df_disp["field_value"])
     df_disp["pct_point_diff"] = df_disp[col1] - df_disp[col2]
@@ -212,7 +318,19 @@ def chart_pct_diff(df, title, col1, col2, label):
         df_disp.sort_values("pct_point_diff", key=lambda s: s.abs(), ascending=False)
         ["field_value"].tolist()
     )
-    chart = (
+    has_ci = ci_prefix is not None and f"{ci_prefix}_ci_lo" in df_disp.columns
+    tooltip = [
+        "field_value",
+        alt.Tooltip("pct_point_diff:Q", format=".2%"),
+        alt.Tooltip(f"{col1}:Q", format=".2%", title=col1.replace("_frac", " %")),
+        alt.Tooltip(f"{col2}:Q", format=".2%", title=col2.replace("_frac", " %")),
+    ]
+    if has_ci:
+        tooltip += [
+            alt.Tooltip(f"{ci_prefix}_ci_lo:Q", format=".2%", title="95% CI low"),
+            alt.Tooltip(f"{ci_prefix}_ci_hi:Q", format=".2%", title="95% CI high"),
+        ]
+    bars = (
         alt.Chart(df_disp, title=title)
         .mark_bar()
         .encode(
@@ -221,16 +339,29 @@ def chart_pct_diff(df, title, col1, col2, label):
             color=alt.condition(
                 alt.datum.pct_point_diff > 0, alt.value(_BLUE), alt.value(_RED)
             ),
-            tooltip=[
-                "field_value",
-                alt.Tooltip("pct_point_diff:Q", format=".2%"),
-                alt.Tooltip(f"{col1}:Q", format=".2%", title=col1.replace("_frac", " %")),
-                alt.Tooltip(f"{col2}:Q", format=".2%", title=col2.replace("_frac", " %")),
-            ],
+            tooltip=tooltip,
         )
-        .properties(height=600)
     )
-    st.altair_chart(chart, use_container_width=True)
+    chart = bars
+    if has_ci:
+        whiskers = (
+            alt.Chart(df_disp)
+            .mark_rule(color=_DARK_GREY)
+            .encode(
+                y=alt.Y("field_value:N", sort=order),
+                x=f"{ci_prefix}_ci_lo:Q",
+                x2=f"{ci_prefix}_ci_hi:Q",
+            )
+        )
+        chart = bars + whiskers
+    st.altair_chart(chart.properties(height=600), use_container_width=True)
+    if has_ci:
+        caption = "Whiskers: 95% CI, treating the two sources as independent samples."
+        if ci_prefix == "v1_v2":
+            # v1 and v2 are overlapping releases of largely the same postings
+            caption += (" v1 and v2 share most postings, so these intervals are too wide "
+                        "and real v1 − v2 shifts can look non-significant.")
+        st.caption(caption)
 
 
 # ─────────────────────────── SECTION: LANDING ──────────────────────────
@@ -277,6 +408,11 @@ def page_total_counts():
     # JOLTS monthly benchmark
     show_jolts_monthly()
 
+    st.divider()
+
+    # v1 / v2 posting overlap (HLL sketches)
+    show_id_overlap()
+
 
 # ─────────────────────────── SECTION: KPI + COMP ──────────────────────
 def show_kpis(topic, field):
@@ -301,55 +437,20 @@ def show_kpis(topic, field):
         st.info(f"Expected table: {kpi_table}")
 
 
-def show_comp(topic, field):
+def show_comp(topic, field, significant_only=False):
     """Display distribution charts + diffs for one field."""
     comp_table = make_comp_name(topic, field)
     try:
-        df = _query(comp_table)
-        if df.empty:
+        long = _query_long_comp(comp_table, "v2_count")
+        if long.empty:
             st.info("No comparison data returned.")
             return
 
-        if "field_value" not in df.columns:
-            df = df.rename(columns={df.columns[0]: "field_value"})
+        # Top 25 by v2 count
+        chart_bars(long, "frac", "Top 25 — Percentage", fmt=".1%", axis_fmt=".1%", axis_title="Percentage")
+        chart_bars(long, "cnt", "Top 25 — Counts", axis_title="Count")
 
-        # Top 25 by v2 fraction
-        df_top = df.sort_values("v2_frac", ascending=False).head(25)
-
-        # Percentage chart
-        pct_df = df_top.rename(columns={"v1_frac": "v1", "v2_frac": "v2", "lc_frac": "lc"})
-        pct_long = _melt(pct_df, _SOURCE_ORDER, "pct")
-        order = df_top["field_value"].apply(_prepare).tolist()
-        pct_chart = (
-            alt.Chart(pct_long, title="Top 25 — Percentage")
-            .mark_bar()
-            .encode(
-                y=alt.Y("field_value:N", sort=order, **_Y_AXIS),
-                yOffset=alt.YOffset("source:N", sort=_SOURCE_ORDER),
-                x=alt.X("pct:Q", axis=_x_axis(fmt=".1%", title="Percentage"), stack=None),
-                color=_COLOR_ENC,
-                tooltip=["field_value", "source", alt.Tooltip("pct:Q", format=".1%")],
-            )
-            .properties(height=700)
-        )
-        st.altair_chart(pct_chart, use_container_width=True)
-
-        # Count chart
-        cnt_df = df_top.rename(columns={"v1_count": "v1", "v2_count": "v2", "lc_count": "lc"})
-        cnt_long = _melt(cnt_df, _SOURCE_ORDER, "count")
-        cnt_chart = (
-            alt.Chart(cnt_long, title="Top 25 — Counts")
-            .mark_bar()
-            .encode(
-                y=alt.Y("field_value:N", sort=order, **_Y_AXIS),
-                yOffset=alt.YOffset("source:N", sort=_SOURCE_ORDER),
-                x=alt.X("count:Q", axis=_x_axis(title="Count"), stack=None),
-                color=_COLOR_ENC,
-                tooltip=["field_value", "source", alt.Tooltip("count:Q", format=",")],
-            )
-            .properties(height=700)
-        )
-        st.altair_chart(cnt_chart, use_container_width=True)
+        show_examples(topic, field, long["field_value"].drop_duplicates().tolist())
 
         # %-point diffs: three pairwise comparisons
         st.markdown("#### Percentage Point Differences")
@@ -361,67 +462,51 @@ def show_comp(topic, field):
             (col_c, "v2 − LC",  "v2_frac", "lc_frac"),
         ]
         for col, label, c1, c2 in pairs:
+            ci_prefix = f"{c1[:-5]}_{c2[:-5]}"
             with col:
-                diff = (
-                    df.assign(abs_diff=lambda d, a=c1, b=c2: (d[a] - d[b]).abs())
-                    .sort_values("abs_diff", ascending=False)
-                    .head(15)
-                )
+                diff = _query_comp(topic, field, c1, c2, significant_only).pipe(_decode_values, topic, field)
                 if not diff.empty:
-                    chart_pct_diff(diff, label, c1, c2, f"{label} (pct pts)")
+                    chart_pct_diff(diff, label, c1, c2, f"{label} (pct pts)", ci_prefix=ci_prefix)
+                elif significant_only:
+                    st.info("No statistically significant shifts.")
 
     except Exception as e:
         st.error(f"Error loading comparison: {e}")
         st.info(f"Expected table: {comp_table}")
 
 
+def show_examples(topic, field, values):
+    """Example postings behind one charted bar, from the pre-sampled EXAMPLES table."""
+    examples_table = make_examples_name(topic, field)
+    with st.expander("Example postings"):
+        value = st.selectbox("Value:", values, key=f"examples_{topic}_{field}")
+        if not value or value == NULL_LABEL:
+            return
+        try:
+            ex = _query_value(examples_table, value)
+        except Exception as e:
+            st.warning(f"Could not load example postings: {e}")
+            st.info(f"Expected table: {examples_table}")
+            return
+        for src in _SOURCE_ORDER:
+            rows = ex[ex["source"] == src].drop(columns=["source", "field_value"])
+            st.markdown(f"**{_SOURCE_LABELS[src]}** — {len(rows)} example(s)")
+            if not rows.empty:
+                st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
 def show_comp_lc(topic, field):
     """Top 25 by Lightcast count, with v1/v2 alongside."""
     complc_table = make_comp_lc_name(topic, field)
     try:
-        df = _query(complc_table)
-        if df.empty:
+        long = _query_long_comp(complc_table, "lc_count")
+        if long.empty:
             st.info("No LC comparison data returned.")
             return
 
-        if "field_value" not in df.columns:
-            df = df.rename(columns={df.columns[0]: "field_value"})
-
-        order = df.sort_values("lc_count", ascending=False)["field_value"].apply(_prepare).tolist()
-
-        # Percentage chart
-        pct_df = df.rename(columns={"v1_frac": "v1", "v2_frac": "v2", "lc_frac": "lc"})
-        pct_long = _melt(pct_df, _SOURCE_ORDER, "pct")
-        pct_chart = (
-            alt.Chart(pct_long, title="Top 25 Lightcast Employers — Percentage")
-            .mark_bar()
-            .encode(
-                y=alt.Y("field_value:N", sort=order, **_Y_AXIS),
-                yOffset=alt.YOffset("source:N", sort=_SOURCE_ORDER),
-                x=alt.X("pct:Q", axis=_x_axis(fmt=".1%", title="Percentage"), stack=None),
-                color=_COLOR_ENC,
-                tooltip=["field_value", "source", alt.Tooltip("pct:Q", format=".1%")],
-            )
-            .properties(height=700)
-        )
-        st.altair_chart(pct_chart, use_container_width=True)
-
-        # Count chart
-        cnt_df = df.rename(columns={"v1_count": "v1", "v2_count": "v2", "lc_count": "lc"})
-        cnt_long = _melt(cnt_df, _SOURCE_ORDER, "count")
-        cnt_chart = (
-            alt.Chart(cnt_long, title="Top 25 Lightcast Employers — Counts")
-            .mark_bar()
-            .encode(
-                y=alt.Y("field_value:N", sort=order, **_Y_AXIS),
-                yOffset=alt.YOffset("source:N", sort=_SOURCE_ORDER),
-                x=alt.X("count:Q", axis=_x_axis(title="Count"), stack=None),
-                color=_COLOR_ENC,
-                tooltip=["field_value", "source", alt.Tooltip("count:Q", format=",")],
-            )
-            .properties(height=700)
-        )
-        st.altair_chart(cnt_chart, use_container_width=True)
+        chart_bars(long, "frac", "Top 25 Lightcast Employers — Percentage",
+                   fmt=".1%", axis_fmt=".1%", axis_title="Percentage")
+        chart_bars(long, "cnt", "Top 25 Lightcast Employers — Counts", axis_title="Count")
 
     except Exception as e:
         st.error(f"Error loading LC comparison: {e}")
@@ -461,6 +546,75 @@ def show_onet_changes():
         st.warning(f"Could not load ONET changes: {e}")
 
 
+_OVERLAP_ORDER = ["v1 only", "both", "v2 only"]
+
+
+def show_build_manifest():
+    """Sidebar summary of the selected build's source tables."""
+    try:
+        manifest = _query(f"{TABLE_PREFIX}_BUILD_MANIFEST")
+    except Exception:
+        return
+    if manifest.empty:
+        return
+    # rows of both builders publishing into the schema; the header shows the latest
+    manifest = manifest.sort_values("built_at", ascending=False)
+    lines = [f"Build **{manifest['build_id'].iloc[0]}** · built {manifest['built_at'].iloc[0]:%Y-%m-%d %H:%M}"]
+    as_of = manifest["source_as_of"].dropna() if "source_as_of" in manifest else pd.Series(dtype=object)
+    if not as_of.empty:
+        lines.append(f"Sources read as of {as_of.iloc[0]:%Y-%m-%d %H:%M}")
+    for _, r in manifest.iterrows():
+        altered = "" if pd.isna(r["source_last_altered"]) else f" (updated {r['source_last_altered']:%Y-%m-%d})"
+        lines.append(f"- {r['source']}: `{r['source_table']}`{altered}")
+    st.sidebar.caption("\n".join(lines))
+
+
+def show_id_overlap():
+    """Estimated v1-only / both / v2-only postings per month, from BGI_REL_ID_OVERLAP_MONTHLY
+    (HLL estimates built per state / NAICS-2 slice, "All" where a slice is rolled up)."""
+    st.subheader("Posting overlap — v1 vs v2 (estimated)")
+    overlap_table = f"{TABLE_PREFIX}_ID_OVERLAP_MONTHLY"
+    try:
+        slices = session.sql(
+            f"SELECT DISTINCT STATE, NAICS2 FROM {_schema()}.{overlap_table}"
+        ).to_pandas()
+        cols = st.columns(2)
+        states = ["All"] + sorted(s for s in slices["STATE"].dropna().unique() if s != "All")
+        naics = ["All"] + sorted(n for n in slices["NAICS2"].dropna().unique() if n != "All")
+        state = cols[0].selectbox("State:", states, key="overlap_state")
+        naics2 = cols[1].selectbox("Industry (NAICS-2):", naics, key="overlap_naics2")
+
+        where = "STATE = '{}' AND NAICS2 = '{}'".format(state.replace("'", "''"), naics2.replace("'", "''"))
+        ov = _query(overlap_table, where=where, order_by="MONTH_START")
+        ov = ov[["month_start", "v1_only", "both_ids", "v2_only"]].rename(
+            columns={"v1_only": "v1 only", "both_ids": "both", "v2_only": "v2 only"})
+        ov_long = ov.melt(id_vars="month_start", var_name="overlap", value_name="cnt")
+        chart = (
+            alt.Chart(ov_long, title="Monthly Postings by Release Membership")
+            .mark_bar()
+            .encode(
+                x=alt.X("month_start:T", axis=_x_axis(fmt="%b %Y")),
+                y=alt.Y("cnt:Q", axis=_x_axis(title="Postings (est.)")),
+                color=alt.Color(
+                    "overlap:N", title="In", sort=_OVERLAP_ORDER,
+                    scale=alt.Scale(domain=_OVERLAP_ORDER, range=[_RED, _GOLD, _BLUE]),
+                    legend=_LEGEND,
+                ),
+                order=alt.Order("overlap:N"),
+                tooltip=[
+                    "overlap",
+                    alt.Tooltip("month_start:T", title="Month"),
+                    alt.Tooltip("cnt:Q", title="Postings", format=","),
+                ],
+            )
+            .properties(height=400)
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption("HyperLogLog estimates (~1.6% relative error per count).")
+    except Exception as e:
+        st.error(f"Error loading posting overlap: {e}")
+
+
 # ─────────────────────────── BENCHMARK CHART HELPERS ─────────────────────
 def _bench_color(domain):
     return alt.Color(
@@ -477,10 +631,13 @@ def show_jolts_monthly():
     """JOLTS monthly openings vs BGI vs Lightcast line chart."""
     st.subheader("Benchmark: Monthly JOLTS Openings vs BGI vs Lightcast")
     try:
-        jm = _query("JOLTS_MONTHLY_COMPARISON")
-        jm["source"] = jm["source"].replace(
-            {"Full_BGI": "BGI", "Full_LC": "Lightcast"})
-        jm = jm.sort_values(["source", "month_start"])
+        try:
+            jm = _query("LONG_JOLTS_MONTHLY_COMPARISON", order_by="SOURCE, MONTH_START")
+        except Exception:  # builds from before the long tables
+            jm = _query("JOLTS_MONTHLY_COMPARISON")
+            jm["source"] = jm["source"].replace(
+                {"Full_BGI": "BGI", "Full_LC": "Lightcast"})
+            jm = jm.sort_values(["source", "month_start"])
         chart = (
             alt.Chart(jm, title="Monthly Postings vs JOLTS Job Openings")
             .mark_line(point=True)
@@ -505,17 +662,20 @@ def show_jolts_industry():
     """JOLTS vs BGI vs Lightcast industry distribution bar chart."""
     st.subheader("Benchmark: JOLTS vs BGI vs Lightcast Industry Distribution (2024)")
     try:
-        ji = _query("JOLTS_INDUSTRY_COMPARISON")
-        ji_long = ji[["sector", "jolts_pct", "bgi_pct", "lc_pct"]].melt(
-            id_vars="sector", var_name="source", value_name="pct")
-        ji_long["source"] = ji_long["source"].replace(
-            {"jolts_pct": "JOLTS", "bgi_pct": "BGI", "lc_pct": "Lightcast"})
-        order = ji.sort_values("jolts_count", ascending=False)["sector"].tolist()
+        try:
+            ji_long = _query("LONG_JOLTS_INDUSTRY_COMPARISON", order_by="KEY_RANK, SOURCE")
+        except Exception:  # builds from before the long tables
+            ji_long = _wide_to_long(
+                _query("JOLTS_INDUSTRY_COMPARISON"), "sector",
+                {"JOLTS": ("jolts_count", "jolts_pct"), "BGI": ("bgi_count", "bgi_pct"),
+                 "Lightcast": ("lc_count", "lc_pct")},
+                "jolts_count", "key_rank", share_name="pct",
+            )
         chart = (
             alt.Chart(ji_long, title="Industry Share (%)")
             .mark_bar()
             .encode(
-                y=alt.Y("sector:N", sort=order, **_Y_AXIS),
+                y=alt.Y("sector:N", sort=alt.EncodingSortField("key_rank", op="min"), **_Y_AXIS),
                 yOffset=alt.YOffset("source:N", sort=_BENCH_ORDER),
                 x=alt.X("pct:Q", axis=_x_axis(fmt=".1%", title="Share"),
                          stack=None),
@@ -534,19 +694,23 @@ def show_oews_soc2():
     """OEWS employment vs BGI vs Lightcast SOC-2 distribution bar chart."""
     st.subheader("Benchmark: OEWS Employment vs BGI vs Lightcast (SOC-2)")
     try:
-        oe = _query("OEWS_SOC2_COMPARISON")
-        oe["soc2_name"] = oe["soc2_name"].str.title()
-        oe_long = oe[["soc2_name", "oews_pct", "bgi_pct", "lc_pct"]].melt(
-            id_vars="soc2_name", var_name="source", value_name="pct")
-        oe_long["source"] = oe_long["source"].replace(
-            {"oews_pct": "OEWS", "bgi_pct": "BGI", "lc_pct": "Lightcast"})
-        order = oe.sort_values("oews_empl", ascending=False)["soc2_name"].tolist()
+        try:
+            oe_long = _query("LONG_OEWS_SOC2_COMPARISON", order_by="KEY_RANK, SOURCE")
+        except Exception:  # builds from before the long tables
+            oe = _query("OEWS_SOC2_COMPARISON")
+            oe["soc2_name"] = oe["soc2_name"].str.title()
+            oe_long = _wide_to_long(
+                oe, "soc2_name",
+                {"OEWS": ("oews_empl", "oews_pct"), "BGI": ("bgi_count", "bgi_pct"),
+                 "Lightcast": ("lc_count", "lc_pct")},
+                "oews_empl", "key_rank", share_name="pct",
+            )
         chart = (
             alt.Chart(oe_long,
                       title="SOC-2: Postings Share vs OEWS Employment Share (%)")
             .mark_bar()
             .encode(
-                y=alt.Y("soc2_name:N", sort=order, **_Y_AXIS),
+                y=alt.Y("soc2_name:N", sort=alt.EncodingSortField("key_rank", op="min"), **_Y_AXIS),
                 yOffset=alt.YOffset("source:N", sort=_OEWS_ORDER),
                 x=alt.X("pct:Q", axis=_x_axis(fmt=".1%", title="Share"),
                          stack=None),
@@ -569,19 +733,25 @@ def show_jolts_state():
     """JOLTS vs v1 vs v2 vs Lightcast state distribution charts (2024)."""
     st.subheader("Benchmark: State Share of Postings vs JOLTS Job Openings (2024)")
     try:
-        js = _query(f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON")
-        if js.empty:
+        # ── Grouped bar chart: top 15 states by JOLTS share (descending) ──
+        state_table = f"{TABLE_PREFIX}_JOLTS_STATE_COMPARISON"
+        try:
+            bar_long = _query(make_long_name(state_table), where="JOLTS_RANK <= 15",
+                              order_by="JOLTS_RANK, SOURCE")
+        except Exception:  # builds from before the long tables
+            js = _query(state_table)
+            js["state"] = js["state"].str.title()
+            bar_long = _wide_to_long(
+                js, "state",
+                {"JOLTS": ("jolts_count", "jolts_pct"), "v1": ("v1_count", "v1_pct"),
+                 "v2": ("v2_count", "v2_pct"), "Lightcast": ("lc_count", "lc_pct")},
+                "jolts_pct", "jolts_rank", share_name="pct",
+            )
+            bar_long = bar_long[bar_long["jolts_rank"] <= 15]
+        if bar_long.empty:
             st.info("No JOLTS state data returned.")
             return
 
-        # ── Grouped bar chart: top 15 states by JOLTS share (descending) ──
-        top15 = js.nlargest(15, "jolts_pct").sort_values("jolts_pct", ascending=False)
-        top15["state"] = top15["state"].str.title()
-        bar_long = top15[["state", "jolts_pct", "v1_pct", "v2_pct", "lc_pct"]].melt(
-            id_vars="state", var_name="source", value_name="pct")
-        bar_long["source"] = bar_long["source"].replace({
-            "jolts_pct": "JOLTS", "v1_pct": "v1", "v2_pct": "v2", "lc_pct": "Lightcast"})
-        order = top15["state"].tolist()
         state_color = alt.Color(
             "source:N", title="Source", sort=_STATE_SOURCE_ORDER,
             scale=alt.Scale(domain=_STATE_SOURCE_ORDER, range=_STATE_COLORS),
@@ -591,7 +761,7 @@ def show_jolts_state():
             alt.Chart(bar_long, title="Top 15 States: Share of Postings vs JOLTS Job Openings")
             .mark_bar()
             .encode(
-                y=alt.Y("state:N", sort=order, **_Y_AXIS),
+                y=alt.Y("state:N", sort=alt.EncodingSortField("jolts_rank", op="min"), **_Y_AXIS),
                 yOffset=alt.YOffset("source:N", sort=_STATE_SOURCE_ORDER),
                 x=alt.X("pct:Q", axis=_x_axis(title="Share (%)"), stack=None),
                 color=state_color,
@@ -617,6 +787,16 @@ def main():
 
     topic = st.sidebar.selectbox("Topic:", topic_options, index=0, format_func=format_topic)
 
+    try:
+        builds = [LATEST_BUILD] + list_builds()
+    except Exception:
+        builds = [LATEST_BUILD]
+    st.sidebar.selectbox(
+        "Build:", builds, key="build",
+        help="Published builds are kept as zero-copy snapshots; pick one to view or compare against.",
+    )
+    show_build_manifest()
+
     if topic == "dashboard information":
         page_landing()
         return
@@ -636,6 +816,14 @@ def main():
         default=[all_fields[0]] if all_fields else [],
     )
 
+    significant_only = st.sidebar.checkbox(
+        "Only significant %-pt differences",
+        value=False,
+        help="Hide differences whose 95% confidence interval includes zero. Intervals assume "
+             "independent samples; v1 and v2 share most postings, so this is conservative "
+             "for v1 − v2 and can hide real shifts.",
+    )
+
     display_name = topic_meta.get("display_name", topic.replace("_", " ").title())
     st.caption(
         f"Topic **{display_name}** — comparing BGI v1, BGI 2026-02, and Lightcast (2015+).",
@@ -647,7 +835,7 @@ def main():
         with st.container():
             st.subheader(f"{display_name} · {field}")
             show_kpis(topic, field)
-            show_comp(topic, field)
+            show_comp(topic, field, significant_only=significant_only)
             if topic == "employers":
                 show_comp_lc(topic, field)
             st.divider()
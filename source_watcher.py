@@ -0,0 +1,215 @@
+# source_watcher.py
+# Watches the postings builder's source tables and rebuilds only the output
+# tables that read them.
+#
+#   - polls INFORMATION_SCHEMA.TABLES for the builder's SOURCE_TABLES and
+#     compares LAST_ALTERED / ROW_COUNT with the previous poll (state file)
+#   - maps each altered source to the output tables that read it, directly or
+#     through deps, and runs a build of just those (--changed-source)
+#   - reports new BGI releases (revelio_clean.bgi_YYYY_MM) and LC backups
+#     (bgi_postings_backups.<mon>_<yy>) that the builder does not read yet;
+#     moving to a new release is a change to V2_TABLE / LC_TABLE, not a rebuild
+#
+# The catalog is a constructor argument: SnowflakeCatalog reads
+# INFORMATION_SCHEMA, LocalCatalog reads a JSON stand-in, so a poll can be run
+# end to end without Snowflake (with --dry-run nothing is built).
+#
+#   python source_watcher.py
+#   python source_watcher.py --every 1800
+#   python source_watcher.py --catalog stand_in_catalog.json --dry-run
+
+import argparse
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import postings_release_temp_tables as postings
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "source_watcher.json")
+
+# (database, schema pattern, table) of new releases of a source
+RELEASE_PATTERNS = [
+    ("REVELIO_CLEAN", re.compile(r"BGI_\d{4}_\d{2}"), "BGI_POSTINGS"),
+    ("BGI_POSTINGS_BACKUPS", re.compile(r"[A-Z]{3}_\d{2}"), "US_POSTINGS"),
+]
+
+
+def _key(database, schema, table):
+    return f"{database}.{schema}.{table}".upper()
+
+
+def _sources():
+    return {t.upper() for t in postings.SOURCE_TABLES.values()}
+
+
+# ─────────────────────────── CATALOGS ───────────────────────────
+# tables(database, names) -> {DB.SCHEMA.TABLE: {"last_altered": str, "row_count": int}}
+# for the base tables in `database` named any of `names`.
+
+class SnowflakeCatalog:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def tables(self, database, names):
+        in_list = ", ".join(f"'{n}'" for n in sorted(names))
+        rows = postings.fetch_rows(f"""
+            SELECT TABLE_SCHEMA, TABLE_NAME,
+                   TO_VARCHAR(LAST_ALTERED, 'YYYY-MM-DD HH24:MI:SS.FF3 TZHTZM'), ROW_COUNT
+            FROM {database}.INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_TYPE = 'BASE TABLE'
+              AND TABLE_NAME IN ({in_list})
+        """, self.conn)
+        return {_key(database, sch, tbl): {"last_altered": altered, "row_count": n}
+                for sch, tbl, altered, n in rows}
+
+
+class LocalCatalog:
+    """Stand-in catalog: a JSON file {"DB.SCHEMA.TABLE": {"last_altered": ..., "row_count": ...}},
+    re-read on every poll so it can be edited between polls."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def tables(self, database, names):
+        with open(self.path, encoding="utf-8") as f:
+            entries = {key.upper(): entry for key, entry in json.load(f).items()}
+        names = {n.upper() for n in names}
+        return {key: entry for key, entry in entries.items()
+                if key.split(".")[0] == database.upper() and key.split(".")[2] in names}
+
+
+# ─────────────────────────── STATE ───────────────────────────
+def load_state(path):
+    """Tables seen at the last completed poll, or None before the first one."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["tables"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_state(path, tables):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"polled_at": datetime.now().isoformat(), "tables": tables}, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# ─────────────────────────── WATCHER ───────────────────────────
+def watched_names():
+    """{DATABASE: {TABLE, ...}} to ask the catalog for: the sources plus release tables."""
+    names = {}
+    for table in _sources():
+        db, _, tbl = table.split(".")
+        names.setdefault(db, set()).add(tbl)
+    for db, _, tbl in RELEASE_PATTERNS:
+        names.setdefault(db, set()).add(tbl)
+    return names
+
+
+def poll(catalog):
+    tables = {}
+    for database, names in watched_names().items():
+        tables.update(catalog.tables(database, names))
+    return tables
+
+
+def _is_release(key):
+    db, sch, tbl = key.split(".")
+    return any(db == d and pattern.fullmatch(sch) and tbl == t for d, pattern, t in RELEASE_PATTERNS)
+
+
+def diff(previous, current):
+    """(altered sources, new release tables, missing sources) between two polls."""
+    sources = _sources()
+    altered = sorted(t for t in sources if t in current and current[t] != previous.get(t))
+    releases = sorted(t for t in current if t not in previous and t not in sources and _is_release(t))
+    missing = sorted(t for t in sources if t in previous and t not in current)
+    return altered, releases, missing
+
+
+def check_once(catalog, state_path=DEFAULT_STATE_PATH, dry_run=False):
+    """One poll: report changes and rebuild the outputs of altered sources.
+
+    State is saved only after a published rebuild (postings.main exits
+    non-zero otherwise), so a failed build is retried on the next poll.
+    Returns the altered sources.
+    """
+    previous = load_state(state_path)
+    current = poll(catalog)
+    if previous is None:
+        print(f"  First poll: recorded {len(current)} tables, nothing to rebuild")
+        save_state(state_path, current)
+        return []
+
+    altered, releases, missing = diff(previous, current)
+    for table in releases:
+        db = table.split(".")[0]
+        reading = ", ".join(sorted(t for t in _sources() if t.startswith(f"{db}.")))
+        print(f"  ! New release {table} (the builder still reads {reading})")
+    for table in missing:
+        print(f"  ✗ Source {table} is no longer in the catalog")
+    if not altered:
+        print("  ✓ No source changes")
+        save_state(state_path, current)
+        return []
+
+    affected = postings.steps_reading(postings.build_steps(), altered)
+    for table in altered:
+        before = previous.get(table, {})
+        print(f"  ~ {table}: altered {before.get('last_altered')} → {current[table]['last_altered']}, "
+              f"rows {before.get('row_count')} → {current[table]['row_count']}")
+    print(f"  {len(affected)} output tables read them: {', '.join(s['name'] for s in affected)}")
+    if dry_run:
+        print("  (dry run, nothing built)")
+        return altered
+
+    print(f"[{datetime.now()}] Rebuilding {len(affected)} tables...")
+    postings.main(["--changed-source", *altered])
+    save_state(state_path, current)
+    return altered
+
+
+# ─────────────────────────── MAIN ─────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Poll the postings sources and rebuild only the tables that read changed ones."
+    )
+    parser.add_argument("--catalog", metavar="PATH",
+                        help="read a local JSON stand-in catalog instead of Snowflake INFORMATION_SCHEMA")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, metavar="PATH",
+                        help="where the last poll is recorded")
+    parser.add_argument("--every", type=int, metavar="SECONDS",
+                        help="keep polling at this interval (default: poll once)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report changes and affected tables without building")
+    args = parser.parse_args(argv)
+
+    conn = None
+    if args.catalog:
+        catalog = LocalCatalog(args.catalog)
+    else:
+        conn = postings.provider.connect()
+        catalog = SnowflakeCatalog(conn)
+    try:
+        while True:
+            print(f"\n[{datetime.now()}] Polling source tables...")
+            try:
+                check_once(catalog, args.state, args.dry_run)
+            except (Exception, SystemExit) as e:
+                if not args.every:
+                    raise
+                print(f"  ✗ {e} (retrying next poll)")
+            if not args.every:
+                break
+            time.sleep(args.every)
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()